@@ -0,0 +1,145 @@
+"""
+Emergency alert fan-out harness
+
+Abre N consolas SSE en /api/emergency/stream, dispara alertas con POST /api/emergency/alert
+y mide la latencia desde la pulsación (pressed_at del evento) hasta la recepción en cada
+consola. Ejecutar en la misma máquina que el servidor (o con relojes sincronizados).
+
+Uso (desde la carpeta Flask, con el servidor gevent en marcha):
+    py benchmarks/alert_fanout.py --guard-id 2 --resident-id 5 --clients 300 --alerts 20
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.metrics import percentile
+
+
+class Console(threading.Thread):
+    """One guard console: keeps an SSE stream open and records alert receipt latencies"""
+
+    def __init__(self, base, guard_id, ack, timeout):
+        super().__init__(daemon=True)
+        self.base = base
+        self.guard_id = guard_id
+        self.ack = ack
+        self.timeout = timeout
+        self.ready = threading.Event()
+        self.latencies = {}  # alert_id -> ms
+        self.error = None
+
+    def _connection(self):
+        cls = http.client.HTTPSConnection if self.base.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.base.netloc, timeout=self.timeout)
+
+    def run(self):
+        try:
+            conn = self._connection()
+            conn.request('GET', f'{self.base.path}/api/emergency/stream?user_id={self.guard_id}',
+                         headers={'Accept': 'text/event-stream'})
+            response = conn.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f'HTTP {response.status}: {response.read()[:200]!r}')
+            event = None
+            for raw in response:
+                line = raw.decode('utf-8').rstrip('\r\n')
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:') and event == 'ready':
+                    self.ready.set()
+                elif line.startswith('data:') and event == 'alert':
+                    received = datetime.now().timestamp()
+                    payload = json.loads(line[5:])
+                    if payload.get('pressed_at'):
+                        self.latencies[payload['alert_id']] = (received - payload['pressed_at']) * 1000
+                        if self.ack:
+                            self._acknowledge(payload['pressed_at'])
+                elif not line:
+                    event = None
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+
+    def _acknowledge(self, pressed_at):
+        conn = self._connection()
+        try:
+            conn.request('POST', f'{self.base.path}/api/emergency/alert/ack',
+                         body=json.dumps({'user_id': self.guard_id, 'pressed_at': pressed_at}),
+                         headers={'Content-Type': 'application/json'})
+            conn.getresponse().read()
+        finally:
+            conn.close()
+
+
+def request_json(base, method, path, body=None):
+    conn = http.client.HTTPConnection(base.netloc, timeout=30)
+    try:
+        conn.request(method, f'{base.path}{path}', body=json.dumps(body) if body is not None else None,
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b'{}')
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Latencia de fan-out de alertas de emergencia')
+    parser.add_argument('--url', default='http://localhost:5000', help='URL base de la API')
+    parser.add_argument('--guard-id', type=int, required=True, help='Perfil guard/admin usado por las consolas')
+    parser.add_argument('--resident-id', type=int, required=True, help='Residente que dispara las alertas')
+    parser.add_argument('--clients', type=int, default=300, help='Consolas SSE conectadas')
+    parser.add_argument('--alerts', type=int, default=20, help='Alertas a disparar')
+    parser.add_argument('--interval', type=float, default=0.5, help='Segundos entre alertas')
+    parser.add_argument('--ack', action='store_true', help='Confirmar cada alerta (mide también la latencia ack)')
+    parser.add_argument('--timeout', type=float, default=60, help='Timeout de socket por consola')
+    args = parser.parse_args(argv)
+
+    base = urlsplit(args.url.rstrip('/'))
+    request_json(base, 'GET', '/api/emergency/latency-stats?reset=true')
+
+    consoles = [Console(base, args.guard_id, args.ack, args.timeout) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for console in consoles:
+        console.start()
+    for console in consoles:
+        console.ready.wait(args.timeout)
+    failed = [c for c in consoles if c.error or not c.ready.is_set()]
+    print(f"{args.clients - len(failed)}/{args.clients} consolas conectadas en {time.perf_counter() - started:.2f}s")
+    if failed:
+        print(f"Primer error: {next((c.error for c in failed if c.error), 'timeout')}")
+
+    for _ in range(args.alerts):
+        status, body = request_json(base, 'POST', '/api/emergency/alert', {'resident_id': args.resident_id})
+        if status != 200:
+            print(f"Error al crear la alerta (HTTP {status}): {body.get('mensaje')}")
+            return 1
+        time.sleep(args.interval)
+    # Margen para que lleguen las últimas entregas
+    time.sleep(min(5.0, max(1.0, args.interval * 4)))
+
+    connected = [c for c in consoles if c not in failed]
+    latencies = sorted(ms for c in connected for ms in c.latencies.values())
+    expected = len(connected) * args.alerts
+    print(f"Entregas: {len(latencies)}/{expected}")
+    if latencies:
+        print("Cliente (pulsación -> recepción): "
+              f"p50={percentile(latencies, 50):.1f}ms p95={percentile(latencies, 95):.1f}ms "
+              f"p99={percentile(latencies, 99):.1f}ms max={latencies[-1]:.1f}ms")
+
+    _, stats = request_json(base, 'GET', '/api/emergency/latency-stats')
+    for stage, summary in stats.get('data', {}).items():
+        if summary['count']:
+            print(f"Servidor {stage:<8} n={summary['count']} p50={summary['p50_ms']}ms "
+                  f"p99={summary['p99_ms']}ms max={summary['max_ms']}ms")
+    return 0 if len(latencies) == expected else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Compression benchmark: CPU vs bytes for representative API payloads
+
+Para cada payload y nivel reporta tamaño comprimido, ratio y tiempo de CPU por
+respuesta, para elegir COMPRESS_LEVEL / COMPRESS_BR_LEVEL.
+
+Uso (desde la carpeta Flask):
+    py benchmarks/compression.py --repeat 20
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+from json_serialization import make_rows
+from utils.compression import brotli, compress
+from utils.json_provider import dumps_bytes
+
+
+def make_payloads():
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    notifications = [
+        {
+            'id': i,
+            'user_id': 7,
+            'title': 'Nuevo visitante',
+            'message': f'El visitante {i} ha llegado a la caseta principal.',
+            'read': i % 3 == 0,
+            'is_read': i % 3 == 0,
+            'created_at': base + timedelta(minutes=i)
+        }
+        for i in range(200)
+    ]
+    chat = [
+        {
+            'id': i,
+            'text': f'Mensaje de prueba número {i} sobre el acceso de visitas',
+            'time': (base + timedelta(minutes=i)).strftime('%H:%M'),
+            'sent': i % 2 == 0,
+            'sender_name': 'Administración' if i % 2 else 'Residente',
+            'created_at': base + timedelta(minutes=i)
+        }
+        for i in range(100)
+    ]
+    return {
+        'visitors (50)': {'visitors': make_rows(50), 'exito': True},
+        'visitors (1000)': {'visitors': make_rows(1000), 'exito': True},
+        # notifications y banners duplican la lista por compatibilidad
+        'notifications (200)': {'success': True, 'exito': True, 'data': notifications, 'notifications': notifications},
+        'chat (100)': {'success': True, 'exito': True, 'data': chat}
+    }
+
+
+def measure(data, encoding, level, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        compressed = compress(data, encoding, level)
+        best = min(best, time.perf_counter() - started)
+    return len(compressed), best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de compresión de respuestas')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    candidates = [('gzip', level) for level in (1, 3, 6, 9)]
+    if brotli is not None:
+        candidates += [('br', level) for level in (1, 4, 6, 11)]
+    else:
+        print('brotli no instalado: solo gzip (pip install brotli)')
+
+    for name, payload in make_payloads().items():
+        data = dumps_bytes(payload)
+        print(f"\n{name}: {len(data):,} bytes")
+        print(f"  {'encoding':<10}{'bytes':>10}{'ratio':>8}{'CPU ms':>10}{'MB/s':>9}")
+        for encoding, level in candidates:
+            size, seconds = measure(data, encoding, level, args.repeat)
+            throughput = len(data) / seconds / 1e6 if seconds else float('inf')
+            print(f"  {encoding + '-' + str(level):<10}{size:>10,}{len(data) / size:>8.1f}"
+                  f"{seconds * 1000:>10.3f}{throughput:>9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Gate sync benchmark: tiempo de armado y tamaño del snapshot offline de la caseta
+
+Genera N pases sintéticos (mezcla de visitor / one-time / event) repartidos entre los
+residentes y mide armar las filas, serializar a JSON y comprimir, sin base de datos.
+
+Uso (desde la carpeta Flask):
+    py benchmarks/gate_sync.py --passes 100000 --residents 5000
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils import gate_sync
+from utils.compression import brotli, compress
+from utils.json_provider import dumps_bytes
+
+
+def make_residents(count):
+    return [
+        {
+            'id': i,
+            'name': f'Residente {i}',
+            'user_name': f'residente{i}',
+            'role': 'resident',
+            'street': f'Calle {i % 40}',
+            'house_number': str(i % 300),
+            'address': f'Calle {i % 40}, {i % 300}'
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def make_passes(count, residents):
+    now = datetime.now()
+    types = ('visitor', 'visitor', 'one-time', 'event')
+    passes = []
+    for i in range(count):
+        resident = residents[i % len(residents)]
+        pass_type = types[i % len(types)]
+        passes.append({
+            'id': i + 1,
+            'name': f'Visitante {i}',
+            'type': pass_type,
+            'status': 'active',
+            'created_by': resident['id'],
+            'created_at': now - timedelta(minutes=i % 600),
+            'expires_at': now - timedelta(minutes=i % 600) + timedelta(hours=24) if pass_type == 'one-time' else None,
+            'event_date': date.today() if pass_type == 'event' else '',
+            'event_time': timedelta(hours=19) if pass_type == 'event' else '',
+            'number_of_guests': 20 if pass_type == 'event' else '',
+            'event_location': 'domicilio' if pass_type == 'event' else None,
+            'resident_name': resident['name'],
+            'resident_email': f"{resident['user_name']}@example.com",
+            'resident_street': resident['street'],
+            'resident_house_number': resident['house_number'],
+            'resident_address': resident['address']
+        })
+    return passes
+
+
+def best_of(repeat, fn, *args):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark del snapshot de sincronización de casetas')
+    parser.add_argument('--passes', type=int, default=100000)
+    parser.add_argument('--residents', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    residents = make_residents(args.residents)
+    passes = make_passes(args.passes, residents)
+    version = datetime.now().replace(microsecond=0)
+
+    snapshot, build_ms = best_of(args.repeat, gate_sync.snapshot_payload, version, 1, passes, residents)
+    data, json_ms = best_of(args.repeat, dumps_bytes, snapshot)
+    gzip_data, gzip_ms = best_of(args.repeat, compress, data, 'gzip', 6)
+
+    print(f"{len(snapshot['passes']):,} pases válidos, {len(snapshot['residents']):,} residentes")
+    print(f"  armar filas      {build_ms:>9.1f} ms")
+    print(f"  serializar JSON  {json_ms:>9.1f} ms  {len(data) / 1e6:>7.2f} MB")
+    print(f"  gzip-6           {gzip_ms:>9.1f} ms  {len(gzip_data) / 1e6:>7.2f} MB")
+    if brotli is not None:
+        br_data, br_ms = best_of(args.repeat, compress, data, 'br', 4)
+        print(f"  br-4             {br_ms:>9.1f} ms  {len(br_data) / 1e6:>7.2f} MB")
+    print(f"  bytes por pase (gzip): {len(gzip_data) / max(1, len(snapshot['passes'])):.1f}")
+
+    # Delta típico: 1% de los pases cambió desde la última sincronización
+    changed = passes[::100]
+    delta = gate_sync.snapshot_payload(version, 1, changed, [])
+    delta_data = compress(dumps_bytes(delta), 'gzip', 6)
+    print(f"  delta 1% ({len(changed):,} pases): {len(delta_data) / 1e3:.1f} KB gzip")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+JSON serialization micro-benchmark for visitor lists
+
+Compara el camino anterior (serialize_visitor_for_json por fila + json de Flask con
+sort_keys) con FastJSONProvider sobre filas crudas como las devuelve mysql-connector.
+
+Uso (desde la carpeta Flask):
+    py benchmarks/json_serialization.py --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils.json_provider import dumps_bytes, orjson
+
+
+def make_rows(count):
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    return [
+        {
+            'id': i,
+            'name': f'Visitante {i}',
+            'email': f'visitante{i}@example.com',
+            'phone': '4771234567',
+            'type': 'event' if i % 5 == 0 else 'visitor',
+            'status': 'active',
+            'created_by': i % 300,
+            'codigo_qr': f'https://example.com/qr/{i}',
+            'eventDate': date(2024, 3, 1 + i % 28),
+            'eventTime': timedelta(hours=18, minutes=i % 60),
+            'numberOfGuests': i % 40,
+            'eventLocation': 'Casa club',
+            'created_at': base + timedelta(minutes=i),
+            'updated_at': base + timedelta(minutes=i, seconds=30),
+            'resident_email': f'residente{i % 300}@example.com',
+            'address': f'Calle {i % 50} #{i % 200}',
+            'street': f'Calle {i % 50}',
+            'house_number': str(i % 200)
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_serialize_visitor(visitor):
+    """serialize_visitor_for_json tal como estaba en src/app.py"""
+    serialized = {}
+    for key, value in visitor.items():
+        if value is None:
+            serialized[key] = None
+        elif isinstance(value, datetime):
+            serialized[key] = value.isoformat()
+        elif isinstance(value, date):
+            serialized[key] = value.isoformat()
+        elif isinstance(value, timedelta):
+            total_seconds = int(value.total_seconds())
+            hours = total_seconds // 3600
+            minutes = (total_seconds % 3600) // 60
+            seconds = total_seconds % 60
+            serialized[key] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        else:
+            serialized[key] = value
+    return serialized
+
+
+def legacy(rows):
+    visitors = [legacy_serialize_visitor(row) for row in rows]
+    # Opciones del DefaultJSONProvider de Flask
+    return json.dumps({'visitors': visitors, 'exito': True}, sort_keys=True, ensure_ascii=True).encode('utf-8')
+
+
+def fast(rows):
+    return dumps_bytes({'visitors': rows, 'exito': True})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de serialización JSON de visitantes')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rows = make_rows(args.rows)
+    # Ambos caminos deben producir el mismo documento
+    assert json.loads(legacy(rows)) == json.loads(fast(rows))
+
+    results = {}
+    for name, func in (('legacy', legacy), ('fast', fast)):
+        times = timeit.repeat(lambda: func(rows), number=1, repeat=args.repeat)
+        results[name] = min(times)
+        print(f"{name:<7} {results[name] * 1000:8.2f} ms (mejor de {args.repeat}, {args.rows} filas)")
+    print(f"Encoder: {'orjson ' + orjson.__version__ if orjson else 'json (stdlib)'}")
+    print(f"Aceleración: {results['legacy'] / results['fast']:.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+QR rendering benchmark: imágenes por segundo al generar y al servir desde la caché
+
+Compara el render directo (PNG / SVG) con QRStore: primera petición (render en el
+pool), segunda petición (LRU en memoria) y un proceso nuevo (lectura de disco).
+
+Uso (desde la carpeta Flask):
+    py benchmarks/qr_render.py --count 200 --workers 2
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from utils import qr
+from utils.metrics import percentile
+
+
+def make_payloads(count):
+    # Mismo formato que generate_visitor_qr / generate_event_qr
+    types = ('visitor', 'one-time', 'event')
+    return [json.dumps({'t': types[i % 3], 'id': 1000 + i}) for i in range(count)]
+
+
+def report(label, timings, wall):
+    timings.sort()
+    print(f"  {label:<28}{len(timings) / wall:>10.0f}{percentile(timings, 50):>10.3f}"
+          f"{percentile(timings, 95):>10.3f}{timings[-1]:>10.3f}")
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def run_serial(label, fn, items):
+    started = time.perf_counter()
+    timings = [timed(fn, *item) for item in items]
+    report(label, timings, time.perf_counter() - started)
+
+
+def run_concurrent(label, fn, items, clients):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        timings = list(pool.map(lambda item: timed(fn, *item), items))
+    report(label, timings, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de generación de imágenes QR')
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--size', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=2, help='hilos de render (QR_RENDER_WORKERS)')
+    parser.add_argument('--clients', type=int, default=8, help='peticiones concurrentes simuladas')
+    args = parser.parse_args(argv)
+
+    if not qr.available():
+        print('segno no está instalado (pip install segno)')
+        return 1
+
+    payloads = make_payloads(args.count)
+    print(f"{args.count} QR de {args.size}px, {args.workers} hilos de render, {args.clients} clientes")
+    print(f"  {'caso':<28}{'img/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+
+    for fmt in qr.FORMATS:
+        run_serial(f'render {fmt}', qr.render, [(data, fmt, args.size) for data in payloads])
+
+    directory = tempfile.mkdtemp(prefix='qr-bench-')
+    try:
+        store = qr.QRStore(directory, workers=args.workers, cache_size=args.count)
+        keys = [store.register(data, args.size, prerender=None) for data in payloads]
+        items = [(key, 'png') for key in keys]
+        run_concurrent('store png (render)', store.get, items, args.clients)
+        run_concurrent('store png (memoria)', store.get, items, args.clients)
+
+        # Como un proceso nuevo: LRU vacía (las cachés con nombre se comparten), disco lleno
+        fresh = qr.QRStore(directory, workers=args.workers, cache_size=args.count)
+        fresh._images.invalidate()
+        run_concurrent('store png (disco)', fresh.get, items, args.clients)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+AICP management commands
+
+Uso (desde la carpeta Flask):
+    py manage.py migrate [--target VERSION] [--dry-run]
+    py manage.py migrations-status
+    py manage.py verify-indexes
+    py manage.py rollup-incidents [--since YYYY-MM-DD]
+    py manage.py sweep-passes [--batch-size N]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import mysql.connector
+
+# config.py vive en src/ (la app se ejecuta desde esa carpeta)
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+from config import config
+
+
+def get_connection():
+    """Direct MySQL connection for command-line tasks"""
+    settings = config['development']
+    return mysql.connector.connect(
+        host=settings.MYSQL_HOST,
+        user=settings.MYSQL_USER,
+        password=settings.MYSQL_PASSWORD,
+        database=settings.MYSQL_DATABASE,
+        port=settings.MYSQL_PORT
+    )
+
+
+def cmd_migrate(args):
+    from migrations.runner import get_status, upgrade
+    conn = get_connection()
+    try:
+        applied = upgrade(conn, target=args.target, dry_run=args.dry_run)
+        remaining = [
+            migration['version'] for migration in get_status(conn)
+            if not migration['applied'] and (not args.target or migration['version'] <= args.target)
+        ]
+    finally:
+        conn.close()
+    if args.dry_run:
+        return 0
+    if remaining:
+        # Operaciones que esperan columnas/tablas: el esquema aún no está completo
+        print(f"Migraciones pendientes: {', '.join(remaining)}")
+        return 1
+    if not applied:
+        print('No hay migraciones pendientes')
+    return 0
+
+
+def cmd_migrations_status(args):
+    from migrations.runner import get_status
+    conn = get_connection()
+    try:
+        for migration in get_status(conn):
+            mark = 'x' if migration['applied'] else ' '
+            print(f"[{mark}] {migration['version']} {migration['name']}")
+    finally:
+        conn.close()
+    return 0
+
+
+def cmd_verify_indexes(args):
+    from migrations.explain import verify
+    conn = get_connection()
+    try:
+        if args.analyze:
+            # Estadísticas actualizadas para que el optimizador elija los índices
+            cursor = conn.cursor()
+            for table in ('visitors', 'profiles', 'pending_registrations', 'notifications',
+                          'house_access', 'chat_messages', 'incidents'):
+                try:
+                    cursor.execute(f"ANALYZE TABLE {table}")
+                    cursor.fetchall()
+                except mysql.connector.Error:
+                    pass
+            cursor.close()
+        ok = verify(conn)
+    finally:
+        conn.close()
+    return 0 if ok else 1
+
+
+def cmd_rollup_incidents(args):
+    from utils import incident_rollups
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        rows = incident_rollups.rebuild(cursor, since=args.since)
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    desde = f" desde {args.since}" if args.since else ''
+    print(f"Rollups de incidentes recalculadas{desde} ({rows} filas)")
+    return 0
+
+
+def cmd_sweep_passes(args):
+    from utils import pass_expiry
+    conn = get_connection()
+    try:
+        swept = pass_expiry.sweep(conn, batch_size=args.batch_size)
+    finally:
+        conn.close()
+    print(f"Pases vencidos marcados como expirados: {swept}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Comandos de administración de AICP')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate = subparsers.add_parser('migrate', help='Aplicar migraciones pendientes')
+    migrate.add_argument('--target', help='Aplicar hasta esta versión (inclusive)')
+    migrate.add_argument('--dry-run', action='store_true', help='Mostrar las operaciones sin ejecutarlas')
+    migrate.set_defaults(func=cmd_migrate)
+
+    status = subparsers.add_parser('migrations-status', help='Listar migraciones aplicadas y pendientes')
+    status.set_defaults(func=cmd_migrations_status)
+
+    verify = subparsers.add_parser('verify-indexes', help='EXPLAIN de las consultas críticas; falla si hay full scan o filesort')
+    verify.add_argument('--analyze', action='store_true', help='Ejecutar ANALYZE TABLE antes de verificar')
+    verify.set_defaults(func=cmd_verify_indexes)
+
+    rollup = subparsers.add_parser('rollup-incidents', help='Recalcular las rollups diarias de incidentes')
+    rollup.add_argument('--since', help='Recalcular solo desde esta fecha (YYYY-MM-DD)')
+    rollup.set_defaults(func=cmd_rollup_incidents)
+
+    sweep = subparsers.add_parser('sweep-passes', help="Marcar como 'expired' los pases con expires_at vencido")
+    sweep.add_argument('--batch-size', type=int, default=500, help='Filas por UPDATE/commit')
+    sweep.set_defaults(func=cmd_sweep_passes)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
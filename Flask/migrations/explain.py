@@ -0,0 +1,118 @@
+"""
+EXPLAIN verification of the hot query paths in src/app.py and routes/incidents.py
+
+Las consultas se importan de los módulos que las ejecutan, así que un cambio en el SQL
+de un handler se verifica aquí sin copiarlo a mano.
+"""
+from utils import export
+from utils.addresses import ADDRESSES_SQL
+from utils.chat import conversation_id_query, conversation_query
+from utils.incident_rollups import timeseries_query
+from utils.incidents import INCIDENT_BY_ID_SQL, incidents_query, by_type_query, stats_query
+from utils.notifications import ROSTER_SQL, FRACCIONAMIENTO_ROSTER_SQL, USER_NOTIFICATIONS_SQL, INSERTED_IDS_SQL
+from utils.pass_expiry import SWEEP_SQL, BACKFILL_SQL, ACTIVE_STATUS, EXPIRED_STATUS
+from utils.pass_index import VISITOR_PASSES_SQL, PROFILE_CHANGES_SQL, REGISTRATION_CHANGES_SQL
+from utils.profile_cache import RESIDENTS_SQL, profiles_query
+from utils.visitors import VISITOR_WITH_RESIDENT_SQL, list_query
+
+SINCE = '2024-01-01 00:00:00'
+
+
+def _conversation(**mode):
+    ids_sql, params = conversation_id_query(**mode)
+    return conversation_query(ids_sql, params)
+
+
+def _query(name, built, **options):
+    sql, params = built
+    return (name, sql, tuple(params), options)
+
+
+# (nombre, consulta, parámetros de ejemplo, opciones)
+# allow_filesort: consultas con OR / GROUP BY ... ORDER BY count cuyo resultado ya es
+# pequeño tras usar el índice; el filesort sobre esas filas es aceptable.
+HOT_QUERIES = [
+    _query('visitors.by_resident', list_query(user_id=1)),
+    _query('visitors.by_status', list_query(status='active')),
+    _query('visitors.by_type', list_query(visitor_type='visitor')),
+    ('visitors.by_id', VISITOR_WITH_RESIDENT_SQL, (1,), {}),
+    ('pending_registrations.addresses', ADDRESSES_SQL.format(placeholders='%s, %s'),
+     ('a@example.com', 'b@example.com'), {'allow_filesort': True}),
+    _query('profiles.by_ids', profiles_query('id', [1, 2])),
+    _query('profiles.by_email', profiles_query('email', ['admin@aicp.com'])),
+    ('profiles.residents', RESIDENTS_SQL, (), {}),
+    ('profiles.guards', ROSTER_SQL, (), {}),
+    ('profiles.guards_by_fraccionamiento', FRACCIONAMIENTO_ROSTER_SQL, (1,), {}),
+    ('notifications.by_user', USER_NOTIFICATIONS_SQL, (1,), {}),
+    ('notifications.inserted_ids', INSERTED_IDS_SQL.format(placeholders='%s, %s'),
+     (1, 'title', 'message', 1, 2), {}),
+    # Conversaciones de utils/chat.py: cada rama de la UNION debe resolverse por índice y
+    # el ORDER BY final ordena solo las filas de la conversación
+    _query('chat.one_to_one', _conversation(sender_id=1, receiver_id=2), allow_filesort=True),
+    _query('chat.tab_by_user', _conversation(chat_type='administration', user_id=1), allow_filesort=True),
+    _query('chat.by_user', _conversation(user_id=1), allow_filesort=True),
+    _query('incidents.list', incidents_query(fraccionamiento_id=1)),
+    _query('incidents.by_status', incidents_query(status='reported')),
+    ('incidents.by_id', INCIDENT_BY_ID_SQL, ('00000000-0000-0000-0000-000000000000',), {}),
+    _query('incidents.stats', stats_query(fraccionamiento_id=1, start_date='2024-01-01'), allow_filesort=True),
+    _query('incidents.stats_by_type', by_type_query(fraccionamiento_id=1), allow_filesort=True),
+    # Series de tiempo: rango por (fraccionamiento_id, day) sobre la tabla de rollups
+    _query('incidents.timeseries', timeseries_query('month', 'type', fraccionamiento_id=1, start_date='2024-01-01'),
+           allow_filesort=True),
+    ('pass_index.visitor_changes', VISITOR_PASSES_SQL.format(where='v.updated_at >= %s'), (SINCE,), {}),
+    ('pass_index.profile_changes', PROFILE_CHANGES_SQL, (SINCE,), {}),
+    ('pass_index.registration_changes', REGISTRATION_CHANGES_SQL, (SINCE,), {}),
+    ('visitors.expiry_sweep', SWEEP_SQL, (EXPIRED_STATUS, ACTIVE_STATUS, 500), {}),
+    ('visitors.expiry_backfill', BACKFILL_SQL, (86400, ACTIVE_STATUS, 500), {}),
+] + [
+    # Exportaciones por rango de fechas y fraccionamiento (house_access solo se lee aquí)
+    _query(f'export.{dataset}', export.build_query(dataset, {'start': SINCE, 'fraccionamiento_id': 1}),
+           allow_filesort=True)
+    for dataset in export.EXPORTS
+]
+
+
+def check_plan(rows, allow_filesort=False):
+    """Return the list of problems found in an EXPLAIN result"""
+    problems = []
+    for row in rows:
+        table = row.get('table') or ''
+        if table.startswith('<'):
+            # Tablas temporales de UNION/derivadas: su tamaño ya está acotado por los índices
+            continue
+        access_type = (row.get('type') or '').upper()
+        extra = row.get('Extra') or ''
+        if access_type == 'ALL':
+            problems.append(f'full scan en {table}')
+        if 'Using filesort' in extra and not allow_filesort:
+            problems.append(f'filesort en {table}')
+    return problems
+
+
+def verify(conn, log=print):
+    """EXPLAIN every hot query; returns True if none falls back to a full scan or filesort"""
+    cursor = conn.cursor(dictionary=True)
+    failures = 0
+    skipped = 0
+    try:
+        for name, query, params, options in HOT_QUERIES:
+            try:
+                cursor.execute('EXPLAIN ' + query, params)
+                rows = cursor.fetchall()
+            except Exception as e:
+                # Tablas o columnas que no existen en esta instalación
+                log(f"SKIP  {name}: {e}")
+                skipped += 1
+                continue
+            problems = check_plan(rows, options.get('allow_filesort', False))
+            if problems:
+                failures += 1
+                log(f"FAIL  {name}: {'; '.join(problems)}")
+            else:
+                keys = ', '.join(str(row.get('key')) for row in rows)
+                log(f"OK    {name} (índices: {keys})")
+    finally:
+        cursor.close()
+    checked = len(HOT_QUERIES) - skipped
+    log(f"{checked - failures}/{checked} consultas sin full scan ni filesort ({skipped} omitidas)")
+    return failures == 0
@@ -0,0 +1,94 @@
+"""
+Migration operations - idempotent schema changes
+"""
+
+
+class Pending(str):
+    """Result of an operation that could not run yet (missing table/columns).
+
+    La migración no se registra como aplicada y se reintenta en el próximo migrate.
+    """
+
+
+def table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) AS n FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+        (table,)
+    )
+    return cursor.fetchone()['n'] > 0
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT COUNT(*) AS n FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column)
+    )
+    return cursor.fetchone()['n'] > 0
+
+
+def index_exists(cursor, table, index_name):
+    cursor.execute(
+        "SELECT COUNT(*) AS n FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+        (table, index_name)
+    )
+    return cursor.fetchone()['n'] > 0
+
+
+class AddIndex:
+    """Create an index unless it already exists or a column is missing"""
+
+    def __init__(self, table, name, columns):
+        self.table = table
+        self.name = name
+        self.columns = columns
+
+    def describe(self):
+        return f"CREATE INDEX {self.name} ON {self.table} ({', '.join(self.columns)})"
+
+    def apply(self, cursor):
+        if not table_exists(cursor, self.table):
+            return Pending(f'pendiente: no existe la tabla {self.table}')
+        if index_exists(cursor, self.table, self.name):
+            return 'omitido: el índice ya existe'
+        missing = [c for c in self.columns if not column_exists(cursor, self.table, c)]
+        if missing:
+            # Algunas instalaciones no tienen las columnas nuevas (p. ej. chat_messages.sender_id)
+            return Pending(f"pendiente: faltan columnas {', '.join(missing)}")
+        columns_sql = ', '.join(f'`{c}`' for c in self.columns)
+        cursor.execute(f"CREATE INDEX `{self.name}` ON `{self.table}` ({columns_sql})")
+        return 'aplicado'
+
+
+class AddColumn:
+    """Add a column unless it already exists"""
+
+    def __init__(self, table, column, definition):
+        self.table = table
+        self.column = column
+        self.definition = definition
+
+    def describe(self):
+        return f"ALTER TABLE {self.table} ADD COLUMN {self.column} {self.definition}"
+
+    def apply(self, cursor):
+        if not table_exists(cursor, self.table):
+            return Pending(f'pendiente: no existe la tabla {self.table}')
+        if column_exists(cursor, self.table, self.column):
+            return 'omitido: la columna ya existe'
+        cursor.execute(f"ALTER TABLE `{self.table}` ADD COLUMN `{self.column}` {self.definition}")
+        return 'aplicado'
+
+
+class RunSQL:
+    """Run a raw SQL statement (must be idempotent, e.g. CREATE TABLE IF NOT EXISTS)"""
+
+    def __init__(self, sql, params=None):
+        self.sql = sql
+        self.params = params
+
+    def describe(self):
+        return ' '.join(self.sql.split())
+
+    def apply(self, cursor):
+        cursor.execute(self.sql, self.params or ())
+        return 'aplicado'
@@ -0,0 +1,77 @@
+"""
+Versioned migration runner
+"""
+from datetime import datetime
+from migrations.operations import Pending
+from migrations.versions import MIGRATIONS
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(32) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """)
+
+
+def applied_versions(cursor):
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def get_status(conn):
+    """List every migration with whether it has been applied"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        applied = applied_versions(cursor)
+        return [
+            {'version': version, 'name': name, 'applied': version in applied}
+            for version, name, _ in MIGRATIONS
+        ]
+    finally:
+        cursor.close()
+
+
+def upgrade(conn, target=None, dry_run=False, log=print):
+    """Apply pending migrations in order (up to `target` if given).
+
+    Returns the list of versions applied. A migration with an operation that could not
+    run yet (Pending) is not recorded, so the next upgrade retries it.
+    """
+    cursor = conn.cursor(dictionary=True)
+    applied_now = []
+    try:
+        applied = applied_versions(cursor)
+        conn.commit()
+        for version, name, operations in MIGRATIONS:
+            if target and version > target:
+                break
+            if version in applied:
+                continue
+            log(f"==> {version} {name}")
+            pending = False
+            for operation in operations:
+                if dry_run:
+                    log(f"    [dry-run] {operation.describe()}")
+                    continue
+                result = operation.apply(cursor)
+                log(f"    {operation.describe()} -> {result}")
+                pending = pending or isinstance(result, Pending)
+            if pending:
+                # Las demás operaciones son idempotentes: se repiten sin problema al reintentar
+                log(f"    {version} queda pendiente: se reintentará en el próximo migrate")
+                continue
+            if not dry_run:
+                # Los DDL hacen commit implícito en MySQL; registrar la versión al final
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                    (version, name, datetime.now())
+                )
+                conn.commit()
+            applied_now.append(version)
+        return applied_now
+    finally:
+        cursor.close()
@@ -0,0 +1,70 @@
+"""
+Ordered list of schema migrations
+
+Cada migración es (versión, nombre, [operaciones]). Nunca cambiar una migración
+ya publicada: agregar una nueva al final.
+"""
+from migrations.operations import AddColumn, AddIndex, RunSQL
+from utils import gate_sync, incident_rollups, sessions
+
+MIGRATIONS = [
+    ('0001', 'visitors_hot_path_indexes', [
+        # GET /api/visitors: filtros por residente/estado/tipo ordenados por created_at DESC
+        AddIndex('visitors', 'idx_visitors_created_by_created_at', ['created_by', 'created_at']),
+        AddIndex('visitors', 'idx_visitors_status_created_at', ['status', 'created_at']),
+        AddIndex('visitors', 'idx_visitors_type_created_at', ['type', 'created_at']),
+        AddIndex('visitors', 'idx_visitors_created_at', ['created_at']),
+    ]),
+    ('0002', 'notifications_user_indexes', [
+        AddIndex('notifications', 'idx_notifications_user_created_at', ['user_id', 'created_at']),
+    ]),
+    ('0003', 'house_access_indexes', [
+        AddIndex('house_access', 'idx_house_access_user_created_at', ['user_id', 'created_at']),
+        AddIndex('house_access', 'idx_house_access_fracc_created_at', ['fraccionamiento_id', 'created_at']),
+    ]),
+    ('0004', 'chat_messages_indexes', [
+        # Estructura antigua (user_id + chat_type) y nueva (sender_id/receiver_id)
+        AddIndex('chat_messages', 'idx_chat_user_type_created_at', ['user_id', 'chat_type', 'created_at']),
+        AddIndex('chat_messages', 'idx_chat_sender_receiver_created_at', ['sender_id', 'receiver_id', 'created_at']),
+        AddIndex('chat_messages', 'idx_chat_sender_created_at', ['sender_id', 'created_at']),
+        AddIndex('chat_messages', 'idx_chat_receiver_created_at', ['receiver_id', 'created_at']),
+        AddIndex('chat_messages', 'idx_chat_fracc_created_at', ['fraccionamiento_id', 'created_at']),
+    ]),
+    ('0005', 'incidents_and_profiles_indexes', [
+        AddIndex('incidents', 'idx_incidents_fracc_reported_at', ['fraccionamiento_id', 'reported_at']),
+        AddIndex('incidents', 'idx_incidents_status_reported_at', ['status', 'reported_at']),
+        # Listado de residentes y roster de guardias
+        AddIndex('profiles', 'idx_profiles_role_name', ['role', 'name']),
+    ]),
+    ('0006', 'incidents_stats_covering_index', [
+        # GET /api/incidents/stats: el GROUP BY se resuelve solo con el índice, sin leer description/notes
+        AddIndex('incidents', 'idx_incidents_stats',
+                 ['fraccionamiento_id', 'reported_at', 'status', 'severity', 'incident_type']),
+    ]),
+    ('0007', 'incident_daily_rollups', [
+        # Conteos diarios para las series de tiempo de /api/incidents/stats/timeseries
+        RunSQL(incident_rollups.CREATE_TABLE_SQL),
+        RunSQL(incident_rollups.backfill_sql()),
+    ]),
+    ('0008', 'pass_index_updated_at_indexes', [
+        # Actualización incremental del índice de pases de decode-qr (utils/pass_index.py)
+        AddIndex('visitors', 'idx_visitors_updated_at', ['updated_at']),
+        AddIndex('profiles', 'idx_profiles_updated_at', ['updated_at']),
+        AddIndex('pending_registrations', 'idx_pending_registrations_updated_at', ['updated_at']),
+    ]),
+    ('0009', 'gate_sync_tombstones', [
+        # Borrados de pases para los deltas de /api/gate-sync/delta
+        RunSQL(gate_sync.CREATE_TOMBSTONES_SQL),
+    ]),
+    ('0010', 'visitors_expires_at', [
+        # Expiración guardada de los pases de solo una vez; el sweeper y los listados usan el índice
+        AddColumn('visitors', 'expires_at', "DATETIME NULL DEFAULT NULL COMMENT 'NULL = no expira'"),
+        RunSQL("""UPDATE visitors SET expires_at = created_at + INTERVAL 24 HOUR
+                  WHERE type = 'one-time' AND expires_at IS NULL AND created_at IS NOT NULL"""),
+        AddIndex('visitors', 'idx_visitors_status_expires_at', ['status', 'expires_at']),
+    ]),
+    ('0011', 'auth_sessions', [
+        # Sesiones con token emitidas por /api/auth/login (utils/sessions.py)
+        RunSQL(sessions.CREATE_SESSIONS_SQL),
+    ]),
+]
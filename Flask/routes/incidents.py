@@ -2,27 +2,12 @@
 Incidents routes
 """
 from flask import Blueprint, request, jsonify, current_app
-import mysql.connector
 from mysql.connector import Error
 from datetime import datetime
 import uuid
-
-def get_connection():
-    """Get MySQL database connection"""
-    try:
-        from src.app import app
-        
-        connection = mysql.connector.connect(
-            host=app.config['MYSQL_HOST'],
-            user=app.config['MYSQL_USER'],
-            password=app.config['MYSQL_PASSWORD'],
-            database=app.config['MYSQL_DATABASE'],
-            port=app.config.get('MYSQL_PORT', 3306)
-        )
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
+from utils.database import get_connection
+from utils import incident_rollups
+from utils.incidents import INCIDENT_BY_ID_SQL, incidents_query, by_type_query, stats_query
 
 incidents_bp = Blueprint('incidents', __name__)
 
@@ -47,35 +32,14 @@ def get_incidents():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Construir query base
-        query = "SELECT * FROM incidents WHERE 1=1"
-        params = []
-        
-        if status:
-            query += " AND status = %s"
-            params.append(status)
-        
-        if incident_type:
-            query += " AND incident_type = %s"
-            params.append(incident_type)
-        
-        if severity:
-            query += " AND severity = %s"
-            params.append(severity)
-        
-        if fraccionamiento_id:
-            query += " AND fraccionamiento_id = %s"
-            params.append(fraccionamiento_id)
-        
-        if start_date:
-            query += " AND reported_at >= %s"
-            params.append(start_date)
-        
-        if end_date:
-            query += " AND reported_at <= %s"
-            params.append(end_date)
-        
-        query += " ORDER BY reported_at DESC"
+        query, params = incidents_query(
+            status=status,
+            incident_type=incident_type,
+            severity=severity,
+            fraccionamiento_id=fraccionamiento_id,
+            start_date=start_date,
+            end_date=end_date
+        )
         
         cursor.execute(query, params)
         incidents = cursor.fetchall()
@@ -83,12 +47,6 @@ def get_incidents():
         cursor.close()
         conn.close()
         
-        # Convertir datetime a string para JSON
-        for incident in incidents:
-            for key in ['reported_at', 'resolved_at', 'created_at', 'updated_at']:
-                if incident.get(key) and hasattr(incident[key], 'isoformat'):
-                    incident[key] = incident[key].isoformat()
-        
         return jsonify({
             'success': True,
             'data': incidents
@@ -117,7 +75,7 @@ def get_incident(incident_id):
             }), 500
         
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM incidents WHERE id = %s", (incident_id,))
+        cursor.execute(INCIDENT_BY_ID_SQL, (incident_id,))
         incident = cursor.fetchone()
         
         cursor.close()
@@ -129,11 +87,6 @@ def get_incident(incident_id):
                 'mensaje': 'Incidente no encontrado'
             }), 404
         
-        # Convertir datetime a string
-        for key in ['reported_at', 'resolved_at', 'created_at', 'updated_at']:
-            if incident.get(key) and hasattr(incident[key], 'isoformat'):
-                incident[key] = incident[key].isoformat()
-        
         return jsonify({
             'success': True,
             'data': incident
@@ -192,21 +145,18 @@ def create_incident():
             now,
             now
         ))
+        # Rollup diaria en la misma transacción
+        incident_rollups.apply_incident(cursor, incident_id, 1)
         
         conn.commit()
         
         # Obtener el incidente creado
-        cursor.execute("SELECT * FROM incidents WHERE id = %s", (incident_id,))
+        cursor.execute(INCIDENT_BY_ID_SQL, (incident_id,))
         incident = cursor.fetchone()
         
         cursor.close()
         conn.close()
         
-        # Convertir datetime a string
-        for key in ['reported_at', 'resolved_at', 'created_at', 'updated_at']:
-            if incident.get(key) and hasattr(incident[key], 'isoformat'):
-                incident[key] = incident[key].isoformat()
-        
         return jsonify({
             'success': True,
             'data': incident
@@ -239,7 +189,7 @@ def update_incident(incident_id):
         cursor = conn.cursor(dictionary=True)
         
         # Verificar que el incidente existe
-        cursor.execute("SELECT * FROM incidents WHERE id = %s", (incident_id,))
+        cursor.execute(INCIDENT_BY_ID_SQL, (incident_id,))
         incident = cursor.fetchone()
         
         if not incident:
@@ -274,23 +224,26 @@ def update_incident(incident_id):
         update_values.append(datetime.now())
         update_values.append(incident_id)
         
+        # Mover el conteo de la rollup si cambia tipo, severidad o estado
+        moves_rollup = any(field in data for field in incident_rollups.KEY_FIELDS)
+        if moves_rollup:
+            incident_rollups.apply_incident(cursor, incident_id, -1)
+        
         query = f"UPDATE incidents SET {', '.join(update_fields)} WHERE id = %s"
         cursor.execute(query, update_values)
         
+        if moves_rollup:
+            incident_rollups.apply_incident(cursor, incident_id, 1)
+        
         conn.commit()
         
         # Obtener el incidente actualizado
-        cursor.execute("SELECT * FROM incidents WHERE id = %s", (incident_id,))
+        cursor.execute(INCIDENT_BY_ID_SQL, (incident_id,))
         updated_incident = cursor.fetchone()
         
         cursor.close()
         conn.close()
         
-        # Convertir datetime a string
-        for key in ['reported_at', 'resolved_at', 'created_at', 'updated_at']:
-            if updated_incident.get(key) and hasattr(updated_incident[key], 'isoformat'):
-                updated_incident[key] = updated_incident[key].isoformat()
-        
         return jsonify({
             'success': True,
             'data': updated_incident
@@ -319,6 +272,8 @@ def delete_incident(incident_id):
             }), 500
         
         cursor = conn.cursor()
+        # Descontar de la rollup antes de borrar (no hace nada si el incidente no existe)
+        incident_rollups.apply_incident(cursor, incident_id, -1)
         cursor.execute("DELETE FROM incidents WHERE id = %s", (incident_id,))
         
         if cursor.rowcount == 0:
@@ -367,37 +322,79 @@ def get_incidents_by_type():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Construir query
-        query = """
-            SELECT incident_type, COUNT(*) as count 
-            FROM incidents 
-            WHERE 1=1
-        """
-        params = []
+        query, params = by_type_query(
+            fraccionamiento_id=fraccionamiento_id,
+            start_date=start_date,
+            end_date=end_date
+        )
         
-        if fraccionamiento_id:
-            query += " AND fraccionamiento_id = %s"
-            params.append(fraccionamiento_id)
+        cursor.execute(query, params)
+        results = cursor.fetchall()
         
-        if start_date:
-            query += " AND reported_at >= %s"
-            params.append(start_date)
+        cursor.close()
+        conn.close()
         
-        if end_date:
-            query += " AND reported_at <= %s"
-            params.append(end_date)
+        return jsonify({
+            'success': True,
+            'data': results
+        }), 200
         
-        query += " GROUP BY incident_type ORDER BY count DESC"
+    except Error as e:
+        return jsonify({
+            'success': False,
+            'mensaje': f'Error en la base de datos: {str(e)}'
+        }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'mensaje': f'Error al obtener estadísticas: {str(e)}'
+        }), 500
+
+@incidents_bp.route('/stats/timeseries', methods=['GET'])
+def get_incident_timeseries():
+    """Incident counts per day/week/month, read only from the daily rollups"""
+    try:
+        bucket = request.args.get('bucket', 'day')
+        group_by = request.args.get('group_by')
+        if bucket not in incident_rollups.BUCKETS:
+            return jsonify({
+                'success': False,
+                'mensaje': 'bucket debe ser day, week o month'
+            }), 400
+        if group_by and group_by not in incident_rollups.GROUPS:
+            return jsonify({
+                'success': False,
+                'mensaje': 'group_by debe ser type, severity o status'
+            }), 400
+        
+        conn = get_connection()
+        if not conn:
+            return jsonify({
+                'success': False,
+                'mensaje': 'Error de conexión a la base de datos'
+            }), 500
         
+        cursor = conn.cursor(dictionary=True)
+        query, params = incident_rollups.timeseries_query(
+            bucket,
+            group_by,
+            fraccionamiento_id=request.args.get('fraccionamiento_id'),
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date')
+        )
         cursor.execute(query, params)
-        results = cursor.fetchall()
+        rows = cursor.fetchall()
         
         cursor.close()
         conn.close()
         
         return jsonify({
             'success': True,
-            'data': results
+            'data': {
+                'bucket': bucket,
+                'group_by': group_by,
+                'series': incident_rollups.build_series(rows, bool(group_by))
+            }
         }), 200
         
     except Error as e:
@@ -408,7 +405,7 @@ def get_incidents_by_type():
     except Exception as e:
         return jsonify({
             'success': False,
-            'mensaje': f'Error al obtener estadísticas: {str(e)}'
+            'mensaje': f'Error al obtener la serie de incidentes: {str(e)}'
         }), 500
 
 @incidents_bp.route('/stats', methods=['GET'])
@@ -424,42 +421,38 @@ def get_incident_stats():
         
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener parámetros opcionales
+        # Obtener parámetros opcionales (mismos filtros que stats/by-type)
         fraccionamiento_id = request.args.get('fraccionamiento_id')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
         
-        query = "SELECT * FROM incidents WHERE 1=1"
-        params = []
-        
-        if fraccionamiento_id:
-            query += " AND fraccionamiento_id = %s"
-            params.append(fraccionamiento_id)
+        # Conteo en la base de datos: solo vuelve una fila por combinación estado/severidad/tipo
+        query, params = stats_query(
+            fraccionamiento_id=fraccionamiento_id,
+            start_date=start_date,
+            end_date=end_date
+        )
         
         cursor.execute(query, params)
-        incidents = cursor.fetchall()
+        groups = cursor.fetchall()
+        
+        cursor.close()
+        conn.close()
         
-        # Calcular estadísticas
+        # Calcular estadísticas a partir de los grupos
         stats = {
-            'total': len(incidents),
+            'total': 0,
             'by_status': {},
             'by_severity': {},
             'by_type': {}
         }
         
-        for incident in incidents:
-            # Por estado
-            status = incident.get('status', 'reported')
-            stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
-            
-            # Por severidad
-            severity = incident.get('severity', 'medium')
-            stats['by_severity'][severity] = stats['by_severity'].get(severity, 0) + 1
-            
-            # Por tipo
-            incident_type = incident.get('incident_type', 'otro')
-            stats['by_type'][incident_type] = stats['by_type'].get(incident_type, 0) + 1
-        
-        cursor.close()
-        conn.close()
+        for group in groups:
+            count = int(group['count'])
+            stats['total'] += count
+            stats['by_status'][group['status']] = stats['by_status'].get(group['status'], 0) + count
+            stats['by_severity'][group['severity']] = stats['by_severity'].get(group['severity'], 0) + count
+            stats['by_type'][group['incident_type']] = stats['by_type'].get(group['incident_type'], 0) + count
         
         return jsonify({
             'success': True,
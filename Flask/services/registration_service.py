@@ -4,6 +4,12 @@ Registration service
 from typing import Dict
 from supabase import Client
 from datetime import datetime
+from utils.cache import create_cache
+
+# Conteos del dashboard: se recalculan como máximo cada STATS_TTL segundos por worker
+STATS_TTL = 30
+STATUSES = ('pending', 'approved', 'rejected')
+_stats_cache = create_cache('registration_stats', maxsize=1, ttl=STATS_TTL)
 
 class RegistrationService:
     """Service for registration operations"""
@@ -43,6 +49,7 @@ class RegistrationService:
             if not response.data:
                 return {'error': 'Error al crear registro'}
             
+            _stats_cache.invalidate()
             return {'data': response.data[0] if response.data else None}
         except Exception as e:
             return {'error': str(e)}
@@ -77,6 +84,7 @@ class RegistrationService:
             
             # Update registration status
             self.supabase.table('pending_registrations').update({'status': 'approved'}).eq('id', registration_id).execute()
+            _stats_cache.invalidate()
             
             return {'data': profile_response.data[0] if profile_response.data else None}
             
@@ -97,30 +105,27 @@ class RegistrationService:
             if not response.data:
                 return {'error': 'Registro no encontrado'}
             
+            _stats_cache.invalidate()
             return {'success': True}
         except Exception as e:
             return {'error': str(e)}
     
+    def _count(self, status: str = None) -> int:
+        """Exact row count with a HEAD request (no rows are transferred)"""
+        query = self.supabase.table('pending_registrations').select('id', count='exact', head=True)
+        if status:
+            query = query.eq('status', status)
+        return query.execute().count or 0
+    
+    def _load_statistics(self) -> Dict:
+        stats = {'total': self._count()}
+        for status in STATUSES:
+            stats[status] = self._count(status)
+        return stats
+    
     def get_registration_statistics(self) -> Dict:
-        """Get registration statistics"""
+        """Get registration statistics (HEAD counts, cached for STATS_TTL seconds)"""
         try:
-            response = self.supabase.table('pending_registrations').select('status').execute()
-            
-            registrations = response.data if response.data else []
-            
-            stats = {
-                'total': len(registrations),
-                'pending': 0,
-                'approved': 0,
-                'rejected': 0
-            }
-            
-            for reg in registrations:
-                status = reg.get('status', 'pending')
-                if status in stats:
-                    stats[status] += 1
-            
-            return {'data': stats}
+            return {'data': _stats_cache.get_or_load('all', self._load_statistics)}
         except Exception as e:
             return {'error': str(e)}
-
@@ -1,14 +1,38 @@
 """
 Visitor service
 """
+import time
 from typing import Dict, List, Optional
 from supabase import Client
+from utils.cache import create_cache
+
+# Conteos del dashboard: se recalculan como máximo cada STATS_TTL segundos por worker
+STATS_TTL = 30
+_stats_cache = create_cache('visitor_stats', maxsize=1, ttl=STATS_TTL)
+
+# Valores conocidos para los conteos con head=True cuando no existe la RPC
+# dentro / salio los escriben el escáner de la caseta y el historial al registrar entrada y salida
+KNOWN_STATUSES = ('active', 'inactive', 'used', 'expired', 'dentro', 'salio')
+KNOWN_TYPES = ('visitor', 'one-time', 'event', 'resident')
+
+# RPC opcional (crear en el SQL editor de Supabase) que agrupa en Postgres:
+#   create or replace function visitor_statistics()
+#   returns table(status text, type text, count bigint) language sql stable as $$
+#     select coalesce(status, 'unknown'), coalesce(type, 'unknown'), count(*)
+#     from visitors group by 1, 2
+#   $$;
+STATS_RPC = 'visitor_statistics'
+# Códigos de PostgREST/Postgres cuando la función no existe; tras ellos se reintenta la RPC
+# cada STATS_RPC_RETRY segundos (por si se crea después sin reiniciar el worker)
+STATS_RPC_MISSING_CODES = ('PGRST202', '42883')
+STATS_RPC_RETRY = 600
 
 class VisitorService:
     """Service for visitor operations"""
     
     def __init__(self, supabase_client: Client):
         self.supabase = supabase_client
+        self._stats_rpc_retry_at = 0.0
     
     def get_all_visitors(self) -> Dict:
         """Get all visitors"""
@@ -71,6 +95,7 @@ class VisitorService:
             if not response.data:
                 return {'error': 'Error al crear visitante'}
             
+            _stats_cache.invalidate()
             return {'data': response.data[0] if response.data else None}
         except Exception as e:
             return {'error': str(e)}
@@ -83,6 +108,7 @@ class VisitorService:
             if not response.data:
                 return {'error': 'Visitante no encontrado'}
             
+            _stats_cache.invalidate()
             return {'data': response.data[0] if response.data else None}
         except Exception as e:
             return {'error': str(e)}
@@ -91,34 +117,60 @@ class VisitorService:
         """Delete visitor"""
         try:
             response = self.supabase.table('visitors').delete().eq('id', visitor_id).execute()
+            _stats_cache.invalidate()
             return {'success': True}
         except Exception as e:
             return {'error': str(e)}
     
+    def _count(self, column: Optional[str] = None, value: Optional[str] = None) -> int:
+        """Exact row count with a HEAD request (no rows are transferred)"""
+        query = self.supabase.table('visitors').select('id', count='exact', head=True)
+        if column:
+            query = query.eq(column, value)
+        return query.execute().count or 0
+    
+    def _statistics_from_rpc(self) -> Optional[Dict]:
+        """Counts grouped by status and type in Postgres; None if the RPC is not installed"""
+        if time.monotonic() < self._stats_rpc_retry_at:
+            return None
+        try:
+            rows = self.supabase.rpc(STATS_RPC).execute().data or []
+        except Exception as e:
+            # Sin la función en la base: conteos con head=True hasta el próximo reintento.
+            # Cualquier otro error (red, timeout) solo afecta a este cálculo.
+            if getattr(e, 'code', None) in STATS_RPC_MISSING_CODES:
+                self._stats_rpc_retry_at = time.monotonic() + STATS_RPC_RETRY
+            return None
+        
+        stats = {'total': 0, 'by_status': {}, 'by_type': {}}
+        for row in rows:
+            count = int(row['count'])
+            stats['total'] += count
+            stats['by_status'][row['status']] = stats['by_status'].get(row['status'], 0) + count
+            stats['by_type'][row['type']] = stats['by_type'].get(row['type'], 0) + count
+        return stats
+    
+    def _statistics_from_counts(self) -> Dict:
+        """One HEAD count per known status/type; anything else is reported as 'unknown'"""
+        total = self._count()
+        stats = {'total': total, 'by_status': {}, 'by_type': {}}
+        for key, column, values in (('by_status', 'status', KNOWN_STATUSES), ('by_type', 'type', KNOWN_TYPES)):
+            for value in values:
+                count = self._count(column, value)
+                if count:
+                    stats[key][value] = count
+            other = total - sum(stats[key].values())
+            if other > 0:
+                stats[key]['unknown'] = other
+        return stats
+    
     def get_visitor_statistics(self) -> Dict:
-        """Get visitor statistics"""
+        """Get visitor statistics (aggregated server-side, cached for STATS_TTL seconds)"""
         try:
-            # Get all visitors to calculate stats
-            all_visitors = self.supabase.table('visitors').select('status, type').execute()
-            
-            visitors = all_visitors.data if all_visitors.data else []
-            
-            stats = {
-                'total': len(visitors),
-                'by_status': {},
-                'by_type': {}
-            }
-            
-            for visitor in visitors:
-                # Count by status
-                status = visitor.get('status', 'unknown')
-                stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
-                
-                # Count by type
-                visitor_type = visitor.get('type', 'unknown')
-                stats['by_type'][visitor_type] = stats['by_type'].get(visitor_type, 0) + 1
-            
+            stats = _stats_cache.get_or_load(
+                'all',
+                lambda: self._statistics_from_rpc() or self._statistics_from_counts()
+            )
             return {'data': stats}
         except Exception as e:
             return {'error': str(e)}
-
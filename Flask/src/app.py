@@ -2,13 +2,14 @@
 AICP Flask Backend API
 Main application entry point - MySQL (XAMPP)
 """
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context, url_for
 from flask_cors import CORS
 from config import config
-import mysql.connector
 from mysql.connector import Error
-from datetime import datetime, date, timedelta, time
+from datetime import datetime
 import os
+import threading
+import urllib.parse
 import uuid
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -20,59 +21,87 @@ parent_dir = Path(__file__).parent.parent
 env_path = parent_dir / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Permitir importar los paquetes compartidos (utils, routes, services)
+if str(parent_dir) not in sys.path:
+    sys.path.insert(0, str(parent_dir))
+from utils.database import init_app as init_db_pool, get_connection, get_pool_stats, connection as db_connection
+from utils.addresses import resolve_address, resolve_addresses
+from utils.cache import create_cache, get_cache_stats
+from utils.broker import init_app as init_broker, get_broker, publish as publish_event
+from utils.chat import fetch_conversation, is_backward
+from utils.compression import init_app as init_compression, no_compress
+from utils.metrics import LatencyTracker
+from utils.notifications import init_app as init_notifications, USER_NOTIFICATIONS_SQL, ALL_GUARDS_CHANNEL, alert_channel as guard_alert_channel, get_alert_recipients, insert_notifications, invalidate_guard_roster
+from utils import export, fraccionamientos, gate_sync, profile_cache, schema
+from utils import visitors as visitor_queries
+from utils.etag import compute_etag, is_not_modified, not_modified, tag_response
+from utils.json_provider import FastJSONProvider
+from utils.pagination import InvalidCursorError, decode_cursor, encode_cursor, parse_limit
+from utils import qr as qr_images
+from utils.pass_expiry import init_app as init_pass_sweeper, get_sweeper as get_pass_sweeper, is_enabled as pass_expiry_enabled, is_expired as pass_is_expired, one_time_expiry, pass_expires_at
+from utils.pass_index import init_app as init_pass_index, get_pass_index, mark_stale as mark_passes_stale, load_visitor_passes, resident_entries, resident_pass_info, visitor_pass_info
+from utils.pass_tokens import init_app as init_pass_tokens, InvalidPassError, encode_pass, end_of_day, verify_pass
+from utils.sessions import init_app as init_sessions, InvalidSessionError, create_session, resolve as resolve_session, revoke as revoke_session, forget as forget_session
+
 app = Flask(__name__)
 app.config.from_object(config['development'])
 
+# Serialización JSON rápida: jsonify acepta directamente filas con datetime/date/timedelta
+app.json = FastJSONProvider(app)
+
 # Configure CORS - Permite todas las peticiones desde el frontend
 cors_origins = app.config.get('CORS_ORIGINS', ['http://localhost:4200'])
 # Configuración más permisiva para desarrollo
 CORS(app, 
      origins=cors_origins,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-     allow_headers=["Content-Type", "Authorization", "X-Requested-With", "Accept"],
+     allow_headers=["Content-Type", "Authorization", "X-Requested-With", "Accept", "If-None-Match"],
+     expose_headers=["ETag"],
      supports_credentials=True,
      max_age=3600)
 
-# Database connection function
-def get_connection():
-    """Get MySQL database connection"""
-    try:
-        connection = mysql.connector.connect(
-            host=app.config['MYSQL_HOST'],
-            user=app.config['MYSQL_USER'],
-            password=app.config['MYSQL_PASSWORD'],
-            database=app.config['MYSQL_DATABASE'],
-            port=app.config.get('MYSQL_PORT', 3306)
-        )
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None
+# Pool compartido de conexiones MySQL (una conexión por petición, devuelta al pool al terminar)
+init_db_pool(app)
 
-# Helper function to serialize visitor data for JSON
-def serialize_visitor_for_json(visitor):
-    """Convert datetime, date, and timedelta objects to strings for JSON serialization"""
-    if not visitor:
-        return visitor
-    
-    serialized = {}
-    for key, value in visitor.items():
-        if value is None:
-            serialized[key] = None
-        elif isinstance(value, datetime):
-            serialized[key] = value.isoformat()
-        elif isinstance(value, date):
-            serialized[key] = value.isoformat()
-        elif isinstance(value, timedelta):
-            # Convert timedelta to HH:MM:SS format
-            total_seconds = int(value.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            seconds = total_seconds % 60
-            serialized[key] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        else:
-            serialized[key] = value
-    return serialized
+# Tablas/columnas creadas por migraciones: las que faltan se vuelven a comprobar periódicamente
+schema.init_app(app)
+
+# Tabla fraccionamientos en memoria (recargada si cambia su CHECKSUM)
+fraccionamientos.init_app(app)
+
+# Broker de eventos para los canales push (SSE)
+init_broker(app)
+
+# Compresión gzip/brotli de las respuestas grandes
+init_compression(app)
+
+# Roster de guardias en caché para las alertas de emergencia
+init_notifications(app)
+
+# Sesiones con token y caché de principals (después del broker: avisa las revocaciones)
+init_sessions(app)
+
+# Caché de perfiles por id y email (aciertos/fallos de cada petición en Server-Timing)
+profile_cache.init_app(app)
+
+# Imágenes QR generadas en el proceso (la red de la caseta no tiene salida a internet)
+qr_store = qr_images.init_app(app)
+init_pass_tokens(app)
+
+# Índice en memoria de pases activos para decode-qr (actualización incremental por updated_at)
+init_pass_index(app)
+
+# Barrido periódico de los pases vencidos a status 'expired'
+init_pass_sweeper(app)
+if not qr_images.available():
+    print("segno no está instalado: las imágenes QR se piden a api.qrserver.com (pip install segno)")
+
+# Banners: cambian pocas veces al mes y se leen en cada arranque de la app del residente
+banner_cache = create_cache(
+    'banners',
+    maxsize=app.config.get('BANNER_CACHE_SIZE', 16),
+    ttl=app.config.get('BANNER_CACHE_TTL', 300)
+)
 
 # =====================================================
 # ROOT ROUTE
@@ -108,10 +137,44 @@ def index():
         }
     }), 200
 
+@app.route('/api/db/pool-stats', methods=['GET'])
+def db_pool_stats():
+    """Estadísticas del pool de conexiones (saturación y tiempos de espera)"""
+    stats = get_pool_stats()
+    if stats is None:
+        return jsonify({'mensaje': 'El pool de conexiones no está inicializado', 'exito': False}), 503
+    return jsonify({'exito': True, 'data': stats}), 200
+
 # =====================================================
 # AUTHENTICATION ROUTES
 # =====================================================
 
+def bearer_token():
+    auth = request.headers.get('Authorization', '')
+    return auth[7:].strip() if auth[:7].lower() == 'bearer ' else None
+
+def current_principal(optional=False):
+    """Principal de la sesión del token Bearer (None sin token); InvalidSessionError si no es válido
+
+    Con optional=True un token vencido o revocado cuenta como sin token: los endpoints que
+    también aceptan ids en la petición siguen funcionando para clientes con un token viejo.
+    """
+    if 'principal' not in g:
+        token = bearer_token()
+        try:
+            g.principal = resolve_session(token) if token else None
+        except InvalidSessionError as e:
+            g.principal = e
+    if isinstance(g.principal, InvalidSessionError):
+        if optional:
+            return None
+        raise g.principal
+    return g.principal
+
+@app.errorhandler(InvalidSessionError)
+def handle_invalid_session(e):
+    return jsonify({'mensaje': e.message, 'exito': False}), e.status
+
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     """User login endpoint"""
@@ -128,17 +191,23 @@ def login():
             return jsonify({'error': 'Error de conexión a la base de datos', 'exito': False}), 500
         
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM profiles WHERE email = %s", (email,))
-        profile = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        
-        if not profile:
-            return jsonify({'error': 'Usuario no encontrado', 'exito': False}), 401
-        
-        # Validate password
-        if not profile.get('password') or profile['password'] != password:
-            return jsonify({'error': 'Contraseña incorrecta', 'exito': False}), 401
+        try:
+            cursor.execute(*profile_cache.profiles_query('email', [email]))
+            profile = cursor.fetchone()
+            
+            if not profile:
+                return jsonify({'error': 'Usuario no encontrado', 'exito': False}), 401
+            
+            # Validate password
+            if not profile.get('password') or profile['password'] != password:
+                return jsonify({'error': 'Contraseña incorrecta', 'exito': False}), 401
+            
+            # Sesión con token (None si la migración 0011 no se ha aplicado)
+            token, expires_at = create_session(cursor, profile)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
         
         return jsonify({
             'exito': True,
@@ -146,7 +215,9 @@ def login():
                 'id': profile['id'],
                 'email': profile['email']
             },
-            'profile': profile
+            'profile': profile,
+            'token': token,
+            'expires_at': expires_at
         }), 200
         
     except Exception as e:
@@ -154,7 +225,21 @@ def login():
 
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
-    """User logout endpoint"""
+    """User logout endpoint: revoca la sesión del token Bearer"""
+    token = bearer_token()
+    if token:
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    revoked = revoke_session(cursor, token)
+                    conn.commit()
+                finally:
+                    cursor.close()
+        except Error as e:
+            return jsonify({'mensaje': f'Error en la base de datos: {str(e)}', 'exito': False}), 500
+        if revoked:
+            forget_session(token)
     return jsonify({'mensaje': 'Sesión cerrada', 'exito': True}), 200
 
 @app.route('/api/auth/profile', methods=['GET'])
@@ -165,33 +250,21 @@ def get_profile():
         if not user_id:
             return jsonify({'error': 'user_id es requerido', 'exito': False}), 400
         
-        conn = get_connection()
-        if not conn:
-            return jsonify({'error': 'Error de conexión a la base de datos', 'exito': False}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        # Obtener perfil con nombre del fraccionamiento si existe la tabla
-        try:
-            query = """
-                SELECT 
-                    p.*,
-                    f.name as fraccionamiento_name
-                FROM profiles p
-                LEFT JOIN fraccionamientos f ON p.fraccionamiento_id = f.id
-                WHERE p.id = %s
-            """
-            cursor.execute(query, (user_id,))
-        except Exception:
-            # Si no existe la tabla fraccionamientos, solo obtener el perfil
-            cursor.execute("SELECT * FROM profiles WHERE id = %s", (user_id,))
-        profile = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        # Perfil desde la caché compartida; solo un fallo toma conexión
+        profile = profile_cache.get(user_id)
         
         if not profile:
             return jsonify({'error': 'Perfil no encontrado', 'exito': False}), 404
         
-        return jsonify({'exito': True, 'profile': profile}), 200
+        # Nombre del fraccionamiento desde el mapa en memoria (None si no existe la tabla)
+        profile['fraccionamiento_name'] = fraccionamientos.get_name(profile.get('fraccionamiento_id'))
+        
+        # Consulta por clave primaria: el ETag sale del propio perfil y evita serializar y enviar la respuesta
+        etag = compute_etag('profile', profile)
+        if is_not_modified(etag):
+            return not_modified(etag, 'private, no-cache')
+        
+        return tag_response(jsonify({'exito': True, 'profile': profile}), etag, 'private, no-cache'), 200
         
     except Exception as e:
         return jsonify({'error': str(e), 'exito': False}), 500
@@ -211,35 +284,17 @@ def get_resident_address():
         cursor = conn.cursor(dictionary=True)
         
         # Buscar la dirección en pending_registrations (primero en aprobados, luego en cualquier registro)
-        cursor.execute(
-            "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-            (email,)
-        )
-        pending_reg = cursor.fetchone()
-        
-        if not pending_reg:
-            cursor.execute(
-                "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                (email,)
-            )
-            pending_reg = cursor.fetchone()
+        resolved = resolve_address(cursor, email)
         
         cursor.close()
         conn.close()
         
-        if pending_reg:
-            address_parts = []
-            if pending_reg.get('street'):
-                address_parts.append(pending_reg['street'])
-            if pending_reg.get('house_number'):
-                address_parts.append(pending_reg['house_number'])
-            address = ', '.join(address_parts) if address_parts else None
-            
+        if resolved:
             return jsonify({
                 'exito': True,
-                'address': address,
-                'street': pending_reg.get('street', ''),
-                'house_number': pending_reg.get('house_number', ''),
+                'address': resolved['address'],
+                'street': resolved['street'],
+                'house_number': resolved['house_number'],
                 'mensaje': 'Dirección encontrada'
             }), 200
         else:
@@ -260,12 +315,29 @@ def get_resident_address():
 
 @app.route('/api/visitors', methods=['GET'])
 def get_visitors():
-    """Get all visitors"""
+    """Get visitors, paginated by (created_at, id) cursor.
+    
+    Query params: user_id, status, type, search, limit, after (cursor),
+    all=true para obtener la lista completa sin paginar.
+    """
     try:
         user_id = request.args.get('user_id')
         status = request.args.get('status')
         visitor_type = request.args.get('type')
         search = request.args.get('search')
+        full_list = request.args.get('all', '').lower() in ('1', 'true')
+        after = request.args.get('after')
+        
+        # Validar parámetros de paginación antes de tomar una conexión
+        try:
+            limit = parse_limit(
+                request.args.get('limit'),
+                app.config.get('VISITORS_PAGE_SIZE', 50),
+                app.config.get('VISITORS_MAX_PAGE_SIZE', 500)
+            )
+            after_position = decode_cursor(after) if after and not full_list else None
+        except (InvalidCursorError, ValueError) as e:
+            return jsonify({'mensaje': str(e), 'exito': False}), 400
         
         conn = get_connection()
         if not conn:
@@ -273,84 +345,59 @@ def get_visitors():
         
         cursor = conn.cursor(dictionary=True)
         
-        # Query base para obtener visitantes con JOIN a profiles para obtener el email
-        query = """
-            SELECT 
-                v.*,
-                p.email as resident_email
-            FROM visitors v
-            LEFT JOIN profiles p ON v.created_by = p.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if user_id:
-            query += " AND v.created_by = %s"
-            # Convertir user_id a entero para comparar con created_by (INT)
-            try:
-                params.append(int(user_id))
-            except (ValueError, TypeError):
-                params.append(user_id)
-        if status:
-            query += " AND v.status = %s"
-            params.append(status)
-        if visitor_type:
-            query += " AND v.type = %s"
-            params.append(visitor_type)
-        if search:
-            query += " AND v.name LIKE %s"
-            params.append(f'%{search}%')
-        
-        # Ordenar por fecha de creación descendente (más nuevos primero)
-        query += " ORDER BY v.created_at DESC"
-        
+        # El email del residente sale después de la caché de perfiles
+        query, params = visitor_queries.list_query(
+            user_id=user_id,
+            status=status,
+            visitor_type=visitor_type,
+            search=search,
+            after_position=after_position,
+            # Una fila extra para saber si hay más páginas
+            limit=None if full_list else limit + 1,
+            exclude_expired=status == 'active' and pass_expiry_enabled(cursor)
+        )
         cursor.execute(query, params)
         visitors = cursor.fetchall()
         
+        next_cursor = None
+        if not full_list and len(visitors) > limit:
+            visitors = visitors[:limit]
+            next_cursor = encode_cursor(visitors[-1]['created_at'], visitors[-1]['id'])
+        
+        # Email de los residentes: una consulta por lote solo para los que no están en caché
+        residents = profile_cache.get_many({visitor.get('created_by') for visitor in visitors}, cursor)
+        for visitor in visitors:
+            resident = residents.get(profile_cache.normalize_id(visitor.get('created_by')))
+            visitor['resident_email'] = resident.get('email') if resident else None
+        
         # Obtener direcciones desde pending_registrations usando el email del perfil
+        # (una sola consulta para todos los residentes de la lista)
+        try:
+            addresses = resolve_addresses(cursor, [visitor.get('resident_email') for visitor in visitors])
+        except Exception as e:
+            # Si hay error, simplemente dejar address como None
+            addresses = {}
+            print(f"Error obteniendo direcciones de visitantes: {str(e)}")
+        
         for visitor in visitors:
             visitor['address'] = None
-            if visitor.get('resident_email'):
-                try:
-                    # Buscar la dirección en pending_registrations usando el email del residente
-                    # Primero intentamos buscar en registros aprobados, luego en cualquier registro
-                    cursor.execute(
-                        "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-                        (visitor['resident_email'],)
-                    )
-                    pending_reg = cursor.fetchone()
-                    
-                    # Si no encontramos en aprobados, buscar en cualquier registro con ese email
-                    if not pending_reg:
-                        cursor.execute(
-                            "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                            (visitor['resident_email'],)
-                        )
-                        pending_reg = cursor.fetchone()
-                    
-                    if pending_reg:
-                        address_parts = []
-                        if pending_reg.get('street'):
-                            address_parts.append(pending_reg['street'])
-                        if pending_reg.get('house_number'):
-                            address_parts.append(pending_reg['house_number'])
-                        visitor['address'] = ', '.join(address_parts) if address_parts else None
-                        visitor['street'] = pending_reg.get('street')
-                        visitor['house_number'] = pending_reg.get('house_number')
-                except Exception as e:
-                    # Si hay error, simplemente dejar address como None
-                    visitor['address'] = None
-                    print(f"Error obteniendo dirección para visitante {visitor.get('id')}: {str(e)}")
-        
-        # Convertir objetos datetime, date y timedelta a strings para JSON
-        serialized_visitors = []
-        for visitor in visitors:
-            serialized_visitors.append(serialize_visitor_for_json(visitor))
+            resolved = addresses.get(visitor.get('resident_email'))
+            if resolved:
+                visitor['address'] = resolved['address']
+                visitor['street'] = resolved['street']
+                visitor['house_number'] = resolved['house_number']
         
         cursor.close()
         conn.close()
         
-        return jsonify({'visitors': serialized_visitors, 'mensaje': 'Visitantes encontrados', 'exito': True}), 200
+        response = {'visitors': visitors, 'mensaje': 'Visitantes encontrados', 'exito': True}
+        if not full_list:
+            response['pagination'] = {
+                'limit': limit,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'mensaje': 'Error al listar visitantes: ' + str(e), 'exito': False}), 500
@@ -367,10 +414,6 @@ def get_visitor(visitor_id):
         cursor.execute("SELECT * FROM visitors WHERE id = %s", (visitor_id,))
         visitor = cursor.fetchone()
         
-        # Convertir objetos datetime, date y timedelta a strings para JSON
-        if visitor:
-            visitor = serialize_visitor_for_json(visitor)
-        
         cursor.close()
         conn.close()
         
@@ -413,17 +456,22 @@ def create_visitor():
                 visitor_data.get('eventLocation') if visitor_data.get('eventLocation') else None
             )
         else:
-            sql = """INSERT INTO visitors (name, email, phone, type, status, created_by, created_at)
-                     VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-            values = (
+            created_at = datetime.now()
+            columns = ['name', 'email', 'phone', 'type', 'status', 'created_by', 'created_at']
+            values = [
                 visitor_data.get('name'),
                 visitor_data.get('email'),
                 visitor_data.get('phone'),
                 visitor_data.get('type', 'visitor'),
                 visitor_data.get('status', 'active'),
                 visitor_data.get('created_by'),
-                datetime.now()
-            )
+                created_at
+            ]
+            # Los pases de solo una vez guardan su expiración (la barre el sweeper de pases)
+            if visitor_data.get('type') == 'one-time' and pass_expiry_enabled(cursor):
+                columns.append('expires_at')
+                values.append(one_time_expiry(created_at))
+            sql = f"INSERT INTO visitors ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
         
         cursor.execute(sql, values)
         conn.commit()
@@ -434,71 +482,9 @@ def create_visitor():
         # Si es un visitante de "solo una vez", generar el QR automáticamente
         if visitor.get('type') == 'one-time':
             try:
-                # Generar QR directamente aquí
-                import json
-                import urllib.parse
-                from datetime import timedelta
-                
-                # Obtener información del residente si existe
-                resident_address = None
-                resident_street = None
-                resident_house_number = None
-                
-                if visitor.get('created_by'):
-                    cursor.execute(
-                        "SELECT p.email FROM profiles p WHERE p.id = %s",
-                        (visitor['created_by'],)
-                    )
-                    resident_profile = cursor.fetchone()
-                    if resident_profile and resident_profile.get('email'):
-                        cursor.execute(
-                            "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-                            (resident_profile['email'],)
-                        )
-                        pending_reg = cursor.fetchone()
-                        if not pending_reg:
-                            cursor.execute(
-                                "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                                (resident_profile['email'],)
-                            )
-                            pending_reg = cursor.fetchone()
-                        if pending_reg:
-                            resident_street = pending_reg.get('street')
-                            resident_house_number = pending_reg.get('house_number')
-                            address_parts = []
-                            if resident_street:
-                                address_parts.append(resident_street)
-                            if resident_house_number:
-                                address_parts.append(resident_house_number)
-                            resident_address = ', '.join(address_parts) if address_parts else None
-                
-                # Calcular expiración (24 horas desde la creación)
-                visitor_created_at = visitor.get('created_at')
-                expiration_timestamp = None
-                if visitor_created_at:
-                    try:
-                        if isinstance(visitor_created_at, str):
-                            visitor_created_at = datetime.fromisoformat(visitor_created_at.replace('Z', '+00:00'))
-                        expiration_timestamp = (visitor_created_at + timedelta(hours=24)).isoformat()
-                    except:
-                        expiration_timestamp = (datetime.now() + timedelta(hours=24)).isoformat()
-                
-                # Crear objeto QR
-                qr_data_object = {
-                    'type': 'one-time',
-                    'visitor_id': visitor['id'],
-                    'visitor_name': visitor['name'],
-                    'resident_name': '',
-                    'resident_address': resident_address or '',
-                    'resident_street': resident_street or '',
-                    'resident_house_number': resident_house_number or '',
-                    'timestamp': datetime.now().isoformat(),
-                    'created_at': visitor.get('created_at').isoformat() if hasattr(visitor.get('created_at'), 'isoformat') else (visitor.get('created_at') if visitor.get('created_at') else datetime.now().isoformat()),
-                    'expires_at': expiration_timestamp
-                }
-                
-                qr_data_string = json.dumps(qr_data_object)
-                qr_code_url = f"https://api.qrserver.com/v1/create-qr-code/?size=250x250&data={urllib.parse.quote(qr_data_string)}"
+                # QR firmado y compacto: la caseta valida tipo, id y expiración sin consultar la BD
+                qr_data_string = encode_pass('one-time', visitor['id'], pass_expires_at(visitor))
+                qr_code_url = build_qr_url(qr_data_string, 250)
                 
                 # Guardar el QR en la base de datos
                 cursor.execute(
@@ -514,9 +500,6 @@ def create_visitor():
                 print(f"Error generando QR automático para visitante de solo una vez: {str(qr_error)}")
                 # Continuar sin QR si hay error
         
-        # Convertir objetos datetime, date y timedelta a strings para JSON
-        visitor = serialize_visitor_for_json(visitor)
-        
         cursor.close()
         conn.close()
         
@@ -569,13 +552,10 @@ def update_visitor(visitor_id):
         
         cursor.execute(sql, values)
         conn.commit()
+        mark_passes_stale()
         cursor.execute("SELECT * FROM visitors WHERE id = %s", (visitor_id,))
         visitor = cursor.fetchone()
         
-        # Convertir objetos datetime, date y timedelta a strings para JSON
-        if visitor:
-            visitor = serialize_visitor_for_json(visitor)
-        
         cursor.close()
         conn.close()
         
@@ -605,15 +585,7 @@ def generate_visitor_qr(visitor_id):
         cursor = conn.cursor(dictionary=True)
         
         # Obtener información del visitante con JOIN para obtener datos del residente
-        query = """
-            SELECT 
-                v.*,
-                p.name as resident_name,
-                p.email as resident_email
-            FROM visitors v
-            LEFT JOIN profiles p ON v.created_by = p.id
-            WHERE v.id = %s
-        """
+        query = visitor_queries.VISITOR_WITH_RESIDENT_SQL
         cursor.execute(query, (visitor_id,))
         visitor = cursor.fetchone()
         
@@ -629,78 +601,14 @@ def generate_visitor_qr(visitor_id):
             conn.close()
             return jsonify({'mensaje': 'Solo se pueden generar códigos QR para visitantes frecuentes o de solo una vez', 'exito': False}), 400
         
-        # Obtener la dirección del residente desde pending_registrations
-        resident_address = None
-        resident_street = None
-        resident_house_number = None
-        
-        if visitor.get('resident_email'):
-            try:
-                # Buscar la dirección en pending_registrations
-                cursor.execute(
-                    "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-                    (visitor['resident_email'],)
-                )
-                pending_reg = cursor.fetchone()
-                
-                # Si no encontramos en aprobados, buscar en cualquier registro
-                if not pending_reg:
-                    cursor.execute(
-                        "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                        (visitor['resident_email'],)
-                    )
-                    pending_reg = cursor.fetchone()
-                
-                if pending_reg:
-                    resident_street = pending_reg.get('street')
-                    resident_house_number = pending_reg.get('house_number')
-                    address_parts = []
-                    if resident_street:
-                        address_parts.append(resident_street)
-                    if resident_house_number:
-                        address_parts.append(resident_house_number)
-                    resident_address = ', '.join(address_parts) if address_parts else None
-            except Exception as e:
-                print(f"Error obteniendo dirección para QR: {str(e)}")
-                resident_address = None
-        
-        # Obtener la fecha de creación del visitante para calcular expiración
-        visitor_created_at = visitor.get('created_at')
-        expiration_timestamp = None
-        if visitor_type == 'one-time' and visitor_created_at:
-            # Para visitantes de solo una vez, el QR expira 24 horas después de la creación
-            from datetime import timedelta
-            try:
-                if isinstance(visitor_created_at, str):
-                    # Intentar parsear diferentes formatos de fecha
-                    try:
-                        visitor_created_at = datetime.fromisoformat(visitor_created_at.replace('Z', '+00:00'))
-                    except:
-                        from dateutil import parser
-                        visitor_created_at = parser.parse(visitor_created_at)
-                elif isinstance(visitor_created_at, datetime):
-                    pass  # Ya es un datetime
-                else:
-                    visitor_created_at = datetime.now()
-                
-                expiration_timestamp = (visitor_created_at + timedelta(hours=24)).isoformat()
-            except Exception as e:
-                print(f"Error calculando expiración: {str(e)}")
-                # Si hay error, usar fecha actual + 24 horas
-                expiration_timestamp = (datetime.now() + timedelta(hours=24)).isoformat()
-        
-        # Crear objeto SIMPLE para el QR (solo datos esenciales para facilitar el escaneo)
-        qr_data_object = {
-            't': visitor_type,  # 'visitor' o 'one-time' (abreviado)
-            'id': visitor['id']  # Solo el ID del visitante
-        }
+        # Los pases de solo una vez expiran en visitors.expires_at (24 horas después de la creación)
+        expiration_timestamp = pass_expires_at(visitor) if visitor_type == 'one-time' else None
         
-        # Convertir a JSON string para el QR
-        qr_data_string = json.dumps(qr_data_object)
+        # QR firmado y compacto: tipo ('visitor' o 'one-time'), id y expiración
+        qr_data_string = encode_pass(visitor_type, visitor['id'], expiration_timestamp)
         
-        # Generar URL del QR code usando API externa con tamaño más grande para mejor escaneo
-        import urllib.parse
-        qr_code_url = f"https://api.qrserver.com/v1/create-qr-code/?size=400x400&data={urllib.parse.quote(qr_data_string)}"
+        # Imagen QR generada localmente, con tamaño más grande para mejor escaneo
+        qr_code_url = build_qr_url(qr_data_string, 400)
         
         # Guardar el código QR en la base de datos
         cursor.execute(
@@ -713,10 +621,6 @@ def generate_visitor_qr(visitor_id):
         cursor.execute("SELECT * FROM visitors WHERE id = %s", (visitor_id,))
         updated_visitor = cursor.fetchone()
         
-        # Convertir objetos datetime, date y timedelta a strings para JSON
-        if updated_visitor:
-            updated_visitor = serialize_visitor_for_json(updated_visitor)
-        
         cursor.close()
         conn.close()
         
@@ -744,13 +648,22 @@ def decode_visitor_qr():
             return jsonify({'mensaje': 'Datos del QR no proporcionados', 'exito': False}), 400
         
         # Decodificar el JSON del QR
-        # Soporta dos formatos:
-        # 1. Formato simplificado: {'t': 'visitor', 'id': 123}
-        # 2. Formato completo: {'type': 'resident', 'user_id': 123, ...}
+        # Soporta tres formatos:
+        # 1. Formato firmado: {'t': 'visitor', 'id': 123, 'x': expiración, 's': firma}
+        # 2. Formato simplificado (sin firma): {'t': 'visitor', 'id': 123}
+        # 3. Formato completo: {'type': 'resident', 'user_id': 123, ...}
         try:
             qr_data = json.loads(qr_data_string)
         except json.JSONDecodeError:
             return jsonify({'mensaje': 'Formato de QR inválido', 'exito': False}), 400
+        if not isinstance(qr_data, dict):
+            return jsonify({'mensaje': 'Formato de QR inválido', 'exito': False}), 400
+        
+        # Firma y expiración se validan en memoria: los QR falsos o vencidos no llegan a la BD
+        try:
+            verify_pass(qr_data)
+        except InvalidPassError as e:
+            return jsonify({'mensaje': e.message, 'exito': False}), e.status
         
         # Obtener el ID y tipo del QR (soporta ambos formatos)
         visitor_id = qr_data.get('id') or qr_data.get('user_id')
@@ -764,230 +677,50 @@ def decode_visitor_qr():
         if qr_type not in valid_types:
             return jsonify({'mensaje': f'Código QR inválido: tipo "{qr_type}" no reconocido. Tipos válidos: {", ".join(valid_types)}', 'exito': False}), 400
         
-        # Si es un QR de residente, buscar en la tabla profiles
-        if qr_type == 'resident':
+        # Primero el índice en memoria del worker (nombre y dirección ya resueltos);
+        # si no está o no se pudo actualizar a tiempo, consultar MySQL
+        kind = 'resident' if qr_type == 'resident' else 'visitor'
+        index = get_pass_index()
+        entry = index.get(kind, visitor_id) if index is not None else None
+        if entry is None:
             conn = get_connection()
             if not conn:
                 return jsonify({'mensaje': 'Error de conexión a la base de datos', 'exito': False}), 500
             
             cursor = conn.cursor(dictionary=True)
-            
-            # Obtener información del residente desde profiles
-            # También intentar obtener dirección desde pending_registrations si está disponible
-            query = """
-                SELECT 
-                    p.*,
-                    f.name as fraccionamiento_name
-                FROM profiles p
-                LEFT JOIN fraccionamientos f ON p.fraccionamiento_id = f.id
-                WHERE p.id = %s
-            """
-            cursor.execute(query, (visitor_id,))
-            profile = cursor.fetchone()
-            
-            if not profile:
-                cursor.close()
-                conn.close()
-                return jsonify({'mensaje': 'Residente no encontrado', 'exito': False}), 404
-            
-            # Intentar obtener dirección desde pending_registrations o usar campos del profile
-            resident_address = None
-            resident_street = None
-            resident_house_number = None
-            
-            # Primero intentar obtener desde pending_registrations si hay email
-            if profile.get('email'):
-                try:
-                    cursor.execute(
-                        "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-                        (profile['email'],)
-                    )
-                    pending_reg = cursor.fetchone()
-                    
-                    if not pending_reg:
-                        cursor.execute(
-                            "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                            (profile['email'],)
-                        )
-                        pending_reg = cursor.fetchone()
-                    
-                    if pending_reg:
-                        resident_street = pending_reg.get('street')
-                        resident_house_number = pending_reg.get('house_number')
-                except Exception as e:
-                    print(f"Error obteniendo dirección del residente desde pending_registrations: {str(e)}")
-            
-            # Si no se encontró en pending_registrations, usar los campos directos del profile
-            if not resident_street and not resident_house_number:
-                resident_street = profile.get('street')
-                resident_house_number = profile.get('house_number')
-            
-            # Construir la dirección completa
-            if resident_street or resident_house_number:
-                address_parts = []
-                if resident_street:
-                    address_parts.append(resident_street)
-                if resident_house_number:
-                    address_parts.append(resident_house_number)
-                resident_address = ', '.join(address_parts) if address_parts else None
-            
-            cursor.close()
-            conn.close()
-            
-            # Retornar información completa del residente
-            return jsonify({
-                'mensaje': 'QR de residente decodificado correctamente',
-                'qr_data': qr_data,
-                'visitor_info': {
-                    'visitor_id': profile['id'],
-                    'visitor_name': profile.get('name') or profile.get('user_name') or '',
-                    'visitor_type': 'resident',
-                    'resident_name': profile.get('name') or profile.get('user_name') or '',
-                    'resident_user_name': profile.get('user_name') or '',
-                    'resident_email': profile.get('email') or '',
-                    'resident_phone': profile.get('phone') or '',
-                    'resident_address': resident_address or '',
-                    'resident_street': resident_street or profile.get('street') or '',
-                    'resident_house_number': resident_house_number or profile.get('house_number') or '',
-                    'fraccionamiento_id': profile.get('fraccionamiento_id') or '',
-                    'fraccionamiento_name': profile.get('fraccionamiento_name') or '',
-                    'role': profile.get('role') or 'resident',
-                    'timestamp': profile.get('created_at').isoformat() if profile.get('created_at') and hasattr(profile.get('created_at'), 'isoformat') else (profile.get('created_at') if profile.get('created_at') else '')
-                },
-                'exito': True
-            }), 200
-        
-        # Obtener información completa del visitante/evento desde la base de datos
-        conn = get_connection()
-        if not conn:
-            return jsonify({'mensaje': 'Error de conexión a la base de datos', 'exito': False}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        # Obtener información del visitante/evento con JOIN para obtener datos del residente
-        query = """
-            SELECT 
-                v.*,
-                v.eventLocation as eventLocation,
-                p.name as resident_name,
-                p.email as resident_email
-            FROM visitors v
-            LEFT JOIN profiles p ON v.created_by = p.id
-            WHERE v.id = %s
-        """
-        cursor.execute(query, (visitor_id,))
-        visitor = cursor.fetchone()
-        
-        if not visitor:
-            cursor.close()
-            conn.close()
-            return jsonify({'mensaje': 'Visitante o evento no encontrado', 'exito': False}), 404
-        
-        # Si es un evento, retornar información del evento
-        if qr_type == 'event':
-            # Obtener la dirección del residente si el lugar es "domicilio"
-            # Intentar obtener eventLocation de diferentes formas posibles (MySQL puede devolverlo con diferentes nombres)
-            event_location = visitor.get('eventLocation') or visitor.get('eventlocation') or visitor.get('event_location') or None
-            resident_address = None
-            if event_location == 'domicilio' and visitor.get('resident_email'):
-                try:
-                    cursor.execute(
-                        "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-                        (visitor['resident_email'],)
-                    )
-                    pending_reg = cursor.fetchone()
-                    
-                    if not pending_reg:
-                        cursor.execute(
-                            "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                            (visitor['resident_email'],)
-                        )
-                        pending_reg = cursor.fetchone()
-                    
-                    if pending_reg:
-                        address_parts = []
-                        if pending_reg.get('street'):
-                            address_parts.append(pending_reg['street'])
-                        if pending_reg.get('house_number'):
-                            address_parts.append(pending_reg['house_number'])
-                        resident_address = ', '.join(address_parts) if address_parts else None
-                except Exception as e:
-                    print(f"Error obteniendo dirección para evento: {str(e)}")
-                    resident_address = None
-            
-            # Asegurar que event_location tenga un valor (puede ser None si el evento fue creado antes de agregar el campo)
-            final_event_location = event_location or visitor.get('eventLocation') or visitor.get('eventlocation') or visitor.get('event_location') or None
-            
+            if kind == 'resident':
+                # Perfil desde la caché compartida; la dirección se resuelve aparte
+                profile = profile_cache.get(visitor_id, cursor)
+                entries = resident_entries(cursor, [profile] if profile else [])
+            else:
+                entries = load_visitor_passes(cursor, "v.id = %s", (visitor_id,))
             cursor.close()
             conn.close()
-            return jsonify({
-                'mensaje': 'QR de evento decodificado correctamente',
-                'qr_data': qr_data,
-                'visitor_info': {
-                    'visitor_id': visitor['id'],
-                    'visitor_name': visitor.get('name', ''),
-                    'visitor_type': 'event',
-                    'event_name': visitor.get('name', ''),
-                    'event_date': visitor.get('eventDate', ''),
-                    'event_time': visitor.get('eventTime', ''),
-                    'number_of_guests': visitor.get('numberOfGuests', ''),
-                    'event_location': final_event_location or '',
-                    'resident_name': visitor.get('resident_name', ''),
-                    'resident_address': resident_address or '',
-                    'timestamp': visitor.get('created_at').isoformat() if visitor.get('created_at') and hasattr(visitor.get('created_at'), 'isoformat') else (visitor.get('created_at') if visitor.get('created_at') else '')
-                },
-                'exito': True
-            }), 200
-        
-        # Obtener la dirección del residente desde pending_registrations
-        resident_address = None
-        resident_street = None
-        resident_house_number = None
-        
-        if visitor.get('resident_email'):
-            try:
-                cursor.execute(
-                    "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-                    (visitor['resident_email'],)
-                )
-                pending_reg = cursor.fetchone()
-                
-                if not pending_reg:
-                    cursor.execute(
-                        "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                        (visitor['resident_email'],)
-                    )
-                    pending_reg = cursor.fetchone()
-                
-                if pending_reg:
-                    resident_street = pending_reg.get('street')
-                    resident_house_number = pending_reg.get('house_number')
-                    address_parts = []
-                    if resident_street:
-                        address_parts.append(resident_street)
-                    if resident_house_number:
-                        address_parts.append(resident_house_number)
-                    resident_address = ', '.join(address_parts) if address_parts else None
-            except Exception as e:
-                print(f"Error obteniendo dirección: {str(e)}")
-                resident_address = None
-        
-        cursor.close()
-        conn.close()
+            entry = entries[0] if entries else None
+        
+        if entry is None:
+            mensaje = 'Residente no encontrado' if kind == 'resident' else 'Visitante o evento no encontrado'
+            return jsonify({'mensaje': mensaje, 'exito': False}), 404
+        
+        # Pase vencido (barrido a 'expired' o con expires_at ya pasado aunque el sweeper no haya corrido)
+        if kind == 'visitor' and (entry['status'] == 'expired' or pass_is_expired(entry)):
+            return jsonify({'mensaje': 'Código QR expirado', 'exito': False}), 410
+        
+        if kind == 'resident':
+            mensaje = 'QR de residente decodificado correctamente'
+            info = resident_pass_info(entry)
+        elif qr_type == 'event':
+            mensaje = 'QR de evento decodificado correctamente'
+            info = visitor_pass_info('event', entry)
+        else:
+            # Retornar la información decodificada (solo visible para admin)
+            mensaje = 'QR decodificado correctamente'
+            info = visitor_pass_info(qr_type, entry)
         
-        # Retornar la información decodificada (solo visible para admin)
         return jsonify({
-            'mensaje': 'QR decodificado correctamente',
+            'mensaje': mensaje,
             'qr_data': qr_data,
-            'visitor_info': {
-                'visitor_id': visitor['id'],
-                'visitor_name': visitor.get('name', ''),
-                'resident_name': visitor.get('resident_name', ''),
-                'resident_address': resident_address or '',
-                'resident_street': resident_street or '',
-                'resident_house_number': resident_house_number or '',
-                'timestamp': visitor.get('created_at').isoformat() if visitor.get('created_at') and hasattr(visitor.get('created_at'), 'isoformat') else (visitor.get('created_at') if visitor.get('created_at') else '')
-            },
+            'visitor_info': info,
             'exito': True
         }), 200
         
@@ -1008,17 +741,8 @@ def generate_event_qr(visitor_id):
         cursor = conn.cursor(dictionary=True)
         
         # Obtener información del evento con JOIN para obtener datos del residente
-        # Asegurar que eventLocation se seleccione explícitamente
-        query = """
-            SELECT 
-                v.*,
-                v.eventLocation as eventLocation,
-                p.name as resident_name,
-                p.email as resident_email
-            FROM visitors v
-            LEFT JOIN profiles p ON v.created_by = p.id
-            WHERE v.id = %s
-        """
+        # (v.* ya incluye eventLocation)
+        query = visitor_queries.VISITOR_WITH_RESIDENT_SQL
         cursor.execute(query, (visitor_id,))
         event = cursor.fetchone()
         
@@ -1034,53 +758,23 @@ def generate_event_qr(visitor_id):
             conn.close()
             return jsonify({'mensaje': 'Solo se pueden generar códigos QR para eventos', 'exito': False}), 400
         
-        # Obtener la dirección del residente desde pending_registrations
+        # Obtener la dirección del residente desde pending_registrations (va en event_info)
         resident_address = None
-        resident_street = None
-        resident_house_number = None
         
         if event.get('resident_email'):
             try:
-                # Buscar la dirección en pending_registrations
-                cursor.execute(
-                    "SELECT street, house_number FROM pending_registrations WHERE email = %s AND status = 'approved' ORDER BY created_at DESC LIMIT 1",
-                    (event['resident_email'],)
-                )
-                pending_reg = cursor.fetchone()
-                
-                # Si no encontramos en aprobados, buscar en cualquier registro
-                if not pending_reg:
-                    cursor.execute(
-                        "SELECT street, house_number FROM pending_registrations WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                        (event['resident_email'],)
-                    )
-                    pending_reg = cursor.fetchone()
-                
-                if pending_reg:
-                    resident_street = pending_reg.get('street')
-                    resident_house_number = pending_reg.get('house_number')
-                    address_parts = []
-                    if resident_street:
-                        address_parts.append(resident_street)
-                    if resident_house_number:
-                        address_parts.append(resident_house_number)
-                    resident_address = ', '.join(address_parts) if address_parts else None
+                resolved = resolve_address(cursor, event['resident_email'])
+                if resolved:
+                    resident_address = resolved['address']
             except Exception as e:
                 print(f"Error obteniendo dirección para QR: {str(e)}")
                 resident_address = None
         
-        # Crear objeto SIMPLE para el QR (solo datos esenciales para facilitar el escaneo)
-        qr_data_object = {
-            't': 'event',  # Tipo abreviado
-            'id': event['id']  # Solo el ID del evento
-        }
-        
-        # Convertir a JSON string para el QR
-        qr_data_string = json.dumps(qr_data_object)
+        # QR firmado y compacto: válido hasta el final del día del evento
+        qr_data_string = encode_pass('event', event['id'], end_of_day(event.get('eventDate')))
         
-        # Generar URL del QR code usando API externa con tamaño más grande para mejor escaneo
-        import urllib.parse
-        qr_code_url = f"https://api.qrserver.com/v1/create-qr-code/?size=400x400&data={urllib.parse.quote(qr_data_string)}"
+        # Imagen QR generada localmente, con tamaño más grande para mejor escaneo
+        qr_code_url = build_qr_url(qr_data_string, 400)
         
         # Guardar el código QR en la base de datos
         cursor.execute(
@@ -1093,40 +787,11 @@ def generate_event_qr(visitor_id):
         cursor.execute("SELECT * FROM visitors WHERE id = %s", (visitor_id,))
         updated_event = cursor.fetchone()
         
-        # Convertir objetos datetime, date y timedelta a strings para JSON
-        if updated_event:
-            updated_event = serialize_visitor_for_json(updated_event)
-        
         # Obtener eventLocation del evento (puede tener diferentes nombres en la BD)
         event_location = event.get('eventLocation') or event.get('eventlocation') or event.get('event_location') or updated_event.get('eventLocation') or updated_event.get('eventlocation') or updated_event.get('event_location') or None
         
-        # Convertir eventDate y eventTime a strings si son objetos date/time
         event_date = event.get('eventDate', '')
-        if event_date:
-            if isinstance(event_date, date):
-                event_date = event_date.isoformat()
-            elif isinstance(event_date, datetime):
-                event_date = event_date.date().isoformat()
-            elif hasattr(event_date, 'strftime'):
-                event_date = event_date.strftime('%Y-%m-%d')
-            else:
-                event_date = str(event_date) if event_date else ''
-        
         event_time = event.get('eventTime', '')
-        if event_time:
-            if isinstance(event_time, time):
-                event_time = event_time.strftime('%H:%M:%S')
-            elif isinstance(event_time, timedelta):
-                # Convertir timedelta a HH:MM:SS
-                total_seconds = int(event_time.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                seconds = total_seconds % 60
-                event_time = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            elif hasattr(event_time, 'strftime'):
-                event_time = event_time.strftime('%H:%M:%S')
-            else:
-                event_time = str(event_time) if event_time else ''
         
         # Crear objeto con información completa del evento para el frontend
         event_info = {
@@ -1139,8 +804,8 @@ def generate_event_qr(visitor_id):
             'resident_address': resident_address or ''
         }
         
-        # Convertir event_info a JSON string para incluirlo en la respuesta
-        event_info_json = json.dumps(event_info)
+        # Convertir event_info a JSON string para incluirlo en la respuesta (fechas en ISO, hora HH:MM:SS)
+        event_info_json = app.json.dumps(event_info)
         
         cursor.close()
         conn.close()
@@ -1166,8 +831,12 @@ def delete_visitor(visitor_id):
             return jsonify({'mensaje': 'Error de conexión a la base de datos', 'exito': False}), 500
         
         cursor = conn.cursor()
+        # Las casetas offline se enteran del borrado por el tombstone (GET /api/gate-sync/delta)
+        gate_sync.record_visitor_deletion(cursor, visitor_id)
         cursor.execute("DELETE FROM visitors WHERE id = %s", (visitor_id,))
         conn.commit()
+        # Un pase borrado no debe seguir validándose desde el índice de este worker
+        mark_passes_stale()
         cursor.close()
         conn.close()
         
@@ -1176,6 +845,34 @@ def delete_visitor(visitor_id):
     except Exception as e:
         return jsonify({'mensaje': 'Error: ' + str(e), 'exito': False}), 500
 
+# =====================================================
+# QR IMAGE ROUTES
+# =====================================================
+
+def build_qr_url(qr_data_string, size):
+    """URL of the QR image for a payload (local and content-addressed when segno is installed)"""
+    if not qr_images.available():
+        return f"https://api.qrserver.com/v1/create-qr-code/?size={size}x{size}&data={urllib.parse.quote(qr_data_string)}"
+    key = qr_store.register(qr_data_string, size)
+    # data= se conserva porque el frontend (historial) lee el contenido del QR desde la URL
+    return url_for('get_qr_image', key=key, fmt='png', data=qr_data_string, _external=True)
+
+@app.route('/api/qr/<key>.<fmt>', methods=['GET'])
+def get_qr_image(key, fmt):
+    """QR image (png o svg) por su hash de contenido; nunca cambia, se cachea como immutable"""
+    if fmt not in qr_images.FORMATS or not qr_images.is_valid_key(key):
+        return jsonify({'mensaje': 'Código QR no encontrado', 'exito': False}), 404
+    if is_not_modified(key):
+        return not_modified(key, qr_images.IMMUTABLE_CACHE_CONTROL)
+    try:
+        data = qr_store.get(key, fmt) if qr_images.available() else None
+    except Exception as e:
+        return jsonify({'mensaje': 'Error al generar imagen QR: ' + str(e), 'exito': False}), 500
+    if data is None:
+        return jsonify({'mensaje': 'Código QR no encontrado', 'exito': False}), 404
+    response = Response(data, mimetype=qr_images.FORMATS[fmt])
+    return tag_response(response, key, qr_images.IMMUTABLE_CACHE_CONTROL)
+
 # =====================================================
 # REGISTRATIONS ROUTES
 # =====================================================
@@ -1203,13 +900,8 @@ def get_pending_registrations():
         cursor.close()
         conn.close()
         
-        # Convertir datetime a string para JSON y eliminar password
+        # No devolver la contraseña
         for reg in registrations:
-            if reg.get('created_at'):
-                reg['created_at'] = reg['created_at'].isoformat() if hasattr(reg['created_at'], 'isoformat') else str(reg['created_at'])
-            if reg.get('updated_at'):
-                reg['updated_at'] = reg['updated_at'].isoformat() if hasattr(reg['updated_at'], 'isoformat') else str(reg['updated_at'])
-            # No devolver la contraseña
             if 'password' in reg:
                 del reg['password']
         
@@ -1423,7 +1115,8 @@ def approve_registration(registration_id):
                 'mensaje': 'Registro no encontrado o ya procesado'
             }), 404
         
-        # 2. Verificar que el email no exista ya en profiles
+        # 2. Verificar que el email no exista ya en profiles (directo en MySQL: la caché puede
+        # tener un "no existe" de hasta PROFILE_CACHE_NEGATIVE_TTL segundos)
         cursor.execute(
             "SELECT id FROM profiles WHERE email = %s",
             (registration['email'],)
@@ -1529,6 +1222,11 @@ def approve_registration(registration_id):
         
         # Confirmar todas las operaciones
         conn.commit()
+        # Un nuevo perfil guard/admin cambia el roster de las alertas
+        invalidate_guard_roster()
+        mark_passes_stale()
+        # El email pudo quedar en la caché negativa de perfiles
+        profile_cache.invalidate(profile_id, registration['email'])
         
         # 7. Obtener datos actualizados
         cursor.execute(
@@ -1543,20 +1241,12 @@ def approve_registration(registration_id):
         )
         new_profile = cursor.fetchone()
         
-        # Convertir datetime a string y eliminar password
+        # No devolver la contraseña
         if updated_registration:
-            if updated_registration.get('created_at'):
-                updated_registration['created_at'] = updated_registration['created_at'].isoformat() if hasattr(updated_registration['created_at'], 'isoformat') else str(updated_registration['created_at'])
-            if updated_registration.get('updated_at'):
-                updated_registration['updated_at'] = updated_registration['updated_at'].isoformat() if hasattr(updated_registration['updated_at'], 'isoformat') else str(updated_registration['updated_at'])
             if 'password' in updated_registration:
                 del updated_registration['password']
         
         if new_profile:
-            if new_profile.get('created_at'):
-                new_profile['created_at'] = new_profile['created_at'].isoformat() if hasattr(new_profile['created_at'], 'isoformat') else str(new_profile['created_at'])
-            if new_profile.get('updated_at'):
-                new_profile['updated_at'] = new_profile['updated_at'].isoformat() if hasattr(new_profile['updated_at'], 'isoformat') else str(new_profile['updated_at'])
             if 'password' in new_profile:
                 del new_profile['password']
         
@@ -1720,16 +1410,14 @@ def get_resident_preferences():
                 pass
         
         if preferences:
-            # Convertir datetime a string
-            if preferences.get('created_at'):
-                preferences['created_at'] = preferences['created_at'].isoformat() if hasattr(preferences['created_at'], 'isoformat') else str(preferences['created_at'])
-            if preferences.get('updated_at'):
-                preferences['updated_at'] = preferences['updated_at'].isoformat() if hasattr(preferences['updated_at'], 'isoformat') else str(preferences['updated_at'])
-            return jsonify({
+            etag = compute_etag('resident_preferences', preferences)
+            if is_not_modified(etag):
+                return not_modified(etag, 'private, no-cache')
+            return tag_response(jsonify({
                 'success': True,
                 'exito': True,
                 'data': preferences
-            }), 200
+            }), etag, 'private, no-cache'), 200
         else:
             # Devolver valores por defecto si no existe el registro
             return jsonify({
@@ -1769,37 +1457,33 @@ def get_resident_preferences():
 # BANNERS ROUTES
 # =====================================================
 
+def load_banners(active_only=False):
+    """Lee los banners de la base de datos con las fechas ya serializadas (lanza Error si falla)"""
+    conn = get_connection()
+    if not conn:
+        raise Error(msg='Error de conexión a la base de datos')
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if active_only:
+            cursor.execute("SELECT * FROM banners WHERE is_active = 1 ORDER BY `order` ASC")
+        else:
+            cursor.execute("SELECT * FROM banners ORDER BY `order` ASC, id ASC")
+        banners = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    
+    return banners
+
 @app.route('/api/banners', methods=['GET'])
 def get_all_banners():
     """Obtiene todos los banners (admin)"""
     try:
-        conn = get_connection()
-        if not conn:
-            return jsonify({
-                'success': False,
-                'exito': False,
-                'mensaje': 'Error de conexión a la base de datos'
-            }), 500
-        
-        cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute(
-                "SELECT * FROM banners ORDER BY `order` ASC, id ASC"
-            )
-            banners = cursor.fetchall()
+            banners = banner_cache.get_or_load('all', load_banners)
         except Error as db_error:
-            # Si la tabla no existe, devolver array vacío
+            # Si la tabla no existe, devolver array vacío (sin guardarlo en caché)
             banners = []
-        finally:
-            cursor.close()
-            conn.close()
-        
-        # Convertir datetime a string
-        for banner in banners:
-            if banner.get('created_at'):
-                banner['created_at'] = banner['created_at'].isoformat() if hasattr(banner['created_at'], 'isoformat') else str(banner['created_at'])
-            if banner.get('updated_at'):
-                banner['updated_at'] = banner['updated_at'].isoformat() if hasattr(banner['updated_at'], 'isoformat') else str(banner['updated_at'])
         
         return jsonify({
             'success': True,
@@ -1819,34 +1503,20 @@ def get_all_banners():
 def get_active_banners():
     """Obtiene los banners activos"""
     try:
-        conn = get_connection()
-        if not conn:
-            return jsonify({
-                'success': False,
-                'exito': False,
-                'mensaje': 'Error de conexión a la base de datos'
-            }), 500
+        def load_active():
+            banners = load_banners(active_only=True)
+            # El ETag se calcula una vez por carga y se guarda (e invalida) junto con la lista
+            return banners, compute_etag('banners', banners)
         
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT * FROM banners WHERE is_active = 1 ORDER BY `order` ASC"
-        )
-        banners = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        
-        # Convertir datetime a string
-        for banner in banners:
-            if banner.get('created_at'):
-                banner['created_at'] = banner['created_at'].isoformat() if hasattr(banner['created_at'], 'isoformat') else str(banner['created_at'])
-            if banner.get('updated_at'):
-                banner['updated_at'] = banner['updated_at'].isoformat() if hasattr(banner['updated_at'], 'isoformat') else str(banner['updated_at'])
+        banners, etag = banner_cache.get_or_load('active', load_active)
+        if is_not_modified(etag):
+            return not_modified(etag)
         
-        return jsonify({
+        return tag_response(jsonify({
             'success': True,
             'exito': True,
             'data': banners
-        }), 200
+        }), etag), 200
         
     except Error as e:
         return jsonify({
@@ -1907,6 +1577,7 @@ def create_banner():
                 )
             )
             conn.commit()
+            banner_cache.invalidate()
             banner_id = cursor.lastrowid
             
             # Obtener el banner creado
@@ -1916,12 +1587,6 @@ def create_banner():
             cursor.close()
             conn.close()
             
-            # Convertir datetime a string
-            if banner.get('created_at'):
-                banner['created_at'] = banner['created_at'].isoformat() if hasattr(banner['created_at'], 'isoformat') else str(banner['created_at'])
-            if banner.get('updated_at'):
-                banner['updated_at'] = banner['updated_at'].isoformat() if hasattr(banner['updated_at'], 'isoformat') else str(banner['updated_at'])
-            
             return jsonify({
                 'success': True,
                 'exito': True,
@@ -2007,6 +1672,7 @@ def update_banner(banner_id):
                 )
             )
             conn.commit()
+            banner_cache.invalidate()
             
             # Obtener el banner actualizado
             cursor.execute("SELECT * FROM banners WHERE id = %s", (banner_id,))
@@ -2015,12 +1681,6 @@ def update_banner(banner_id):
             cursor.close()
             conn.close()
             
-            # Convertir datetime a string
-            if banner.get('created_at'):
-                banner['created_at'] = banner['created_at'].isoformat() if hasattr(banner['created_at'], 'isoformat') else str(banner['created_at'])
-            if banner.get('updated_at'):
-                banner['updated_at'] = banner['updated_at'].isoformat() if hasattr(banner['updated_at'], 'isoformat') else str(banner['updated_at'])
-            
             return jsonify({
                 'success': True,
                 'exito': True,
@@ -2073,6 +1733,7 @@ def delete_banner(banner_id):
             # Eliminar el banner
             cursor.execute("DELETE FROM banners WHERE id = %s", (banner_id,))
             conn.commit()
+            banner_cache.invalidate()
             
             cursor.close()
             conn.close()
@@ -2142,6 +1803,7 @@ def update_banner_status(banner_id):
                 (is_active, banner_id)
             )
             conn.commit()
+            banner_cache.invalidate()
             
             cursor.close()
             conn.close()
@@ -2199,10 +1861,7 @@ def get_notifications():
         
         cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute(
-                "SELECT * FROM notifications WHERE user_id = %s ORDER BY created_at DESC",
-                (user_id,)
-            )
+            cursor.execute(USER_NOTIFICATIONS_SQL, (user_id,))
             notifications = cursor.fetchall()
         except Error as db_error:
             # Si la tabla no existe, devolver array vacío
@@ -2211,10 +1870,8 @@ def get_notifications():
             cursor.close()
             conn.close()
         
-        # Convertir datetime a string y ajustar nombre del campo read
+        # Ajustar nombre del campo read
         for notification in notifications:
-            if notification.get('created_at'):
-                notification['created_at'] = notification['created_at'].isoformat() if hasattr(notification['created_at'], 'isoformat') else str(notification['created_at'])
             # Convertir el campo `read` a is_read para compatibilidad con el frontend
             if 'read' in notification:
                 notification['is_read'] = bool(notification['read'])
@@ -2283,9 +1940,22 @@ def mark_notification_as_read(notification_id):
             'mensaje': f'Error: {str(e)}'
         }), 500
 
+EMERGENCY_ALERT_TITLE = "🚨 ALERTA DE EMERGENCIA"
+
+# Latencias de las alertas desde la pulsación del botón (ms):
+# publish = confirmada y publicada, delivery = escrita en el stream del guardia,
+# ack = confirmación de recepción del cliente
+alert_latency = {
+    'publish': LatencyTracker(),
+    'delivery': LatencyTracker(),
+    'ack': LatencyTracker()
+}
+
 @app.route('/api/emergency/alert', methods=['POST'])
 def create_emergency_alert():
     """Crea una alerta de emergencia desde un residente y la envía a todos los guardias"""
+    # Momento de la pulsación del botón (reloj del servidor) para medir la latencia de entrega
+    pressed_at = datetime.now().timestamp()
     try:
         data = request.get_json()
         resident_id = data.get('resident_id')
@@ -2307,12 +1977,8 @@ def create_emergency_alert():
         
         cursor = conn.cursor(dictionary=True)
         try:
-            # Obtener información del residente
-            cursor.execute(
-                "SELECT id, name, user_name, email, fraccionamiento_id, street, house_number FROM profiles WHERE id = %s",
-                (resident_id,)
-            )
-            resident = cursor.fetchone()
+            # Información del residente (caché de perfiles)
+            resident = profile_cache.get(resident_id, cursor)
             
             if not resident:
                 cursor.close()
@@ -2323,11 +1989,9 @@ def create_emergency_alert():
                     'mensaje': 'Residente no encontrado'
                 }), 404
             
-            # Obtener todos los guardias
-            cursor.execute(
-                "SELECT id FROM profiles WHERE role = 'guard' OR role = 'admin'"
-            )
-            guards = cursor.fetchall()
+            # Guardias del fraccionamiento del residente (roster en caché) y canal de sus consolas;
+            # sin guardias propios se notifica a todos por el canal común
+            guards, alert_channel = get_alert_recipients(cursor, resident.get('fraccionamiento_id'))
             
             if not guards:
                 cursor.close()
@@ -2340,15 +2004,9 @@ def create_emergency_alert():
             
             # Crear mensaje de emergencia con datos del residente
             location_info = []
-            if resident.get('fraccionamiento_id'):
-                try:
-                    cursor.execute("SELECT name FROM fraccionamientos WHERE id = %s", (resident['fraccionamiento_id'],))
-                    fracc = cursor.fetchone()
-                    if fracc:
-                        location_info.append(fracc['name'])
-                except Error:
-                    # Si la tabla fraccionamientos no existe, continuar sin error
-                    pass
+            fraccionamiento_name = fraccionamientos.get_name(resident.get('fraccionamiento_id'))
+            if fraccionamiento_name:
+                location_info.append(fraccionamiento_name)
             if resident.get('street'):
                 location_info.append(resident['street'])
             if resident.get('house_number'):
@@ -2357,31 +2015,42 @@ def create_emergency_alert():
             location_str = ", ".join(location_info) if location_info else "Ubicación no especificada"
             
             resident_name = resident.get('name') or resident.get('user_name') or resident.get('email') or 'Residente'
-            title = f"🚨 ALERTA DE EMERGENCIA"
+            title = EMERGENCY_ALERT_TITLE
             message = f"El residente {resident_name} ha activado el botón de emergencia.\n\n"
             message += f"📋 Datos del residente:\n"
             message += f"• Nombre: {resident_name}\n"
             message += f"• Email: {resident.get('email', 'N/A')}\n"
             message += f"• Ubicación: {location_str}"
             
-            # Crear notificación para cada guardia
-            created_notifications = []
-            for guard in guards:
-                cursor.execute(
-                    "INSERT INTO notifications (user_id, title, message, `read`) VALUES (%s, %s, %s, 0)",
-                    (guard['id'], title, message)
-                )
-                created_notifications.append(cursor.lastrowid)
+            # Una notificación por guardia en un solo INSERT de varias filas
+            notification_ids = insert_notifications(cursor, guards, title, message)
             
             conn.commit()
             cursor.close()
             conn.close()
             
+            # Empujar la alerta a las consolas de guardia conectadas en cuanto queda confirmada
+            publish_event(alert_channel, {
+                'type': 'emergency_alert',
+                'alert_id': uuid.uuid4().hex,
+                'title': title,
+                'message': message,
+                'resident': {
+                    'id': resident['id'],
+                    'name': resident_name,
+                    'email': resident.get('email'),
+                    'location': location_str
+                },
+                'notification_ids': {str(guard_id): notification_id for guard_id, notification_id in notification_ids.items()},
+                'pressed_at': pressed_at
+            })
+            alert_latency['publish'].record((datetime.now().timestamp() - pressed_at) * 1000)
+            
             return jsonify({
                 'success': True,
                 'exito': True,
                 'mensaje': f'Alerta de emergencia enviada a {len(guards)} guardia(s)',
-                'notifications_created': len(created_notifications)
+                'notifications_created': len(notification_ids)
             }), 200
             
         except Error as db_error:
@@ -2401,6 +2070,150 @@ def create_emergency_alert():
             'mensaje': f'Error: {str(e)}'
         }), 500
 
+@app.route('/api/emergency/stream', methods=['GET'])
+@no_compress
+def stream_emergency_alerts():
+    """Canal SSE de alertas de emergencia para las consolas de guardias y administradores
+    
+    Requiere user_id de un guardia/admin. Con la cabecera Last-Event-ID (o after_id) se
+    reenvían las alertas creadas mientras la consola estuvo desconectada.
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': 'user_id es requerido'
+        }), 400
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    
+    principal = current_principal(optional=True)
+    try:
+        if principal and str(principal['id']) == str(user_id):
+            profile = principal
+        else:
+            with db_connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute("SELECT role, fraccionamiento_id FROM profiles WHERE id = %s", (user_id,))
+                    profile = cursor.fetchone()
+                finally:
+                    cursor.close()
+    except Error as e:
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': f'Error en la base de datos: {str(e)}'
+        }), 500
+    
+    if not profile or profile['role'] not in ('guard', 'admin'):
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': 'Solo guardias y administradores pueden recibir alertas'
+        }), 403
+    
+    # Alertas del fraccionamiento del guardia y las enviadas a todas las consolas
+    channels = {ALL_GUARDS_CHANNEL, guard_alert_channel(profile.get('fraccionamiento_id'))}
+    heartbeat = app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    
+    def fetch_missed_alerts(after_id):
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(
+                    """SELECT id, title, message, created_at FROM notifications
+                       WHERE user_id = %s AND title = %s AND id > %s
+                       ORDER BY id ASC""",
+                    (user_id, EMERGENCY_ALERT_TITLE, after_id)
+                )
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+    
+    def generate():
+        # Suscribirse antes de leer las pendientes para no perder alertas entre ambos pasos;
+        # dentro del generador para que una respuesta que nunca se itera no deje la suscripción abierta
+        subscription = get_broker().subscribe(channels)
+        try:
+            yield "retry: 3000\nevent: ready\ndata: {}\n\n"
+            if last_id is not None:
+                for notification in fetch_missed_alerts(last_id):
+                    payload = {
+                        'type': 'emergency_alert',
+                        'notification_id': notification['id'],
+                        'title': notification['title'],
+                        'message': notification['message'],
+                        'created_at': notification.get('created_at'),
+                        'replayed': True
+                    }
+                    yield f"id: {notification['id']}\nevent: alert\ndata: {app.json.dumps(payload)}\n\n"
+            while True:
+                item = subscription.get(timeout=heartbeat)
+                if item is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                _, event = item
+                notification_id = event.get('notification_ids', {}).get(str(user_id))
+                if notification_id is None:
+                    # Alerta de otro fraccionamiento
+                    continue
+                # Cada guardia recibe solo su notificación, no el mapa completo
+                payload = {key: value for key, value in event.items() if key != 'notification_ids'}
+                payload['notification_id'] = notification_id
+                yield f"id: {notification_id}\nevent: alert\ndata: {app.json.dumps(payload)}\n\n"
+                if event.get('pressed_at'):
+                    alert_latency['delivery'].record((datetime.now().timestamp() - event['pressed_at']) * 1000)
+        except Error as db_error:
+            yield f"event: error\ndata: {app.json.dumps({'mensaje': f'Error en la base de datos: {str(db_error)}'})}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/emergency/alert/ack', methods=['POST'])
+def acknowledge_emergency_alert():
+    """Confirma la recepción de una alerta en la consola; registra la latencia extremo a extremo
+    
+    El cliente devuelve el `pressed_at` recibido en el evento (reloj del servidor), por lo que
+    la medición no depende del reloj del dispositivo del guardia.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        pressed_at = float(data.get('pressed_at'))
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': 'pressed_at es requerido'
+        }), 400
+    
+    latency_ms = (datetime.now().timestamp() - pressed_at) * 1000
+    alert_latency['ack'].record(latency_ms)
+    return jsonify({
+        'success': True,
+        'exito': True,
+        'latency_ms': round(latency_ms, 3)
+    }), 200
+
+@app.route('/api/emergency/latency-stats', methods=['GET'])
+def emergency_latency_stats():
+    """Percentiles de latencia de las alertas de emergencia (reset=true para reiniciar)"""
+    data = {stage: tracker.summary() for stage, tracker in alert_latency.items()}
+    if request.args.get('reset', 'false').lower() == 'true':
+        for tracker in alert_latency.values():
+            tracker.reset()
+    return jsonify({'success': True, 'exito': True, 'data': data}), 200
+
 @app.route('/api/notifications/mark-all-read', methods=['PUT'])
 def mark_all_notifications_as_read():
     """Marca todas las notificaciones de un usuario como leídas"""
@@ -2544,13 +2357,25 @@ def get_residents():
         
         cursor = conn.cursor(dictionary=True)
         
+        # Sonda de versión: cambia con cualquier alta, baja o edición de un residente
+        etag = None
+        try:
+            cursor.execute(
+                """SELECT COUNT(*) AS total, MAX(id) AS max_id, MAX(updated_at) AS last_update
+                   FROM profiles WHERE role = 'resident'"""
+            )
+            version = cursor.fetchone()
+            etag = compute_etag('residents', version['total'], version['max_id'], version['last_update'])
+        except Error:
+            pass
+        
+        if is_not_modified(etag):
+            cursor.close()
+            conn.close()
+            return not_modified(etag, 'private, no-cache')
+        
         # Obtener todos los usuarios con rol 'resident'
-        query = """
-            SELECT id, name, user_name, email, role
-            FROM profiles
-            WHERE role = 'resident'
-            ORDER BY name ASC
-        """
+        query = profile_cache.RESIDENTS_SQL
         
         try:
             cursor.execute(query)
@@ -2565,15 +2390,16 @@ def get_residents():
                         pass
         except Error as db_error:
             residents = []
+            etag = None
         finally:
             cursor.close()
             conn.close()
         
-        return jsonify({
+        return tag_response(jsonify({
             'success': True,
             'exito': True,
             'data': residents
-        }), 200
+        }), etag, 'private, no-cache'), 200
         
     except Exception as e:
         return jsonify({
@@ -2587,12 +2413,88 @@ def get_residents():
 # CHAT ROUTES
 # =====================================================
 
+def format_chat_messages(messages, sender_id=None, user_id=None, receiver_id=None):
+    """Formatea filas de chat_messages para el frontend (text, time, sent, sender_name)"""
+    formatted_messages = []
+    # Determinar el ID del usuario actual que está viendo los mensajes
+    current_user_id = None
+    if sender_id and str(sender_id).isdigit():
+        current_user_id = int(sender_id)
+    elif user_id and str(user_id).isdigit():
+        current_user_id = int(user_id)
+    elif receiver_id and str(receiver_id).isdigit():
+        # Si hay receiver_id, ese es el usuario actual (para conversaciones 1 a 1)
+        current_user_id = int(receiver_id)
+
+    for msg in messages:
+        # Obtener el ID del remitente del mensaje
+        # Priorizar sender_id sobre user_id para mensajes 1 a 1
+        msg_sender_id = msg.get('sender_id')
+        if not msg_sender_id:
+            msg_sender_id = msg.get('user_id')
+
+        if msg_sender_id:
+            try:
+                msg_sender_id = int(msg_sender_id)
+            except (ValueError, TypeError):
+                msg_sender_id = None
+
+        # Determinar si el mensaje fue enviado por el usuario actual
+        is_sent = False
+        if current_user_id and msg_sender_id:
+            try:
+                is_sent = int(msg_sender_id) == int(current_user_id)
+            except (ValueError, TypeError):
+                is_sent = False
+
+        # Si el mensaje tiene receiver_id, verificar que sea para el usuario actual
+        # Esto previene que residentes vean mensajes de otros residentes como propios
+        msg_receiver_id = msg.get('receiver_id')
+        if msg_receiver_id and current_user_id:
+            try:
+                msg_receiver_id = int(msg_receiver_id)
+                # Si el mensaje tiene un receiver_id y no es el usuario actual, no debería marcarse como enviado
+                if msg_receiver_id != current_user_id and msg_sender_id != current_user_id:
+                    is_sent = False
+            except (ValueError, TypeError):
+                pass
+
+        # Formatear fecha
+        created_at = msg.get('created_at')
+        time_str = '00:00'
+        if created_at:
+            try:
+                if hasattr(created_at, 'strftime'):
+                    time_str = created_at.strftime('%H:%M')
+                elif isinstance(created_at, str):
+                    # Intentar parsear string de fecha
+                    from datetime import datetime
+                    dt = datetime.strptime(created_at[:19], '%Y-%m-%d %H:%M:%S')
+                    time_str = dt.strftime('%H:%M')
+                else:
+                    time_str = str(created_at)[:5] if len(str(created_at)) >= 5 else '00:00'
+            except:
+                time_str = '00:00'
+
+        formatted_messages.append({
+            'id': msg.get('id'),
+            'text': msg.get('message', ''),
+            'time': time_str,
+            'sent': is_sent,
+            'sender_name': msg.get('sender_name') or msg.get('sender_username', 'Usuario'),
+            'created_at': created_at or None
+        })
+    
+    return formatted_messages
+
 @app.route('/api/chat/messages', methods=['POST'])
 def send_chat_message():
     """Envía un mensaje de chat"""
     try:
+        principal = current_principal(optional=True)
         data = request.get_json()
-        sender_id = data.get('sender_id')
+        # Con sesión, el remitente es el usuario del token
+        sender_id = data.get('sender_id') or (principal['id'] if principal else None)
         receiver_id = data.get('receiver_id')
         message_text = data.get('message')
         chat_type = data.get('chat_type', 'administration')  # Para residentes que usan tabs
@@ -2604,6 +2506,13 @@ def send_chat_message():
                 'mensaje': 'sender_id y message son requeridos'
             }), 400
         
+        if principal and str(sender_id) != str(principal['id']):
+            return jsonify({
+                'success': False,
+                'exito': False,
+                'mensaje': 'sender_id no corresponde a la sesión'
+            }), 403
+        
         conn = get_connection()
         if not conn:
             return jsonify({
@@ -2615,9 +2524,10 @@ def send_chat_message():
         cursor = conn.cursor(dictionary=True)
         
         try:
-            # Obtener información del sender
-            cursor.execute("SELECT id, role, fraccionamiento_id FROM profiles WHERE id = %s", (sender_id,))
-            sender = cursor.fetchone()
+            # Sender y receiver desde la caché de perfiles, en una sola consulta si fallan
+            # (el principal de la sesión ya trae rol y fraccionamiento del sender)
+            participants = profile_cache.get_many([receiver_id] if principal else [sender_id, receiver_id], cursor)
+            sender = principal or participants.get(profile_cache.normalize_id(sender_id))
             
             if not sender:
                 return jsonify({
@@ -2633,8 +2543,7 @@ def send_chat_message():
             # Si es una conversación 1 a 1 (admin/guard-residente o viceversa)
             if receiver_id:
                 # Verificar que el receiver existe
-                cursor.execute("SELECT id, role, fraccionamiento_id FROM profiles WHERE id = %s", (receiver_id,))
-                receiver = cursor.fetchone()
+                receiver = participants.get(profile_cache.normalize_id(receiver_id))
                 
                 if not receiver:
                     return jsonify({
@@ -2707,6 +2616,11 @@ def send_chat_message():
             cursor.close()
             conn.close()
             
+            # Avisar a los suscriptores SSE de los participantes (ya está confirmado en la BD)
+            event = {'type': 'chat_message', 'id': message_id, 'sender_id': sender_id, 'receiver_id': receiver_id}
+            for participant_id in {sender_id, receiver_id} - {None}:
+                publish_event(f'chat:user:{participant_id}', event)
+            
             return jsonify({
                 'success': True,
                 'exito': True,
@@ -2739,12 +2653,41 @@ def send_chat_message():
 
 @app.route('/api/chat/messages', methods=['GET'])
 def get_chat_messages():
-    """Obtiene los mensajes de chat"""
+    """Obtiene los mensajes de chat
+    
+    Polling incremental: after_id (último id recibido) o since (timestamp ISO) devuelven solo
+    mensajes nuevos; con limit, los más antiguos primero y has_more indica que hay que seguir
+    pidiendo desde last_id. Historial: limit (+ before_id) devuelve los mensajes anteriores
+    más recientes.
+    """
     try:
         sender_id = request.args.get('sender_id')
         receiver_id = request.args.get('receiver_id')
         chat_type = request.args.get('chat_type')
         user_id = request.args.get('user_id')  # Para obtener todos los mensajes de un usuario
+        principal = current_principal(optional=True)
+        
+        try:
+            after_id = request.args.get('after_id', type=int)
+            before_id = request.args.get('before_id', type=int)
+            since = request.args.get('since')
+            if since:
+                since = datetime.fromisoformat(since)
+                if since.tzinfo:
+                    # created_at se guarda en hora local sin zona
+                    since = since.astimezone().replace(tzinfo=None)
+            limit = parse_limit(
+                request.args.get('limit'),
+                None,
+                app.config.get('CHAT_MAX_PAGE_SIZE', 200)
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'exito': False,
+                'mensaje': f'Parámetros de paginación inválidos: {str(e)}',
+                'data': []
+            }), 400
         
         conn = get_connection()
         if not conn:
@@ -2757,311 +2700,54 @@ def get_chat_messages():
         cursor = conn.cursor(dictionary=True)
         
         try:
-            messages = []
-            
-            # Si es conversación 1 a 1 (admin/guard-residente)
+            # Rol del sender desde la sesión o la caché de perfiles: la consulta no lo busca en profiles
+            sender_role = None
             if sender_id and receiver_id:
-                # Obtener el rol del sender para filtrar correctamente
-                cursor.execute("SELECT role FROM profiles WHERE id = %s", (sender_id,))
-                sender_role_info = cursor.fetchone()
-                sender_role = sender_role_info.get('role') if sender_role_info else None
-                
-                # Determinar el chat_type según el rol del sender
-                target_chat_type = 'administration' if sender_role == 'admin' else 'security' if sender_role == 'guard' else None
-                
-                # Primero intentar con estructura nueva (sender_id, receiver_id)
-                try:
-                    query_new = """
-                        SELECT 
-                            cm.*,
-                            s.name as sender_name,
-                            s.user_name as sender_username,
-                            r.name as receiver_name,
-                            r.user_name as receiver_username
-                        FROM chat_messages cm
-                        LEFT JOIN profiles s ON cm.sender_id = s.id
-                        LEFT JOIN profiles r ON cm.receiver_id = r.id
-                        WHERE (cm.sender_id = %s AND cm.receiver_id = %s)
-                           OR (cm.sender_id = %s AND cm.receiver_id = %s)
-                        ORDER BY cm.created_at ASC
-                    """
-                    cursor.execute(query_new, (sender_id, receiver_id, receiver_id, sender_id))
-                    messages_new = cursor.fetchall()
-                    
-                    if messages_new:
-                        messages = messages_new
-                except Error:
-                    messages_new = []
-                
-                # SIEMPRE buscar también en estructura antigua (user_id, chat_type)
-                # Obtener mensajes del residente, pero SOLO del chat_type correspondiente al rol del sender
-                if target_chat_type:
-                    query_resident = """
-                        SELECT 
-                            cm.*,
-                            p.name as sender_name,
-                            p.user_name as sender_username
-                        FROM chat_messages cm
-                        LEFT JOIN profiles p ON cm.user_id = p.id
-                        WHERE cm.user_id = %s
-                          AND cm.chat_type = %s
-                        ORDER BY cm.created_at ASC
-                    """
-                    cursor.execute(query_resident, (receiver_id, target_chat_type))
+                if principal and str(principal['id']) == str(sender_id):
+                    sender_role = principal['role']
                 else:
-                    # Si no hay target_chat_type, buscar todos los mensajes del residente
-                    query_resident = """
-                        SELECT 
-                            cm.*,
-                            p.name as sender_name,
-                            p.user_name as sender_username
-                        FROM chat_messages cm
-                        LEFT JOIN profiles p ON cm.user_id = p.id
-                        WHERE cm.user_id = %s
-                        ORDER BY cm.created_at ASC
-                    """
-                    cursor.execute(query_resident, (receiver_id,))
-                
-                messages_resident = cursor.fetchall()
-                
-                # Combinar mensajes del residente, evitando duplicados
-                existing_ids = {m.get('id') for m in messages}
-                for msg in messages_resident:
-                    if msg.get('id') not in existing_ids:
-                        messages.append(msg)
-                
-                # NO buscar mensajes de admin/guard en la estructura antigua para conversaciones 1 a 1
-                # En conversaciones 1 a 1, solo debemos usar la estructura nueva (sender_id/receiver_id)
-                # para evitar mostrar mensajes de otros residentes del mismo fraccionamiento
-                # Los mensajes de admin/guard ya están incluidos en la búsqueda inicial con sender_id/receiver_id
-                
-                # Ordenar todos los mensajes por fecha después de combinarlos
-                messages.sort(key=lambda x: x.get('created_at') or '1970-01-01 00:00:00')
-            elif chat_type and user_id:
-                # Para residentes que usan tabs
-                # Obtener mensajes del residente (estructura antigua: user_id + chat_type)
-                query_resident = """
-                    SELECT 
-                        cm.*,
-                        p.name as sender_name,
-                        p.user_name as sender_username
-                    FROM chat_messages cm
-                    LEFT JOIN profiles p ON cm.user_id = p.id
-                    WHERE cm.chat_type = %s
-                      AND cm.user_id = %s
-                    ORDER BY cm.created_at ASC
-                """
-                cursor.execute(query_resident, (chat_type, user_id))
-                messages = cursor.fetchall()
-                
-                # Determinar el rol objetivo para filtrar mensajes de admin/guard
-                target_role = 'admin' if chat_type == 'administration' else 'guard' if chat_type == 'security' else None
-                
-                # NO buscar mensajes de admin/guard en la estructura antigua sin receiver_id
-                # Esto previene que residentes vean mensajes de admin/guard que no fueron dirigidos a ellos
-                # Solo se mostrarán mensajes que:
-                # 1. Fueron enviados por el residente actual (ya obtenidos arriba)
-                # 2. Fueron enviados por admin/guard directamente al residente (obtenidos con receiver_id)
-                # 
-                # Los mensajes de admin/guard en la estructura antigua sin receiver_id específico
-                # no deben mostrarse a todos los residentes, solo a aquellos a quienes fueron dirigidos
-                
-                # También obtener mensajes donde el residente es el receiver_id (estructura nueva)
-                # Esto captura mensajes enviados por admin/guard directamente al residente
-                try:
-                    query_receiver_messages = """
-                        SELECT 
-                            cm.*,
-                            s.name as sender_name,
-                            s.user_name as sender_username
-                        FROM chat_messages cm
-                        LEFT JOIN profiles s ON cm.sender_id = s.id
-                        WHERE cm.receiver_id = %s
-                          AND (cm.chat_type = %s OR cm.chat_type IS NULL)
-                        ORDER BY cm.created_at ASC
-                    """
-                    cursor.execute(query_receiver_messages, (user_id, chat_type))
-                    receiver_messages = cursor.fetchall()
-                    
-                    # Combinar mensajes, evitando duplicados
-                    existing_ids = {m.get('id') for m in messages}
-                    for msg in receiver_messages:
-                        if msg.get('id') not in existing_ids:
-                            messages.append(msg)
-                except Error:
-                    pass  # Si falla, continuar
-                
-                # También buscar mensajes de admin/guard con receiver_id específico (estructura nueva)
-                if target_role:
-                    try:
-                        query_admin_to_resident = """
-                            SELECT 
-                                cm.*,
-                                s.name as sender_name,
-                                s.user_name as sender_username
-                            FROM chat_messages cm
-                            LEFT JOIN profiles s ON cm.sender_id = s.id
-                            WHERE cm.receiver_id = %s
-                              AND s.role = %s
-                            ORDER BY cm.created_at ASC
-                        """
-                        cursor.execute(query_admin_to_resident, (user_id, target_role))
-                        admin_messages = cursor.fetchall()
-                        
-                        # Combinar mensajes, evitando duplicados
-                        existing_ids = {m.get('id') for m in messages}
-                        for msg in admin_messages:
-                            if msg.get('id') not in existing_ids:
-                                messages.append(msg)
-                    except Error:
-                        pass  # Continuar con la búsqueda alternativa
-                
-                # También buscar mensajes donde el residente es el sender_id (mensajes enviados por el residente en estructura nueva)
-                try:
-                    query_sender_messages = """
-                        SELECT 
-                            cm.*,
-                            s.name as sender_name,
-                            s.user_name as sender_username
-                        FROM chat_messages cm
-                        LEFT JOIN profiles s ON cm.sender_id = s.id
-                        WHERE cm.sender_id = %s
-                        ORDER BY cm.created_at ASC
-                    """
-                    cursor.execute(query_sender_messages, (user_id,))
-                    sender_messages = cursor.fetchall()
-                    
-                    # Combinar mensajes, evitando duplicados
-                    existing_ids = {m.get('id') for m in messages}
-                    for msg in sender_messages:
-                        if msg.get('id') not in existing_ids:
-                            messages.append(msg)
-                except Error:
-                    pass  # Si falla, continuar
-                
-                # NO buscar mensajes de admin/guard en el mismo fraccionamiento sin receiver_id
-                # Esto previene que residentes vean mensajes de admin/guard que no fueron dirigidos a ellos
-                # Solo se mostrarán mensajes que:
-                # 1. Fueron enviados por el residente actual (ya obtenidos arriba)
-                # 2. Fueron enviados por admin/guard directamente al residente (obtenidos arriba con receiver_id)
-                # 
-                # Los mensajes de admin/guard en el mismo fraccionamiento sin receiver_id específico
-                # no deben mostrarse a todos los residentes, solo a aquellos a quienes fueron dirigidos
-                
-                # Ordenar todos los mensajes por fecha
-                messages.sort(key=lambda x: x.get('created_at') or '1970-01-01 00:00:00')
-            elif user_id:
-                # Obtener todos los mensajes de un usuario (para admin viendo conversaciones)
-                try:
-                    query = """
-                        SELECT 
-                            cm.*,
-                            s.name as sender_name,
-                            s.user_name as sender_username,
-                            r.name as receiver_name,
-                            r.user_name as receiver_username
-                        FROM chat_messages cm
-                        LEFT JOIN profiles s ON cm.sender_id = s.id
-                        LEFT JOIN profiles r ON cm.receiver_id = r.id
-                        WHERE cm.sender_id = %s OR cm.receiver_id = %s
-                        ORDER BY cm.created_at ASC
-                    """
-                    cursor.execute(query, (user_id, user_id))
-                    messages = cursor.fetchall()
-                except Error:
-                    # Estructura antigua
-                    query = """
-                        SELECT 
-                            cm.*,
-                            p.name as sender_name,
-                            p.user_name as sender_username
-                        FROM chat_messages cm
-                        LEFT JOIN profiles p ON cm.user_id = p.id
-                        WHERE cm.user_id = %s
-                        ORDER BY cm.created_at ASC
-                    """
-                    cursor.execute(query, (user_id,))
-                    messages = cursor.fetchall()
+                    sender = profile_cache.get(sender_id, cursor)
+                    sender_role = sender['role'] if sender else None
             
-            # Formatear mensajes
-            formatted_messages = []
-            # Determinar el ID del usuario actual que está viendo los mensajes
-            current_user_id = None
-            if sender_id and str(sender_id).isdigit():
-                current_user_id = int(sender_id)
-            elif user_id and str(user_id).isdigit():
-                current_user_id = int(user_id)
-            elif receiver_id and str(receiver_id).isdigit():
-                # Si hay receiver_id, ese es el usuario actual (para conversaciones 1 a 1)
-                current_user_id = int(receiver_id)
+            # Una sola consulta (UNION de ids) para los modos 1 a 1, tab del residente y
+            # todos los mensajes de un usuario; ya viene ordenada y sin duplicados
+            messages = fetch_conversation(
+                cursor,
+                sender_id=sender_id,
+                receiver_id=receiver_id,
+                chat_type=chat_type,
+                user_id=user_id,
+                after_id=after_id,
+                before_id=before_id,
+                since=since,
+                # Un mensaje extra para saber si queda más historial
+                limit=limit + 1 if limit else None,
+                sender_role=sender_role
+            )
             
-            for msg in messages:
-                # Obtener el ID del remitente del mensaje
-                # Priorizar sender_id sobre user_id para mensajes 1 a 1
-                msg_sender_id = msg.get('sender_id')
-                if not msg_sender_id:
-                    msg_sender_id = msg.get('user_id')
-                
-                if msg_sender_id:
-                    try:
-                        msg_sender_id = int(msg_sender_id)
-                    except (ValueError, TypeError):
-                        msg_sender_id = None
-                
-                # Determinar si el mensaje fue enviado por el usuario actual
-                is_sent = False
-                if current_user_id and msg_sender_id:
-                    try:
-                        is_sent = int(msg_sender_id) == int(current_user_id)
-                    except (ValueError, TypeError):
-                        is_sent = False
-                
-                # Si el mensaje tiene receiver_id, verificar que sea para el usuario actual
-                # Esto previene que residentes vean mensajes de otros residentes como propios
-                msg_receiver_id = msg.get('receiver_id')
-                if msg_receiver_id and current_user_id:
-                    try:
-                        msg_receiver_id = int(msg_receiver_id)
-                        # Si el mensaje tiene un receiver_id y no es el usuario actual, no debería marcarse como enviado
-                        if msg_receiver_id != current_user_id and msg_sender_id != current_user_id:
-                            is_sent = False
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Formatear fecha
-                created_at = msg.get('created_at')
-                time_str = '00:00'
-                if created_at:
-                    try:
-                        if hasattr(created_at, 'strftime'):
-                            time_str = created_at.strftime('%H:%M')
-                        elif isinstance(created_at, str):
-                            # Intentar parsear string de fecha
-                            from datetime import datetime
-                            dt = datetime.strptime(created_at[:19], '%Y-%m-%d %H:%M:%S')
-                            time_str = dt.strftime('%H:%M')
-                        else:
-                            time_str = str(created_at)[:5] if len(str(created_at)) >= 5 else '00:00'
-                    except:
-                        time_str = '00:00'
-                
-                formatted_messages.append({
-                    'id': msg.get('id'),
-                    'text': msg.get('message', ''),
-                    'time': time_str,
-                    'sent': is_sent,
-                    'sender_name': msg.get('sender_name') or msg.get('sender_username', 'Usuario'),
-                    'created_at': created_at.isoformat() if created_at and hasattr(created_at, 'isoformat') else str(created_at) if created_at else None
-                })
+            has_more = False
+            if limit and len(messages) > limit:
+                # Historial: sobra el más antiguo; polling hacia adelante: sobra el más nuevo
+                messages = messages[1:] if is_backward(after_id, before_id, since) else messages[:limit]
+                has_more = True
+            
+            # Formatear mensajes
+            formatted_messages = format_chat_messages(messages, sender_id, user_id, receiver_id)
             
             cursor.close()
             conn.close()
             
-            return jsonify({
+            response = {
                 'success': True,
                 'exito': True,
-                'data': formatted_messages
-            }), 200
+                'data': formatted_messages,
+                # Cursores para el siguiente poll (after_id) y para cargar historial (before_id)
+                'last_id': formatted_messages[-1]['id'] if formatted_messages else after_id,
+                'first_id': formatted_messages[0]['id'] if formatted_messages else None
+            }
+            if limit:
+                response['has_more'] = has_more
+            return jsonify(response), 200
             
         except Error as db_error:
             cursor.close()
@@ -3081,6 +2767,279 @@ def get_chat_messages():
             'data': []
         }), 200
 
+@app.route('/api/chat/stream', methods=['GET'])
+@no_compress
+def stream_chat_messages():
+    """Canal SSE de mensajes nuevos de una conversación
+    
+    Acepta los mismos parámetros que GET /api/chat/messages (sender_id + receiver_id,
+    chat_type + user_id o user_id) y after_id / cabecera Last-Event-ID para reanudar.
+    """
+    sender_id = request.args.get('sender_id')
+    receiver_id = request.args.get('receiver_id')
+    chat_type = request.args.get('chat_type')
+    user_id = request.args.get('user_id')
+    
+    if not ((sender_id and receiver_id) or user_id):
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': 'Se requiere sender_id y receiver_id, o user_id'
+        }), 400
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    
+    # Rol del sender desde la sesión (sin subconsulta a profiles en cada poll del stream)
+    principal = current_principal(optional=True)
+    sender_role = principal['role'] if principal and str(principal['id']) == str(sender_id) else None
+    
+    # Canales de todos los participantes de la conversación
+    participants = {sender_id, receiver_id, user_id} - {None, ''}
+    heartbeat = app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    
+    def fetch_new_messages(after_id):
+        # Conexión solo durante la consulta: los suscriptores inactivos no retienen conexiones
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                if after_id is None:
+                    # Primera conexión sin cursor: partir del último mensaje existente
+                    latest = fetch_conversation(cursor, sender_id, receiver_id, chat_type, user_id, limit=1,
+                                                sender_role=sender_role)
+                    return [], latest[-1]['id'] if latest else 0
+                messages = fetch_conversation(cursor, sender_id, receiver_id, chat_type, user_id, after_id=after_id,
+                                              sender_role=sender_role)
+                return messages, messages[-1]['id'] if messages else after_id
+            finally:
+                cursor.close()
+    
+    def generate():
+        nonlocal last_id
+        # Suscripción al empezar el stream: se cierra en el finally del propio generador
+        subscription = get_broker().subscribe([f'chat:user:{participant}' for participant in participants])
+        try:
+            messages, last_id = fetch_new_messages(last_id)
+            yield f"retry: 3000\nevent: ready\ndata: {app.json.dumps({'last_id': last_id})}\n\n"
+            while True:
+                for message in format_chat_messages(messages, sender_id, user_id, receiver_id):
+                    yield f"id: {message['id']}\nevent: message\ndata: {app.json.dumps(message)}\n\n"
+                if subscription.get(timeout=heartbeat) is None:
+                    # Comentario SSE para mantener viva la conexión y detectar clientes desconectados
+                    yield ": keep-alive\n\n"
+                    messages = []
+                    continue
+                # Agrupar eventos que llegaron juntos en una sola consulta
+                while subscription.get(timeout=0) is not None:
+                    pass
+                messages, last_id = fetch_new_messages(last_id)
+        except Error as db_error:
+            yield f"event: error\ndata: {app.json.dumps({'mensaje': f'Error en la base de datos: {str(db_error)}'})}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/visitors/pass-sweeper/stats', methods=['GET'])
+def pass_sweeper_stats():
+    """Ejecuciones y pases marcados como vencidos por el sweeper de este worker"""
+    sweeper = get_pass_sweeper()
+    if sweeper is None:
+        return jsonify({'mensaje': 'El barrido de pases está desactivado', 'exito': False}), 503
+    return jsonify({'exito': True, 'data': sweeper.stats()}), 200
+
+@app.route('/api/visitors/pass-index/stats', methods=['GET'])
+def pass_index_stats():
+    """Tamaño, antigüedad y aciertos del índice de pases de este worker"""
+    index = get_pass_index()
+    if index is None:
+        return jsonify({'mensaje': 'El índice de pases está desactivado', 'exito': False}), 503
+    return jsonify({'exito': True, 'data': index.stats()}), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Aciertos, fallos e invalidaciones de las cachés en memoria de este proceso"""
+    return jsonify({'exito': True, 'data': get_cache_stats()}), 200
+
+@app.route('/api/events/stats', methods=['GET'])
+def event_broker_stats():
+    """Estadísticas del broker de eventos (suscriptores, publicados, descartados)"""
+    return jsonify({'exito': True, 'data': get_broker().stats()}), 200
+
+# =====================================================
+# GATE SYNC ROUTES (validación offline en la caseta)
+# =====================================================
+
+def _gate_sync_fraccionamiento():
+    try:
+        return int(request.args.get('fraccionamiento_id', ''))
+    except ValueError:
+        return None
+
+def _gate_sync_forbidden(fraccionamiento_id):
+    """Error response unless the caller is a guard/admin session of that fraccionamiento"""
+    principal = current_principal()
+    if principal is None:
+        return jsonify({'mensaje': 'Se requiere una sesión de guardia o administrador', 'exito': False}), 401
+    if principal['role'] not in ('guard', 'admin') or str(principal.get('fraccionamiento_id')) != str(fraccionamiento_id):
+        return jsonify({
+            'mensaje': 'Solo guardias y administradores del fraccionamiento pueden sincronizar la caseta',
+            'exito': False
+        }), 403
+    return None
+
+@app.route('/api/gate-sync/snapshot', methods=['GET'])
+def gate_sync_snapshot():
+    """Todos los pases válidos y residentes de un fraccionamiento, con direcciones resueltas
+    
+    Las filas son listas en el orden de `fields`; `version` se usa después como `since`.
+    Requiere el token de un guardia/admin del mismo fraccionamiento.
+    """
+    fraccionamiento_id = _gate_sync_fraccionamiento()
+    if fraccionamiento_id is None:
+        return jsonify({'mensaje': 'fraccionamiento_id es requerido y debe ser numérico', 'exito': False}), 400
+    forbidden = _gate_sync_forbidden(fraccionamiento_id)
+    if forbidden:
+        return forbidden
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                snapshot = gate_sync.build_snapshot(cursor, fraccionamiento_id)
+            finally:
+                cursor.close()
+        return jsonify({'exito': True, 'data': snapshot}), 200
+    except Error as e:
+        return jsonify({'mensaje': 'Error de base de datos: ' + str(e), 'exito': False}), 500
+    except Exception as e:
+        return jsonify({'mensaje': 'Error: ' + str(e), 'exito': False}), 500
+
+@app.route('/api/gate-sync/delta', methods=['GET'])
+def gate_sync_delta():
+    """Pases y residentes que cambiaron desde `since`, más los ids a eliminar
+    
+    410 si `since` es más antiguo que la retención de borrados: descargar un snapshot nuevo.
+    Requiere el token de un guardia/admin del mismo fraccionamiento.
+    """
+    fraccionamiento_id = _gate_sync_fraccionamiento()
+    if fraccionamiento_id is None:
+        return jsonify({'mensaje': 'fraccionamiento_id es requerido y debe ser numérico', 'exito': False}), 400
+    forbidden = _gate_sync_forbidden(fraccionamiento_id)
+    if forbidden:
+        return forbidden
+    try:
+        since = gate_sync.parse_version(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'mensaje': str(e), 'exito': False}), 400
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                delta = gate_sync.build_delta(cursor, fraccionamiento_id, since)
+            finally:
+                cursor.close()
+        return jsonify({'exito': True, 'data': delta}), 200
+    except gate_sync.ResyncRequired:
+        return jsonify({
+            'mensaje': 'La versión es demasiado antigua: descarga un snapshot nuevo',
+            'resync': True,
+            'exito': False
+        }), 410
+    except Error as e:
+        return jsonify({'mensaje': 'Error de base de datos: ' + str(e), 'exito': False}), 500
+    except Exception as e:
+        return jsonify({'mensaje': 'Error: ' + str(e), 'exito': False}), 500
+
+# =====================================================
+# EXPORT ROUTES
+# =====================================================
+
+# Cada exportación retiene una conexión del pool mientras dura; limitar cuántas corren a la vez
+export_slots = threading.BoundedSemaphore(app.config.get('EXPORT_MAX_CONCURRENT', 2))
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_dataset(dataset):
+    """Exporta house_access, visitors o incidents en streaming (NDJSON o CSV)
+    
+    Parámetros: format=ndjson|csv, start_date, end_date (YYYY-MM-DD, inclusive) y
+    fraccionamiento_id. Las filas se leen por lotes con un cursor sin buffer, así que la
+    memoria del worker no depende del tamaño de la tabla.
+    """
+    if dataset not in export.EXPORTS:
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': f'Exportación desconocida. Opciones: {", ".join(export.EXPORTS)}'
+        }), 404
+    
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': 'format debe ser ndjson o csv'
+        }), 400
+    
+    try:
+        filters = export.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': str(e)
+        }), 400
+    
+    # Todo lo que puede fallar va antes de tomar el cupo: solo call_on_close lo libera
+    sql, params = export.build_query(dataset, filters)
+    batch_size = app.config.get('EXPORT_BATCH_SIZE', 500)
+    filename = export.export_filename(dataset, filters, fmt)
+    
+    if not export_slots.acquire(blocking=False):
+        return jsonify({
+            'success': False,
+            'exito': False,
+            'mensaje': 'Hay demasiadas exportaciones en curso, intenta de nuevo en unos minutos'
+        }), 429
+    
+    def generate():
+        try:
+            with db_connection() as conn:
+                # Cursor sin buffer: el servidor envía las filas conforme se consumen
+                cursor = conn.cursor(buffered=False)
+                try:
+                    cursor.execute(sql, params)
+                    batches = export.iter_batches(cursor, batch_size)
+                    if fmt == 'csv':
+                        yield from export.csv_chunks(cursor.column_names, batches)
+                    else:
+                        yield from export.ndjson_chunks(cursor.column_names, batches)
+                finally:
+                    cursor.close()
+        except Error as db_error:
+            # El estado HTTP ya se envió: reportar el error dentro del propio archivo
+            print(f"Error exportando {dataset}: {db_error}")
+            if fmt == 'ndjson':
+                yield export.dumps_bytes({'error': f'Error en la base de datos: {str(db_error)}'}) + b'\n'
+    
+    try:
+        response = Response(generate(), mimetype=export.FORMATS[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['X-Accel-Buffering'] = 'no'
+        # Liberar el cupo aunque el cliente corte la descarga o el generador nunca arranque
+        response.call_on_close(export_slots.release)
+    except Exception:
+        export_slots.release()
+        raise
+    return response
+
 # =====================================================
 # ERROR HANDLERS
 # =====================================================
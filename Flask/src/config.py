@@ -22,6 +22,63 @@ class DevelopmentConfig:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', '')
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'aicp_db')
     MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
+    # Driver en Python puro: necesario para que gevent pueda ceder durante las consultas
+    MYSQL_USE_PURE = os.getenv('MYSQL_USE_PURE', 'false').lower() == 'true'
+    
+    # Pool de conexiones MySQL
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    # Paginación de listados
+    VISITORS_PAGE_SIZE = int(os.getenv('VISITORS_PAGE_SIZE', 50))
+    VISITORS_MAX_PAGE_SIZE = int(os.getenv('VISITORS_MAX_PAGE_SIZE', 500))
+    CHAT_MAX_PAGE_SIZE = int(os.getenv('CHAT_MAX_PAGE_SIZE', 200))
+    
+    # Canales push (SSE): broker local o redis para varios workers
+    BROKER_BACKEND = os.getenv('BROKER_BACKEND', 'local')
+    BROKER_REDIS_URL = os.getenv('BROKER_REDIS_URL', 'redis://localhost:6379/0')
+    BROKER_QUEUE_SIZE = int(os.getenv('BROKER_QUEUE_SIZE', 100))
+    SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    GUARD_ROSTER_TTL = int(os.getenv('GUARD_ROSTER_TTL', 300))
+    BANNER_CACHE_TTL = int(os.getenv('BANNER_CACHE_TTL', 300))
+    BANNER_CACHE_SIZE = int(os.getenv('BANNER_CACHE_SIZE', 16))
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.getenv('COMPRESS_BR_LEVEL', 4))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+    EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', 2))
+    # Imágenes QR locales: payloads e imágenes en disco, direccionados por hash
+    QR_CACHE_DIR = os.getenv('QR_CACHE_DIR', str(parent_dir / 'var' / 'qr'))
+    QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 256))
+    QR_RENDER_WORKERS = int(os.getenv('QR_RENDER_WORKERS', 2))
+    QR_RENDER_TIMEOUT = float(os.getenv('QR_RENDER_TIMEOUT', 10))
+    # Firma HMAC de los QR (por defecto SECRET_KEY); true = rechazar los QR antiguos sin firma
+    QR_SIGNING_KEY = os.getenv('QR_SIGNING_KEY')
+    QR_REQUIRE_SIGNATURE = os.getenv('QR_REQUIRE_SIGNATURE', 'false').lower() == 'true'
+    # Índice de pases en memoria para decode-qr: antigüedad máxima y recarga completa (s)
+    PASS_INDEX_ENABLED = os.getenv('PASS_INDEX_ENABLED', 'true').lower() == 'true'
+    PASS_INDEX_MAX_STALENESS = float(os.getenv('PASS_INDEX_MAX_STALENESS', 5))
+    PASS_INDEX_FULL_RELOAD = float(os.getenv('PASS_INDEX_FULL_RELOAD', 600))
+    # Barrido de pases vencidos (visitors.expires_at) a status 'expired'
+    PASS_SWEEP_ENABLED = os.getenv('PASS_SWEEP_ENABLED', 'true').lower() == 'true'
+    PASS_SWEEP_INTERVAL = float(os.getenv('PASS_SWEEP_INTERVAL', 60))
+    PASS_SWEEP_BATCH = int(os.getenv('PASS_SWEEP_BATCH', 500))
+    # Tablas/columnas opcionales que aún no existen: cada cuánto se vuelve a comprobar (s)
+    SCHEMA_RECHECK_SECONDS = float(os.getenv('SCHEMA_RECHECK_SECONDS', 30))
+    # Sesiones con token: duración (s) y caché de principals (id, role, fraccionamiento_id, name)
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 12 * 3600))
+    PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', 60))
+    PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', 4096))
+    # Caché de perfiles por id y email; los ids/emails inexistentes se guardan con un TTL menor
+    PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', 120))
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 2048))
+    PROFILE_CACHE_NEGATIVE_TTL = float(os.getenv('PROFILE_CACHE_NEGATIVE_TTL', 30))
+    # Tabla fraccionamientos en memoria: cada cuántos segundos se compara su CHECKSUM
+    FRACCIONAMIENTOS_CHECK_INTERVAL = float(os.getenv('FRACCIONAMIENTOS_CHECK_INTERVAL', 30))
     
     # CORS Configuration
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:4200').split(',')
@@ -35,6 +92,56 @@ class ProductionConfig:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE')
     MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
+    MYSQL_USE_PURE = os.getenv('MYSQL_USE_PURE', 'false').lower() == 'true'
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 20))
+    DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    VISITORS_PAGE_SIZE = int(os.getenv('VISITORS_PAGE_SIZE', 50))
+    VISITORS_MAX_PAGE_SIZE = int(os.getenv('VISITORS_MAX_PAGE_SIZE', 500))
+    CHAT_MAX_PAGE_SIZE = int(os.getenv('CHAT_MAX_PAGE_SIZE', 200))
+    BROKER_BACKEND = os.getenv('BROKER_BACKEND', 'local')
+    BROKER_REDIS_URL = os.getenv('BROKER_REDIS_URL')
+    BROKER_QUEUE_SIZE = int(os.getenv('BROKER_QUEUE_SIZE', 100))
+    SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    GUARD_ROSTER_TTL = int(os.getenv('GUARD_ROSTER_TTL', 300))
+    BANNER_CACHE_TTL = int(os.getenv('BANNER_CACHE_TTL', 300))
+    BANNER_CACHE_SIZE = int(os.getenv('BANNER_CACHE_SIZE', 16))
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.getenv('COMPRESS_BR_LEVEL', 4))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+    EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', 2))
+    # Imágenes QR locales: payloads e imágenes en disco, direccionados por hash
+    QR_CACHE_DIR = os.getenv('QR_CACHE_DIR', str(parent_dir / 'var' / 'qr'))
+    QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 256))
+    QR_RENDER_WORKERS = int(os.getenv('QR_RENDER_WORKERS', 2))
+    QR_RENDER_TIMEOUT = float(os.getenv('QR_RENDER_TIMEOUT', 10))
+    # Firma HMAC de los QR (por defecto SECRET_KEY); true = rechazar los QR antiguos sin firma
+    QR_SIGNING_KEY = os.getenv('QR_SIGNING_KEY')
+    QR_REQUIRE_SIGNATURE = os.getenv('QR_REQUIRE_SIGNATURE', 'false').lower() == 'true'
+    # Índice de pases en memoria para decode-qr: antigüedad máxima y recarga completa (s)
+    PASS_INDEX_ENABLED = os.getenv('PASS_INDEX_ENABLED', 'true').lower() == 'true'
+    PASS_INDEX_MAX_STALENESS = float(os.getenv('PASS_INDEX_MAX_STALENESS', 5))
+    PASS_INDEX_FULL_RELOAD = float(os.getenv('PASS_INDEX_FULL_RELOAD', 600))
+    # Barrido de pases vencidos (visitors.expires_at) a status 'expired'
+    PASS_SWEEP_ENABLED = os.getenv('PASS_SWEEP_ENABLED', 'true').lower() == 'true'
+    PASS_SWEEP_INTERVAL = float(os.getenv('PASS_SWEEP_INTERVAL', 60))
+    PASS_SWEEP_BATCH = int(os.getenv('PASS_SWEEP_BATCH', 500))
+    # Tablas/columnas opcionales que aún no existen: cada cuánto se vuelve a comprobar (s)
+    SCHEMA_RECHECK_SECONDS = float(os.getenv('SCHEMA_RECHECK_SECONDS', 30))
+    # Sesiones con token: duración (s) y caché de principals (id, role, fraccionamiento_id, name)
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 12 * 3600))
+    PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', 60))
+    PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', 4096))
+    # Caché de perfiles por id y email; los ids/emails inexistentes se guardan con un TTL menor
+    PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', 120))
+    PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 2048))
+    PROFILE_CACHE_NEGATIVE_TTL = float(os.getenv('PROFILE_CACHE_NEGATIVE_TTL', 30))
+    # Tabla fraccionamientos en memoria: cada cuántos segundos se compara su CHECKSUM
+    FRACCIONAMIENTOS_CHECK_INTERVAL = float(os.getenv('FRACCIONAMIENTOS_CHECK_INTERVAL', 30))
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '').split(',')
 
 config = {
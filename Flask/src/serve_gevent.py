@@ -0,0 +1,23 @@
+"""
+Servidor gevent para producción y canales SSE
+
+Cada cliente SSE inactivo es solo un greenlet esperando en su cola, por lo que un
+proceso puede mantener miles de suscriptores abiertos.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import os
+
+# El conector MySQL en C bloquea el hub de gevent; usar la implementación en Python
+os.environ.setdefault('MYSQL_USE_PURE', 'true')
+
+from gevent.pywsgi import WSGIServer
+from app import app, pagina_no_encontrada
+
+if __name__ == '__main__':
+    app.register_error_handler(404, pagina_no_encontrada)
+    host = os.getenv('HOST', '0.0.0.0')
+    port = int(os.getenv('PORT', 5000))
+    print(f"AICP API (gevent) escuchando en http://{host}:{port}")
+    WSGIServer((host, port), app).serve_forever()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de la app se importan como utils.*, routes.*, etc. desde Flask/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
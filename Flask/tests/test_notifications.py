@@ -0,0 +1,103 @@
+"""
+Roster y canal de las alertas de emergencia (utils/notifications.py)
+"""
+import pytest
+
+from utils import notifications
+
+
+class FakeCursor:
+    """Answers the roster queries from {fraccionamiento_id: [guard ids]}"""
+
+    def __init__(self, guards_by_fraccionamiento):
+        self.guards_by_fraccionamiento = guards_by_fraccionamiento
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        if params:
+            ids = self.guards_by_fraccionamiento.get(params[0], [])
+        else:
+            ids = sorted(i for ids in self.guards_by_fraccionamiento.values() for i in ids)
+        self.rows = [{'id': guard_id} for guard_id in ids]
+
+    def fetchall(self):
+        return self.rows
+
+
+@pytest.fixture(autouse=True)
+def empty_roster_cache():
+    notifications.invalidate_guard_roster()
+    yield
+    notifications.invalidate_guard_roster()
+
+
+def test_alert_goes_to_the_fraccionamiento_channel():
+    cursor = FakeCursor({1: [10, 11], 2: [20]})
+
+    guards, channel = notifications.get_alert_recipients(cursor, 1)
+
+    assert guards == (10, 11)
+    assert channel == 'alerts:fraccionamiento:1'
+
+
+def test_fraccionamiento_without_guards_alerts_every_console():
+    cursor = FakeCursor({1: [], 2: [20], 3: [30]})
+
+    guards, channel = notifications.get_alert_recipients(cursor, 1)
+
+    # Se notifica al roster completo, así que el evento debe llegar a sus consolas
+    assert guards == (20, 30)
+    assert channel == notifications.ALL_GUARDS_CHANNEL
+    for guard_fraccionamiento in (2, 3):
+        console_channels = {notifications.ALL_GUARDS_CHANNEL, notifications.alert_channel(guard_fraccionamiento)}
+        assert channel in console_channels
+
+
+def test_resident_without_fraccionamiento_alerts_every_console():
+    cursor = FakeCursor({2: [20]})
+
+    guards, channel = notifications.get_alert_recipients(cursor, None)
+
+    assert guards == (20,)
+    assert channel == notifications.ALL_GUARDS_CHANNEL
+
+
+class InsertCursor:
+    """Multi-row INSERT whose auto-increment ids are not consecutive (innodb_autoinc_lock_mode = 2)"""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.inserted = []
+        self.lastrowid = None
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        if sql.startswith('INSERT'):
+            values = [tuple(params[i:i + 3]) for i in range(0, len(params), 3)]
+            self.inserted = [(row_id,) + row for row_id, row in zip(self.ids, values)]
+            self.lastrowid = self.ids[0]
+        else:
+            first_id, title, message, *user_ids = params
+            self.rows = [
+                {'id': row_id, 'user_id': user_id}
+                for row_id, user_id, row_title, row_message in sorted(self.inserted)
+                if row_id >= first_id and row_title == title and row_message == message and user_id in user_ids
+            ]
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_insert_notifications_reads_back_non_consecutive_ids():
+    # Otra transacción tomó los ids 101 y 103 entre las filas de este INSERT
+    cursor = InsertCursor([100, 102, 104])
+
+    ids = notifications.insert_notifications(cursor, (20, 30, 40), 'Alerta', 'Mensaje')
+
+    assert ids == {20: 100, 30: 102, 40: 104}
+
+
+def test_insert_single_notification_uses_lastrowid():
+    cursor = InsertCursor([7])
+
+    assert notifications.insert_notifications(cursor, [20], 'Alerta', 'Mensaje') == {20: 7}
@@ -0,0 +1,55 @@
+"""
+Resident address resolution from pending_registrations
+"""
+
+
+def format_address(street, house_number):
+    """Join street and house number as 'street, number' (None if both are empty)"""
+    address_parts = []
+    if street:
+        address_parts.append(street)
+    if house_number:
+        address_parts.append(house_number)
+    return ', '.join(address_parts) if address_parts else None
+
+
+ADDRESSES_SQL = """SELECT email, street, house_number
+    FROM pending_registrations
+    WHERE email IN ({placeholders})
+    ORDER BY email, (status = 'approved') DESC, created_at DESC"""
+
+
+def resolve_addresses(cursor, emails):
+    """Resolve the address of many residents in a single query.
+
+    Returns {email: {'street', 'house_number', 'address'}} for every email with a
+    registration. The latest approved registration wins; otherwise the latest one of any status.
+    """
+    unique_emails = list({email for email in emails if email})
+    if not unique_emails:
+        return {}
+
+    placeholders = ', '.join(['%s'] * len(unique_emails))
+    cursor.execute(ADDRESSES_SQL.format(placeholders=placeholders), unique_emails)
+
+    # La comparación de emails en MySQL no distingue mayúsculas, así que indexamos en minúsculas
+    by_email = {}
+    for row in cursor.fetchall():
+        # Las filas llegan ordenadas por prioridad: la primera de cada email es la buena
+        key = row['email'].lower()
+        if key in by_email:
+            continue
+        by_email[key] = {
+            'street': row.get('street'),
+            'house_number': row.get('house_number'),
+            'address': format_address(row.get('street'), row.get('house_number'))
+        }
+
+    return {email: by_email[email.lower()] for email in unique_emails if email.lower() in by_email}
+
+
+def resolve_address(cursor, email):
+    """Resolve the address of a single resident (None if there is no registration)"""
+    if not email:
+        return None
+    return resolve_addresses(cursor, [email]).get(email)
@@ -0,0 +1,173 @@
+"""
+Publish/subscribe broker for push channels (SSE)
+
+El backend local reparte eventos entre los suscriptores del mismo proceso. Para
+varios workers, el backend redis publica en Redis y cada proceso reenvía a sus
+suscriptores locales con un único listener.
+"""
+import json
+import queue
+import threading
+
+
+class Subscription:
+    """Bounded event queue attached to one or more channels"""
+
+    def __init__(self, broker, channels, max_queue=100):
+        self._broker = broker
+        self.channels = tuple(channels)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.closed = False
+
+    def _deliver(self, channel, event):
+        try:
+            self._queue.put_nowait((channel, event))
+        except queue.Full:
+            # Suscriptor lento: descartar en lugar de bloquear al publicador
+            self.dropped += 1
+
+    def get(self, timeout=None):
+        """Next (channel, event) or None if nothing arrived before the timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LocalBroker:
+    """In-process broker: publish() fans out to subscribers of this worker"""
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._channels = {}  # canal -> set(Subscription)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels, self.max_queue)
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def publish(self, channel, event):
+        """Deliver an event to every local subscriber of the channel; returns how many got it"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription._deliver(channel, event)
+        self.published += 1
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    def stats(self):
+        with self._lock:
+            subscriptions = {s for subs in self._channels.values() for s in subs}
+            return {
+                'backend': 'local',
+                'channels': len(self._channels),
+                'subscribers': len(subscriptions),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': sum(s.dropped for s in subscriptions)
+            }
+
+
+class RedisBroker(LocalBroker):
+    """Multi-worker broker: publishes through Redis, one listener per process feeds local subscribers"""
+
+    def __init__(self, url, prefix='aicp:', max_queue=100):
+        super().__init__(max_queue)
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('BROKER_BACKEND=redis requiere el paquete redis (pip install redis)') from e
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._listener = threading.Thread(target=self._listen, name='broker-redis-listener', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f'{self.prefix}*')
+        for message in pubsub.listen():
+            channel = message['channel'].decode('utf-8')[len(self.prefix):]
+            try:
+                event = json.loads(message['data'])
+            except (ValueError, TypeError):
+                continue
+            LocalBroker.publish(self, channel, event)
+
+    def publish(self, channel, event):
+        return self._redis.publish(f'{self.prefix}{channel}', json.dumps(event, default=str))
+
+    def stats(self):
+        stats = super().stats()
+        stats['backend'] = 'redis'
+        return stats
+
+
+_backends = {
+    'local': lambda app: LocalBroker(max_queue=app.config.get('BROKER_QUEUE_SIZE', 100)),
+    'redis': lambda app: RedisBroker(
+        app.config['BROKER_REDIS_URL'],
+        prefix=app.config.get('BROKER_REDIS_PREFIX', 'aicp:'),
+        max_queue=app.config.get('BROKER_QUEUE_SIZE', 100)
+    ),
+}
+
+_broker = None
+
+
+def register_backend(name, factory):
+    """Register a broker backend: factory(app) -> broker"""
+    _backends[name] = factory
+
+
+def init_app(app):
+    """Create the broker selected by BROKER_BACKEND"""
+    global _broker
+    backend = app.config.get('BROKER_BACKEND', 'local')
+    if backend not in _backends:
+        raise ValueError(f'BROKER_BACKEND desconocido: {backend}')
+    _broker = _backends[backend](app)
+    app.extensions['broker'] = _broker
+    return _broker
+
+
+def get_broker():
+    """Return the shared broker (None until init_app has run)"""
+    return _broker
+
+
+def publish(channel, event):
+    """Publish on the shared broker; failures never break the caller"""
+    if _broker is None:
+        return 0
+    try:
+        return _broker.publish(channel, event)
+    except Exception as e:
+        print(f"Error publicando evento en {channel}: {e}")
+        return 0
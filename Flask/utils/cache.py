@@ -0,0 +1,105 @@
+"""
+In-process read-through caches (TTL + LRU) con contadores de aciertos
+
+La invalidación es local al proceso; el TTL acota cuánto puede tardar otro worker
+en ver un cambio.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being stored"""
+
+    def __init__(self, name, maxsize=128, ttl=60):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._generation = 0  # Aumenta en cada invalidación
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Return the cached value or call loader() and cache its result"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = loader()
+            # Si hubo una invalidación durante la carga, el valor puede ser anterior a la escritura
+            if generation == self._generation:
+                self.set(key, value, ttl)
+        return value
+
+    @property
+    def generation(self):
+        """Changes on every invalidation; compare before/after a load to discard stale values"""
+        return self._generation
+
+    def invalidate(self, key=_MISSING):
+        """Drop one key, or every entry if no key is given"""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+_caches = {}
+
+
+def create_cache(name, maxsize=128, ttl=60):
+    """Create (or return the existing) named cache so its stats are reported together"""
+    if name not in _caches:
+        _caches[name] = TTLCache(name, maxsize, ttl)
+    return _caches[name]
+
+
+def get_cache_stats():
+    """Statistics of every named cache"""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,175 @@
+"""
+Chat conversation queries - una sola consulta por lectura de conversación
+"""
+from utils import profile_cache
+
+# Estructura de chat_messages: la antigua solo tiene (user_id, chat_type); la nueva
+# agrega sender_id/receiver_id. Se detecta una vez por proceso.
+_direct_columns = None
+
+
+def has_direct_columns(cursor):
+    """True if chat_messages has the sender_id/receiver_id columns (cached per process)"""
+    global _direct_columns
+    if _direct_columns is None:
+        cursor.execute(
+            """SELECT COUNT(*) AS n FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = 'chat_messages'
+                 AND column_name IN ('sender_id', 'receiver_id')"""
+        )
+        _direct_columns = cursor.fetchone()['n'] == 2
+    return _direct_columns
+
+
+def chat_type_for_role(role):
+    """Tab (chat_type) that corresponds to an admin/guard role"""
+    return 'administration' if role == 'admin' else 'security' if role == 'guard' else None
+
+
+def role_for_chat_type(chat_type):
+    """Role that answers on a given tab (chat_type)"""
+    return 'admin' if chat_type == 'administration' else 'guard' if chat_type == 'security' else None
+
+
+def conversation_id_query(sender_id=None, receiver_id=None, chat_type=None, user_id=None, direct=True,
+                          after_id=None, before_id=None, since=None, sender_role=None):
+    """Build the UNION of message ids that make up a conversation.
+
+    Modes (same precedence as GET /api/chat/messages):
+    - sender_id + receiver_id: 1 a 1 admin/guard <-> residente
+    - chat_type + user_id: tab del residente
+    - user_id: todos los mensajes de un usuario
+    after_id / since limitan a mensajes nuevos y before_id a mensajes anteriores; se aplican
+    dentro de cada rama para que el índice acote el rango.
+    Returns (sql, params) or (None, []) if no mode applies.
+    """
+    branches = []
+
+    if sender_id and receiver_id:
+        if direct:
+            branches.append(("m.sender_id = %s AND m.receiver_id = %s", [sender_id, receiver_id], ''))
+            branches.append(("m.sender_id = %s AND m.receiver_id = %s", [receiver_id, sender_id], ''))
+        # Mensajes del residente en estructura antigua, solo del tab que corresponde al rol del sender
+        # (si el sender no es admin/guard, todos los tabs)
+        if sender_role is not None:
+            # Rol ya conocido (principal de la sesión): sin subconsulta a profiles
+            tab = chat_type_for_role(sender_role)
+            if tab:
+                branches.append(("m.user_id = %s AND m.chat_type = %s", [receiver_id, tab], ''))
+            else:
+                branches.append(("m.user_id = %s", [receiver_id], ''))
+        else:
+            role_tab = """(SELECT CASE role WHEN 'admin' THEN 'administration' WHEN 'guard' THEN 'security' END
+                           FROM profiles WHERE id = %s)"""
+            branches.append((
+                f"m.user_id = %s AND ({role_tab} IS NULL OR m.chat_type = {role_tab})",
+                [receiver_id, sender_id, sender_id],
+                ''
+            ))
+    elif chat_type and user_id:
+        branches.append(("m.chat_type = %s AND m.user_id = %s", [chat_type, user_id], ''))
+        if direct:
+            # Mensajes dirigidos al residente en este tab
+            branches.append((
+                "m.receiver_id = %s AND (m.chat_type = %s OR m.chat_type IS NULL)",
+                [user_id, chat_type],
+                ''
+            ))
+            # Mensajes del admin/guard del tab dirigidos al residente
+            target_role = role_for_chat_type(chat_type)
+            if target_role:
+                branches.append((
+                    "m.receiver_id = %s AND s.role = %s",
+                    [user_id, target_role],
+                    ' JOIN profiles s ON m.sender_id = s.id'
+                ))
+            # Mensajes enviados por el residente en estructura nueva
+            branches.append(("m.sender_id = %s", [user_id], ''))
+    elif user_id:
+        if direct:
+            branches.append(("m.sender_id = %s", [user_id], ''))
+            branches.append(("m.receiver_id = %s", [user_id], ''))
+        else:
+            branches.append(("m.user_id = %s", [user_id], ''))
+
+    if not branches:
+        return None, []
+
+    # Filtros de rango comunes a todas las ramas
+    range_sql = ''
+    range_params = []
+    if after_id is not None:
+        range_sql += " AND m.id > %s"
+        range_params.append(after_id)
+    if before_id is not None:
+        range_sql += " AND m.id < %s"
+        range_params.append(before_id)
+    if since is not None:
+        range_sql += " AND m.created_at > %s"
+        range_params.append(since)
+
+    sql_parts = []
+    params = []
+    for where_sql, branch_params, join_sql in branches:
+        sql_parts.append(f"SELECT m.id FROM chat_messages m{join_sql} WHERE {where_sql}{range_sql}")
+        params.extend(branch_params)
+        params.extend(range_params)
+    # UNION (no ALL) elimina los ids repetidos entre ramas
+    return '\n UNION \n'.join(sql_parts), params
+
+
+def conversation_query(ids_sql, params, limit=None, newest=True):
+    """Messages of a conversation from its id UNION.
+
+    Con `limit` se toman los `limit` más recientes (newest, en orden descendente) o los
+    `limit` más antiguos (avance hacia adelante, en orden ascendente).
+    """
+    order = 'DESC' if limit and newest else 'ASC'
+    query = f"""
+        SELECT cm.*
+        FROM ({ids_sql}) conversation
+        JOIN chat_messages cm ON cm.id = conversation.id
+        ORDER BY cm.created_at {order}, cm.id {order}
+    """
+    if limit:
+        query += " LIMIT %s"
+        params = params + [limit]
+    return query, params
+
+
+def is_backward(after_id=None, before_id=None, since=None):
+    """True for a history page (before_id or no cursor), False for forward polling (after_id / since)"""
+    return before_id is not None or (after_id is None and since is None)
+
+
+def fetch_conversation(cursor, sender_id=None, receiver_id=None, chat_type=None, user_id=None,
+                       after_id=None, before_id=None, since=None, limit=None, sender_role=None):
+    """Fetch a conversation in one round trip, deduplicated and ordered by (created_at, id).
+
+    Con `limit` y before_id (o sin cursor) se devuelven los `limit` mensajes más recientes
+    del rango, para paginar hacia atrás; con after_id / since, los `limit` siguientes al
+    cursor, para que el polling no se salte mensajes. Siempre en orden ascendente.
+    `sender_role` (si ya se conoce) evita buscar el rol del sender en profiles.
+    """
+    direct = has_direct_columns(cursor)
+    ids_sql, params = conversation_id_query(
+        sender_id, receiver_id, chat_type, user_id, direct,
+        after_id=after_id, before_id=before_id, since=since, sender_role=sender_role
+    )
+    if not ids_sql:
+        return []
+
+    newest = is_backward(after_id, before_id, since)
+    cursor.execute(*conversation_query(ids_sql, params, limit, newest))
+    messages = cursor.fetchall()
+    if limit and newest:
+        messages.reverse()
+
+    # Nombres de los remitentes desde la caché de perfiles (pocos por conversación)
+    # El remitente es sender_id en la estructura nueva y user_id en la antigua
+    senders = profile_cache.get_many({message.get('sender_id') or message.get('user_id') for message in messages}, cursor)
+    for message in messages:
+        sender = senders.get(profile_cache.normalize_id(message.get('sender_id') or message.get('user_id')))
+        message['sender_name'] = sender.get('name') if sender else None
+        message['sender_username'] = sender.get('user_name') if sender else None
+    return messages
@@ -0,0 +1,81 @@
+"""
+Response compression (gzip / brotli) negociada con Accept-Encoding
+"""
+import gzip
+from functools import wraps
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+DEFAULT_MIMETYPES = ('application/json', 'text/csv', 'text/plain', 'text/html', 'application/x-ndjson')
+
+
+def no_compress(view):
+    """Opt a route out of response compression"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return view(*args, **kwargs)
+    wrapper.no_compress = True
+    return wrapper
+
+
+def available_encodings():
+    """Encodings this process can produce, in order of preference"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # mtime=0: misma entrada -> mismos bytes (y cachés intermedias estables)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def init_app(app):
+    """Register the after_request hook that compresses eligible responses"""
+    settings = {
+        'enabled': app.config.get('COMPRESS_ENABLED', True),
+        'min_size': app.config.get('COMPRESS_MIN_SIZE', 1024),
+        'levels': {
+            'gzip': app.config.get('COMPRESS_LEVEL', 6),
+            'br': app.config.get('COMPRESS_BR_LEVEL', 4)
+        },
+        'mimetypes': set(app.config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES))
+    }
+
+    @app.after_request
+    def compress_response(response):
+        if not settings['enabled']:
+            return response
+        # Cualquier respuesta que dependa de Accept-Encoding debe declararlo para las cachés
+        if response.mimetype in settings['mimetypes']:
+            response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in settings['mimetypes']):
+            return response
+        view = app.view_functions.get(request.endpoint)
+        if view is not None and getattr(view, 'no_compress', False):
+            return response
+        if (response.content_length or 0) < settings['min_size']:
+            return response
+
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if not encoding or request.accept_encodings[encoding] <= 0:
+            return response
+
+        data = compress(response.get_data(), encoding, settings['levels'][encoding])
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        # Un ETag fuerte identifica bytes exactos: la versión comprimida lleva su propio ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+        return response
+
+    app.extensions['compression'] = settings
+    return settings
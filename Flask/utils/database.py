@@ -1,25 +1,259 @@
 """
-Database utility functions
+Database utility functions - Pool compartido de conexiones MySQL
 """
-from flask import current_app
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context
 import mysql.connector
 from mysql.connector import Error
 
+
+class PoolTimeoutError(Error):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+class PooledConnection:
+    """Wrapper around a MySQL connection that returns it to the pool on close()"""
+
+    def __init__(self, pool, raw_connection, created_at):
+        self._pool = pool
+        self._raw = raw_connection
+        self._created_at = created_at
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        """Return the connection to the pool (idempotent)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._raw, self._created_at)
+
+
+class ConnectionPool:
+    """Thread-safe MySQL connection pool with overflow, checkout timeout and validation"""
+
+    def __init__(self, connect_args, pool_size=10, max_overflow=10, timeout=5.0,
+                 recycle=1800, pre_ping=True):
+        self.connect_args = dict(connect_args)
+        self.pool_size = max(1, int(pool_size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.timeout = float(timeout)
+        self.recycle = int(recycle)
+        self.pre_ping = bool(pre_ping)
+
+        self._idle = []  # [(raw_connection, created_at)]
+        self._total = 0  # Conexiones abiertas (en uso + libres)
+        self._cond = threading.Condition()
+
+        # Estadísticas
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._peak_in_use = 0
+
+    @property
+    def max_connections(self):
+        return self.pool_size + self.max_overflow
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.connect_args)
+        self._created += 1
+        return raw, time.monotonic()
+
+    def _is_usable(self, raw, created_at):
+        """Check age and liveness of an idle connection before handing it out"""
+        if self.recycle > 0 and time.monotonic() - created_at > self.recycle:
+            return False
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, raw):
+        self._discarded += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Check out a connection, waiting up to `timeout` seconds if the pool is saturated"""
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._total < self.max_connections:
+                    # Reservar el hueco antes de conectar fuera del lock
+                    self._total += 1
+                    raw = None
+                    break
+                waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        msg=f'Pool de conexiones agotado ({self.max_connections} en uso) tras {self.timeout}s'
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            if raw is not None and not self._is_usable(raw, created_at):
+                with self._cond:
+                    self._discard(raw)
+                raw = None
+            if raw is None:
+                raw, created_at = self._connect()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time_total += elapsed
+                self._wait_time_max = max(self._wait_time_max, elapsed)
+            in_use = self._total - len(self._idle)
+            self._peak_in_use = max(self._peak_in_use, in_use)
+
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at):
+        # Terminar cualquier transacción abierta para no filtrar snapshots ni locks al siguiente uso
+        healthy = True
+        try:
+            raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            if healthy and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+            else:
+                # Conexión de overflow o rota: cerrarla en lugar de devolverla
+                self._discard(raw)
+                self._total -= 1
+            self._cond.notify()
+
+    def dispose(self):
+        """Close every idle connection"""
+        with self._cond:
+            while self._idle:
+                raw, _ = self._idle.pop()
+                self._discard(raw)
+                self._total -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        """Snapshot of pool saturation and wait-time statistics"""
+        with self._cond:
+            in_use = self._total - len(self._idle)
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'timeout': self.timeout,
+                'open': self._total,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'overflow_in_use': max(0, self._total - self.pool_size),
+                'peak_in_use': self._peak_in_use,
+                'saturation': round(in_use / self.max_connections, 4),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_avg_ms': round(self._wait_time_total / self._waits * 1000, 3) if self._waits else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'connections_created': self._created,
+                'connections_discarded': self._discarded
+            }
+
+
+_pool = None
+
+
+def init_app(app):
+    """Create the shared pool from the app config and bind connections to the request lifecycle"""
+    global _pool
+    _pool = ConnectionPool(
+        connect_args={
+            'host': app.config['MYSQL_HOST'],
+            'user': app.config['MYSQL_USER'],
+            'password': app.config['MYSQL_PASSWORD'],
+            'database': app.config['MYSQL_DATABASE'],
+            'port': app.config.get('MYSQL_PORT', 3306),
+            'use_pure': app.config.get('MYSQL_USE_PURE', False),
+            'consume_results': True
+        },
+        pool_size=app.config.get('DB_POOL_SIZE', 10),
+        max_overflow=app.config.get('DB_POOL_MAX_OVERFLOW', 10),
+        timeout=app.config.get('DB_POOL_TIMEOUT', 5.0),
+        recycle=app.config.get('DB_POOL_RECYCLE', 1800),
+        pre_ping=app.config.get('DB_POOL_PRE_PING', True)
+    )
+    app.extensions['db_pool'] = _pool
+    app.teardown_appcontext(release_request_connections)
+    return _pool
+
+
+def get_pool():
+    """Return the shared pool (None until init_app has run)"""
+    return _pool
+
+
 def get_connection():
-    """Get MySQL database connection"""
+    """Get MySQL database connection from the shared pool"""
     try:
-        # Importar app para acceder a la configuración
-        from src.app import app
-        
-        connection = mysql.connector.connect(
-            host=app.config['MYSQL_HOST'],
-            user=app.config['MYSQL_USER'],
-            password=app.config['MYSQL_PASSWORD'],
-            database=app.config['MYSQL_DATABASE'],
-            port=app.config.get('MYSQL_PORT', 3306)
-        )
+        if _pool is None:
+            raise Error(msg='El pool de conexiones no ha sido inicializado')
+        connection = _pool.acquire()
+        # Registrar la conexión en el contexto para devolverla al pool al terminar la petición
+        if has_app_context():
+            g.setdefault('_db_connections', []).append(connection)
         return connection
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
+
+@contextmanager
+def connection():
+    """Short-lived connection outside the request scope (streams, background tasks).
+
+    La conexión vuelve al pool al salir del bloque; úsese en generadores de larga duración
+    para no retener conexiones entre eventos.
+    """
+    if _pool is None:
+        raise Error(msg='El pool de conexiones no ha sido inicializado')
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def release_request_connections(exception=None):
+    """Return to the pool every connection the request left checked out"""
+    connections = g.pop('_db_connections', [])
+    for connection in connections:
+        connection.close()
+
+
+def get_pool_stats():
+    """Pool statistics, or None if the pool is not initialized"""
+    return _pool.stats() if _pool is not None else None
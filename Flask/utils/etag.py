@@ -0,0 +1,45 @@
+"""
+Conditional GET helpers (ETag / If-None-Match)
+"""
+import hashlib
+import json
+from flask import Response, request
+
+
+def compute_etag(*parts):
+    """Strong ETag value for the given row versions or payload (same input -> same tag in every worker)"""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+# Sufijos que utils/compression.py agrega al ETag de las respuestas comprimidas
+ENCODING_SUFFIXES = ('-gzip', '-br')
+
+
+def matching_etag(etag):
+    """The variant of this ETag named by If-None-Match (plain or with an encoding suffix), or None"""
+    if etag is None:
+        return None
+    if_none_match = request.if_none_match
+    for candidate in (etag,) + tuple(etag + suffix for suffix in ENCODING_SUFFIXES):
+        if if_none_match.contains_weak(candidate):
+            return candidate
+    return None
+
+
+def is_not_modified(etag):
+    """True if the request's If-None-Match already names this ETag (in any content encoding)"""
+    return matching_etag(etag) is not None
+
+
+def tag_response(response, etag, cache_control='no-cache'):
+    """Attach the ETag; no-cache makes clients revalidate on every poll instead of guessing freshness"""
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def not_modified(etag, cache_control='no-cache'):
+    """Empty 304 response for a matching If-None-Match, echoing the variant the client sent"""
+    return tag_response(Response(status=304), matching_etag(etag) or etag, cache_control)
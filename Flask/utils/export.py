@@ -0,0 +1,140 @@
+"""
+Streaming exports (NDJSON / CSV) con cursor sin buffer y memoria acotada
+"""
+import csv
+import io
+from datetime import date, datetime, timedelta
+
+from utils.json_provider import dumps_bytes, format_timedelta
+
+# dataset -> consulta base, columna de fecha para el rango y expresión del fraccionamiento
+EXPORTS = {
+    'house_access': {
+        'sql': "SELECT ha.* FROM house_access ha",
+        'date_column': 'ha.created_at',
+        'fraccionamiento_column': 'ha.fraccionamiento_id',
+        'order_by': 'ha.created_at ASC, ha.id ASC'
+    },
+    'visitors': {
+        # visitors no tiene fraccionamiento: se toma el del residente que lo registró
+        'sql': """SELECT v.*, p.email AS resident_email, p.fraccionamiento_id AS resident_fraccionamiento_id
+                  FROM visitors v
+                  LEFT JOIN profiles p ON v.created_by = p.id""",
+        'date_column': 'v.created_at',
+        'fraccionamiento_column': 'p.fraccionamiento_id',
+        'order_by': 'v.created_at ASC, v.id ASC'
+    },
+    'incidents': {
+        'sql': "SELECT i.* FROM incidents i",
+        'date_column': 'i.reported_at',
+        'fraccionamiento_column': 'i.fraccionamiento_id',
+        'order_by': 'i.reported_at ASC, i.id ASC'
+    }
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def _parse_date(value, name, end=False):
+    """YYYY-MM-DD or ISO datetime; a bare end date includes the whole day"""
+    try:
+        if len(value) == 10:
+            parsed = datetime.strptime(value, '%Y-%m-%d')
+            return parsed + timedelta(days=1) if end else parsed
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f'{name} debe tener formato YYYY-MM-DD o ISO 8601: {value}')
+
+
+def parse_filters(args):
+    """start_date / end_date / fraccionamiento_id from the query string (ValueError if invalid)"""
+    filters = {}
+    if args.get('start_date'):
+        filters['start'] = _parse_date(args['start_date'], 'start_date')
+    if args.get('end_date'):
+        filters['end'] = _parse_date(args['end_date'], 'end_date', end=True)
+    if args.get('fraccionamiento_id'):
+        try:
+            filters['fraccionamiento_id'] = int(args['fraccionamiento_id'])
+        except ValueError:
+            raise ValueError(f"fraccionamiento_id debe ser numérico: {args['fraccionamiento_id']}")
+    if 'start' in filters and 'end' in filters and filters['start'] >= filters['end']:
+        raise ValueError('start_date debe ser anterior a end_date')
+    return filters
+
+
+def build_query(dataset, filters):
+    """(sql, params) for a dataset with the given filters; ordered so the date indexes apply"""
+    spec = EXPORTS[dataset]
+    conditions = []
+    params = []
+    if 'start' in filters:
+        conditions.append(f"{spec['date_column']} >= %s")
+        params.append(filters['start'])
+    if 'end' in filters:
+        conditions.append(f"{spec['date_column']} < %s")
+        params.append(filters['end'])
+    if 'fraccionamiento_id' in filters:
+        conditions.append(f"{spec['fraccionamiento_column']} = %s")
+        params.append(filters['fraccionamiento_id'])
+    sql = spec['sql']
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {spec['order_by']}"
+    return sql, params
+
+
+def iter_batches(cursor, batch_size):
+    """Yield lists of rows from an unbuffered cursor; only one batch is in memory at a time"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, timedelta):
+        return format_timedelta(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield b''.join(dumps_bytes(dict(zip(columns, row))) + b'\n' for row in rows)
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM para que Excel abra el archivo como UTF-8 (acentos y ñ)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Solo encabezados (sin filas)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def export_filename(dataset, filters, fmt):
+    parts = [dataset]
+    if 'fraccionamiento_id' in filters:
+        parts.append(f"fracc{filters['fraccionamiento_id']}")
+    if 'start' in filters:
+        parts.append(filters['start'].strftime('%Y%m%d'))
+    if 'end' in filters:
+        parts.append((filters['end'] - timedelta(seconds=1)).strftime('%Y%m%d'))
+    return '_'.join(parts) + '.' + fmt
@@ -0,0 +1,99 @@
+"""
+Fraccionamientos - la tabla completa en memoria, inmutable, recargada al cambiar su versión
+
+La tabla es pequeña y casi nunca cambia: se carga al arrancar y los JOIN/consultas por
+nombre se vuelven búsquedas en un dict. Cada FRACCIONAMIENTOS_CHECK_INTERVAL segundos
+una petición compara CHECKSUM TABLE con la versión cargada y, si cambió, reemplaza el
+mapa completo (los lectores nunca ven un mapa a medio actualizar).
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from mysql.connector import Error
+
+from utils.database import connection
+
+_EMPTY = MappingProxyType({})
+
+# Snapshot actual: se reemplaza entero, nunca se modifica
+_state = {'version': None, 'rows': _EMPTY, 'checked_at': None, 'reloads': 0}
+_settings = {'check_interval': 30.0}
+_refresh_lock = threading.Lock()
+
+
+def init_app(app):
+    """Load the table once at startup (lazily on first use if the database is unavailable)"""
+    _settings['check_interval'] = float(app.config.get('FRACCIONAMIENTOS_CHECK_INTERVAL', 30))
+    try:
+        refresh(force=True)
+    except Error as e:
+        print(f"No se pudieron cargar los fraccionamientos al arrancar: {e}")
+    app.extensions['fraccionamientos'] = _state
+    return _state
+
+
+def _version(cursor):
+    # Sin la tabla, MySQL responde Checksum NULL (con un warning), no un error
+    cursor.execute("CHECKSUM TABLE fraccionamientos")
+    row = cursor.fetchone()
+    return row['Checksum'] if row else None
+
+
+def _load(cursor):
+    try:
+        cursor.execute("SELECT * FROM fraccionamientos")
+    except Error:
+        return _EMPTY
+    return MappingProxyType({row['id']: MappingProxyType(row) for row in cursor.fetchall()})
+
+
+def refresh(force=False):
+    """Reload the map if its CHECKSUM changed; at most one check per interval and process"""
+    checked_at = _state['checked_at']
+    if not force and checked_at is not None and time.monotonic() - checked_at < _settings['check_interval']:
+        return False
+    # Otra petición ya está comprobando: seguir con el snapshot actual
+    if not _refresh_lock.acquire(blocking=force):
+        return False
+    try:
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                version = _version(cursor)
+                reload = force or version != _state['version']
+                rows = _load(cursor) if reload else None
+            finally:
+                cursor.close()
+        if reload:
+            _state.update(version=version, rows=rows, reloads=_state['reloads'] + 1)
+        return reload
+    finally:
+        # También tras un error: no reintentar en cada petición mientras la BD no responde
+        _state['checked_at'] = time.monotonic()
+        _refresh_lock.release()
+
+
+def get_all():
+    """Read-only {id: row} of every fraccionamiento"""
+    try:
+        refresh()
+    except Error as e:
+        # Sin base de datos se sigue usando el último snapshot
+        print(f"Error comprobando la versión de fraccionamientos: {e}")
+    return _state['rows']
+
+
+def get(fraccionamiento_id):
+    """Read-only row of a fraccionamiento, or None"""
+    try:
+        key = int(fraccionamiento_id)
+    except (TypeError, ValueError):
+        return None
+    return get_all().get(key)
+
+
+def get_name(fraccionamiento_id):
+    """Name of a fraccionamiento, or None (no fraccionamiento, unknown id or no table)"""
+    row = get(fraccionamiento_id)
+    return row.get('name') if row else None
@@ -0,0 +1,183 @@
+"""
+Offline gate sync - snapshot versionado de los pases válidos de un fraccionamiento y deltas
+
+La caseta descarga un snapshot (filas compactas: listas con el orden de `fields`) y luego
+pide solo los cambios con `since=<version>`. La versión es el NOW() de MySQL al inicio de
+la consulta; los borrados se registran en una tabla de tombstones porque no dejan updated_at.
+"""
+import time
+from datetime import datetime, timedelta
+
+from utils.pass_index import (WATERMARK_OVERLAP, ACTIVE_STATUS, changed_resident_ids,
+                              load_resident_passes, load_visitor_passes)
+from utils.pass_expiry import pass_expires_at
+from utils.pass_tokens import end_of_day, to_epoch
+from utils.schema import table_exists
+
+TOMBSTONES_TABLE = 'gate_sync_tombstones'
+
+CREATE_TOMBSTONES_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {TOMBSTONES_TABLE} (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        kind VARCHAR(20) NOT NULL COMMENT 'visitor | resident',
+        pass_id INT NOT NULL,
+        fraccionamiento_id INT NOT NULL DEFAULT 0 COMMENT '0 = sin fraccionamiento',
+        deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_gate_sync_tombstones_fracc_deleted (fraccionamiento_id, deleted_at)
+    )
+"""
+
+# Deltas con un `since` más antiguo que esto deben volver a descargar el snapshot
+TOMBSTONE_RETENTION = timedelta(days=7)
+
+FORMAT_VERSION = 1
+
+PASS_FIELDS = ('id', 'type', 'name', 'resident_id', 'expires_at', 'event_date', 'event_time',
+               'event_location', 'number_of_guests', 'resident_name', 'resident_address')
+RESIDENT_FIELDS = ('id', 'name', 'user_name', 'role', 'street', 'house_number', 'address')
+
+VERSION_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+class ResyncRequired(Exception):
+    """The client's version is too old for a delta; it must download a new snapshot"""
+
+
+def tombstones_enabled(cursor):
+    """True if the tombstone table exists (migration 0009); a missing table is re-checked periodically"""
+    # Sin la tabla, borrar visitantes no debe fallar
+    return table_exists(cursor, TOMBSTONES_TABLE)
+
+
+def parse_version(value):
+    try:
+        return datetime.strptime(value, VERSION_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError(f'since debe ser una versión devuelta por el snapshot: {value}')
+
+
+def pass_expiry(entry):
+    """Epoch seconds after which the pass is no longer valid (0 = no expiry)"""
+    if entry['type'] == 'one-time':
+        return to_epoch(pass_expires_at(entry))
+    if entry['type'] == 'event' and entry['event_date']:
+        return to_epoch(end_of_day(entry['event_date']))
+    return 0
+
+
+def pass_row(entry, expires_at):
+    return [
+        entry['id'], entry['type'], entry['name'], entry['created_by'], expires_at,
+        entry['event_date'], entry['event_time'], entry['event_location'] or '', entry['number_of_guests'],
+        entry['resident_name'], entry['resident_address'] or ''
+    ]
+
+
+def resident_row(entry):
+    return [entry[field] for field in RESIDENT_FIELDS]
+
+
+def _split_passes(visitor_entries, now):
+    """(rows of currently valid passes, ids of passes that are no longer valid)"""
+    rows = []
+    invalid = []
+    for entry in visitor_entries:
+        expires_at = pass_expiry(entry)
+        if entry['status'] != ACTIVE_STATUS or (expires_at and expires_at <= now):
+            invalid.append(entry['id'])
+        else:
+            rows.append(pass_row(entry, expires_at))
+    return rows, invalid
+
+
+def snapshot_payload(version, fraccionamiento_id, visitor_entries, resident_entries, now=None):
+    """Snapshot body from already-loaded pass entries"""
+    passes, _ = _split_passes(visitor_entries, time.time() if now is None else now)
+    return {
+        'format': FORMAT_VERSION,
+        'version': version.strftime(VERSION_FORMAT),
+        'fraccionamiento_id': fraccionamiento_id,
+        'fields': {'passes': PASS_FIELDS, 'residents': RESIDENT_FIELDS},
+        'passes': passes,
+        'residents': [resident_row(entry) for entry in resident_entries]
+    }
+
+
+def _db_now(cursor):
+    cursor.execute("SELECT NOW() AS now")
+    return cursor.fetchone()['now']
+
+
+def build_snapshot(cursor, fraccionamiento_id):
+    """Every currently valid pass and resident of a fraccionamiento"""
+    version = _db_now(cursor)
+    visitors = load_visitor_passes(
+        cursor, "p.fraccionamiento_id = %s AND v.status = %s", (fraccionamiento_id, ACTIVE_STATUS)
+    )
+    residents = load_resident_passes(cursor, "p.fraccionamiento_id = %s", (fraccionamiento_id,))
+    return snapshot_payload(version, fraccionamiento_id, visitors, residents)
+
+
+def build_delta(cursor, fraccionamiento_id, since):
+    """Passes/residents changed since a version, plus ids to drop (ResyncRequired if too old)"""
+    version = _db_now(cursor)
+    # Sin tombstones no se pueden informar los borrados: solo snapshots completos
+    if since < version - TOMBSTONE_RETENTION or not tombstones_enabled(cursor):
+        raise ResyncRequired()
+    since = since - WATERMARK_OVERLAP
+
+    resident_ids = changed_resident_ids(cursor, since)
+    visitors = load_visitor_passes(
+        cursor, "p.fraccionamiento_id = %s AND v.updated_at >= %s", (fraccionamiento_id, since)
+    )
+    residents = []
+    if resident_ids:
+        placeholders = ', '.join(['%s'] * len(resident_ids))
+        params = (fraccionamiento_id, *resident_ids)
+        visitors += load_visitor_passes(
+            cursor, f"p.fraccionamiento_id = %s AND v.created_by IN ({placeholders})", params
+        )
+        residents = load_resident_passes(
+            cursor, f"p.fraccionamiento_id = %s AND p.id IN ({placeholders})", params
+        )
+    # Un visitante puede aparecer dos veces (cambió él y su residente)
+    visitors = list({entry['id']: entry for entry in visitors}.values())
+    passes, removed_passes = _split_passes(visitors, time.time())
+
+    removed_residents = []
+    cursor.execute(
+        f"""SELECT kind, pass_id FROM {TOMBSTONES_TABLE}
+            WHERE fraccionamiento_id = %s AND deleted_at >= %s""",
+        (fraccionamiento_id, since)
+    )
+    for row in cursor.fetchall():
+        (removed_residents if row['kind'] == 'resident' else removed_passes).append(row['pass_id'])
+
+    return {
+        'format': FORMAT_VERSION,
+        'version': version.strftime(VERSION_FORMAT),
+        'since': (since + WATERMARK_OVERLAP).strftime(VERSION_FORMAT),
+        'fraccionamiento_id': fraccionamiento_id,
+        'fields': {'passes': PASS_FIELDS, 'residents': RESIDENT_FIELDS},
+        'passes': passes,
+        'residents': [resident_row(entry) for entry in residents],
+        'removed': {'passes': removed_passes, 'residents': removed_residents}
+    }
+
+
+def record_visitor_deletion(cursor, visitor_id):
+    """Tombstone for a visitor about to be deleted (same transaction as the DELETE)"""
+    if not tombstones_enabled(cursor):
+        return
+    cursor.execute(
+        f"""INSERT INTO {TOMBSTONES_TABLE} (kind, pass_id, fraccionamiento_id)
+            SELECT 'visitor', v.id, COALESCE(p.fraccionamiento_id, 0)
+            FROM visitors v LEFT JOIN profiles p ON v.created_by = p.id
+            WHERE v.id = %s""",
+        (visitor_id,)
+    )
+    # Los tombstones fuera de la retención ya no sirven: ese cliente recibe 410 y un snapshot
+    cursor.execute(
+        f"DELETE FROM {TOMBSTONES_TABLE} WHERE deleted_at < NOW() - INTERVAL %s DAY",
+        (TOMBSTONE_RETENTION.days,)
+    )
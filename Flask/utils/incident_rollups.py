@@ -0,0 +1,135 @@
+"""
+Incident daily rollups - conteos por día x fraccionamiento x tipo x severidad x estado
+
+Se mantienen en la misma transacción que la escritura del incidente, así que los
+dashboards leen series de tiempo sin tocar la tabla incidents.
+"""
+from utils.schema import table_exists
+
+TABLE = 'incident_daily_rollups'
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        day DATE NOT NULL,
+        fraccionamiento_id INT NOT NULL DEFAULT 0 COMMENT '0 = sin fraccionamiento',
+        incident_type VARCHAR(100) NOT NULL,
+        severity VARCHAR(20) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        incident_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, fraccionamiento_id, incident_type, severity, status),
+        INDEX idx_incident_rollups_fracc_day (fraccionamiento_id, day)
+    )
+"""
+
+# Clave de la rollup calculada por MySQL a partir de la fila del incidente
+_KEY_COLUMNS = """DATE(reported_at), COALESCE(fraccionamiento_id, 0), incident_type,
+                  COALESCE(severity, 'medium'), COALESCE(status, 'reported')"""
+
+# Campos de incidents que cambian la clave de la rollup
+KEY_FIELDS = ('incident_type', 'severity', 'status', 'reported_at', 'fraccionamiento_id')
+
+BUCKETS = {
+    'day': 'day',
+    # Semanas que empiezan en lunes
+    'week': 'DATE_SUB(day, INTERVAL WEEKDAY(day) DAY)',
+    'month': 'DATE_SUB(day, INTERVAL DAYOFMONTH(day) - 1 DAY)'
+}
+
+GROUPS = {
+    'type': 'incident_type',
+    'severity': 'severity',
+    'status': 'status'
+}
+
+
+def is_enabled(cursor):
+    """True if the rollup table exists (migration 0007); a missing table is re-checked periodically"""
+    # Sin la tabla, las escrituras de incidentes no deben fallar
+    return table_exists(cursor, TABLE)
+
+
+def apply_incident(cursor, incident_id, delta):
+    """Add `delta` (+1 / -1) to the rollup row of an incident as it is currently stored.
+
+    Llamar con -1 antes de un UPDATE/DELETE y con +1 después de un INSERT/UPDATE,
+    dentro de la misma transacción.
+    """
+    if not is_enabled(cursor):
+        return
+    cursor.execute(
+        f"""INSERT INTO {TABLE} (day, fraccionamiento_id, incident_type, severity, status, incident_count)
+            SELECT {_KEY_COLUMNS}, %s FROM incidents WHERE id = %s AND reported_at IS NOT NULL
+            ON DUPLICATE KEY UPDATE incident_count = incident_count + VALUES(incident_count)""",
+        (delta, incident_id)
+    )
+
+
+def backfill_sql(since=None):
+    """INSERT ... SELECT that recomputes the rollups from incidents (idempotent: overwrites counts)"""
+    where = "WHERE reported_at >= %s" if since else "WHERE reported_at IS NOT NULL"
+    return f"""
+        INSERT INTO {TABLE} (day, fraccionamiento_id, incident_type, severity, status, incident_count)
+        SELECT {_KEY_COLUMNS}, COUNT(*) FROM incidents {where}
+        GROUP BY 1, 2, 3, 4, 5
+        ON DUPLICATE KEY UPDATE incident_count = VALUES(incident_count)
+    """
+
+
+def rebuild(cursor, since=None):
+    """Recompute the rollups from incidents (all days, or from `since` on). Returns rows written."""
+    if since:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE day >= %s", (since,))
+        cursor.execute(backfill_sql(since), (since,))
+    else:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(backfill_sql())
+    return cursor.rowcount
+
+
+def timeseries_query(bucket='day', group_by=None, fraccionamiento_id=None, start_date=None, end_date=None):
+    """(sql, params) for counts per bucket (and group) read only from the rollups"""
+    period = BUCKETS[bucket]
+    group_column = GROUPS[group_by] if group_by else None
+    select = f"{period} AS period" + (f", {group_column} AS `group`" if group_column else '')
+    conditions = []
+    params = []
+    if fraccionamiento_id:
+        conditions.append("fraccionamiento_id = %s")
+        params.append(fraccionamiento_id)
+    if start_date:
+        conditions.append("day >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append("day <= %s")
+        params.append(end_date)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    group = "period" + (", `group`" if group_column else '')
+    sql = f"""
+        SELECT {select}, SUM(incident_count) AS count
+        FROM {TABLE}
+        {where}
+        GROUP BY {group}
+        HAVING count > 0
+        ORDER BY period ASC
+    """
+    return sql, params
+
+
+def build_series(rows, grouped):
+    """[{period, total, breakdown}] from timeseries_query rows"""
+    series = []
+    by_period = {}
+    for row in rows:
+        period = row['period']
+        point = by_period.get(period)
+        if point is None:
+            point = {'period': period, 'total': 0}
+            if grouped:
+                point['breakdown'] = {}
+            by_period[period] = point
+            series.append(point)
+        count = int(row['count'])
+        point['total'] += count
+        if grouped:
+            point['breakdown'][row['group']] = count
+    return series
@@ -0,0 +1,38 @@
+"""
+Incident queries - SQL de los listados y conteos de incidentes (compartido con migrations/explain.py)
+"""
+
+INCIDENT_BY_ID_SQL = "SELECT * FROM incidents WHERE id = %s"
+
+
+def _filter_sql(filters):
+    """AND conditions and params for the optional incident filters (in index order)"""
+    sql = ''
+    params = []
+    for column, op, key in (('status', '=', 'status'), ('incident_type', '=', 'incident_type'),
+                            ('severity', '=', 'severity'), ('fraccionamiento_id', '=', 'fraccionamiento_id'),
+                            ('reported_at', '>=', 'start_date'), ('reported_at', '<=', 'end_date')):
+        if filters.get(key):
+            sql += f" AND {column} {op} %s"
+            params.append(filters[key])
+    return sql, params
+
+
+def incidents_query(**filters):
+    """(sql, params) of GET /api/incidents"""
+    where, params = _filter_sql(filters)
+    return f"SELECT * FROM incidents WHERE 1=1{where} ORDER BY reported_at DESC", params
+
+
+def by_type_query(**filters):
+    """(sql, params) of GET /api/incidents/stats/by-type"""
+    where, params = _filter_sql(filters)
+    return (f"SELECT incident_type, COUNT(*) as count FROM incidents WHERE 1=1{where}"
+            " GROUP BY incident_type ORDER BY count DESC"), params
+
+
+def stats_query(**filters):
+    """(sql, params) of GET /api/incidents/stats: una fila por estado/severidad/tipo"""
+    where, params = _filter_sql(filters)
+    return (f"SELECT status, severity, incident_type, COUNT(*) AS count FROM incidents WHERE 1=1{where}"
+            " GROUP BY status, severity, incident_type"), params
@@ -0,0 +1,94 @@
+"""
+Fast JSON provider - serializa filas de MySQL sin conversiones previas en los handlers
+
+datetime/date/time salen en ISO 8601 y timedelta (columnas TIME) como HH:MM:SS.
+Usa orjson si está instalado y json de la biblioteca estándar en caso contrario.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, timedelta
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+def format_timedelta(value):
+    """HH:MM:SS for a TIME column (mysql-connector returns them as timedelta)"""
+    total_seconds = int(value.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def _default(value):
+    """Types that neither encoder handles natively"""
+    if isinstance(value, timedelta):
+        return format_timedelta(value)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _stdlib_default(value):
+    if isinstance(value, date):  # datetime es subclase de date
+        return value.isoformat()
+    if hasattr(value, 'isoformat'):  # datetime.time
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    return _default(value)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        """Serialize to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj):
+        """Serialize to UTF-8 JSON bytes"""
+        return json.dumps(obj, default=_stdlib_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps(obj):
+    """Serialize to a JSON string"""
+    return dumps_bytes(obj).decode('utf-8')
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson; jsonify() accepts raw database rows"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # Escribir los bytes directamente, sin pasar por str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
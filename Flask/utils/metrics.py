@@ -0,0 +1,52 @@
+"""
+In-process latency metrics (ventana deslizante de muestras)
+"""
+import math
+import threading
+from collections import deque
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return round(values[rank - 1], 3)
+
+
+class LatencyTracker:
+    """Thread-safe recorder of the last `window` samples (ms) with percentile summaries"""
+
+    def __init__(self, window=10000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms):
+        latency_ms = float(latency_ms)
+        with self._lock:
+            self._samples.append(latency_ms)
+            self.count += 1
+            self.max_ms = max(self.max_ms, latency_ms)
+
+    def summary(self):
+        """count, window size and p50/p95/p99/max of the samples in the window"""
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+            max_ms = self.max_ms
+        return {
+            'count': count,
+            'window': len(samples),
+            'p50_ms': percentile(samples, 50),
+            'p95_ms': percentile(samples, 95),
+            'p99_ms': percentile(samples, 99),
+            'max_ms': round(max_ms, 3)
+        }
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self.count = 0
+            self.max_ms = 0.0
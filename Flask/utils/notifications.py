@@ -0,0 +1,94 @@
+"""
+Notification fan-out helpers - roster de guardias en caché e inserción masiva
+"""
+from utils.cache import create_cache
+
+_roster_cache = create_cache('guard_roster', maxsize=256, ttl=300)
+
+ROSTER_SQL = "SELECT id FROM profiles WHERE role IN ('guard', 'admin') ORDER BY id"
+FRACCIONAMIENTO_ROSTER_SQL = (
+    "SELECT id FROM profiles WHERE role IN ('guard', 'admin') AND fraccionamiento_id = %s ORDER BY id"
+)
+USER_NOTIFICATIONS_SQL = "SELECT * FROM notifications WHERE user_id = %s ORDER BY created_at DESC"
+
+# Canales del broker para las alertas de emergencia: uno por fraccionamiento y uno que
+# escuchan todas las consolas (alertas notificadas al roster completo)
+ALL_GUARDS_CHANNEL = 'alerts:guards'
+
+
+def init_app(app):
+    """Apply the roster cache TTL from the app config"""
+    _roster_cache.ttl = float(app.config.get('GUARD_ROSTER_TTL', 300))
+    return _roster_cache
+
+
+def alert_channel(fraccionamiento_id=None):
+    """Broker channel of a fraccionamiento's guard consoles (the all-guards channel if None)"""
+    return ALL_GUARDS_CHANNEL if fraccionamiento_id is None else f'alerts:fraccionamiento:{fraccionamiento_id}'
+
+
+def _roster(cursor, fraccionamiento_id):
+    def load():
+        if fraccionamiento_id is None:
+            cursor.execute(ROSTER_SQL)
+        else:
+            cursor.execute(FRACCIONAMIENTO_ROSTER_SQL, (fraccionamiento_id,))
+        return tuple(row['id'] for row in cursor.fetchall())
+
+    return _roster_cache.get_or_load(fraccionamiento_id, load)
+
+
+def get_alert_recipients(cursor, fraccionamiento_id=None):
+    """(guard ids, broker channel) of an alert from a fraccionamiento, rosters cached.
+
+    Si el fraccionamiento no tiene guardias se usa el roster completo para que la
+    alerta nunca se quede sin destinatarios, y el evento va al canal de todas las consolas.
+    """
+    roster = _roster(cursor, fraccionamiento_id)
+    if not roster and fraccionamiento_id is not None:
+        return _roster(cursor, None), ALL_GUARDS_CHANNEL
+    return roster, alert_channel(fraccionamiento_id)
+
+
+def get_guard_roster(cursor, fraccionamiento_id=None):
+    """Ids of the guards/admins of a fraccionamiento (all of them if None or it has none), cached"""
+    return get_alert_recipients(cursor, fraccionamiento_id)[0]
+
+
+def invalidate_guard_roster():
+    """Call whenever a profile is created, deleted or changes role/fraccionamiento"""
+    _roster_cache.invalidate()
+
+
+# Ids de las filas de un INSERT de varias filas: todas tienen id >= lastrowid, pero con
+# innodb_autoinc_lock_mode = 2 (por defecto en MySQL 8) pueden no ser consecutivos
+INSERTED_IDS_SQL = """SELECT id, user_id FROM notifications
+    WHERE id >= %s AND title = %s AND message = %s AND user_id IN ({placeholders})
+    ORDER BY id"""
+
+
+def insert_notifications(cursor, user_ids, title, message):
+    """Insert the same notification for many users in one multi-row INSERT.
+
+    Returns {user_id: notification_id}. Los ids se leen de vuelta en la misma transacción
+    (no se asume que sean consecutivos); van como id de evento SSE y para Last-Event-ID.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    rows = ', '.join(['(%s, %s, %s, 0)'] * len(user_ids))
+    params = []
+    for user_id in user_ids:
+        params.extend((user_id, title, message))
+    cursor.execute(f"INSERT INTO notifications (user_id, title, message, `read`) VALUES {rows}", params)
+    first_id = cursor.lastrowid
+    if len(user_ids) == 1:
+        return {user_ids[0]: first_id}
+
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    cursor.execute(INSERTED_IDS_SQL.format(placeholders=placeholders), (first_id, title, message, *user_ids))
+    notification_ids = {}
+    for row in cursor.fetchall():
+        # Otra alerta idéntica confirmada a la vez puede aparecer después: se toma la primera fila
+        notification_ids.setdefault(row['user_id'], row['id'])
+    return notification_ids
@@ -0,0 +1,46 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+from datetime import datetime
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor for the (created_at, id) position of a row"""
+    if hasattr(created_at, 'isoformat'):
+        created_at = created_at.isoformat()
+    raw = f"{created_at}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor created by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursorError(f'Cursor de paginación inválido: {cursor}') from e
+
+
+def parse_limit(value, default, maximum):
+    """Parse a `limit` query parameter, clamped to [1, maximum]"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f'limit debe ser un número entero: {value}')
+    return max(1, min(limit, maximum))
+
+
+def keyset_condition(alias, created_at, row_id, descending=True):
+    """SQL condition and params selecting rows after (created_at, id) in the given order"""
+    op = '<' if descending else '>'
+    prefix = f'{alias}.' if alias else ''
+    sql = f"({prefix}created_at {op} %s OR ({prefix}created_at = %s AND {prefix}id {op} %s))"
+    return sql, [created_at, created_at, row_id]
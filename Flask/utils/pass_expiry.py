@@ -0,0 +1,149 @@
+"""
+Pass expiry - expires_at guardado al crear el pase y barrido periódico a status 'expired'
+
+Los visitantes de solo una vez expiran 24 h después de su creación. El sweeper marca los
+vencidos por lotes (índice status + expires_at), así que los listados de activos y la
+validación en la caseta comparan una columna en vez de recalcular fechas por fila.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from utils.database import connection
+from utils.schema import column_exists
+
+ONE_TIME_PASS_TTL = timedelta(hours=24)
+
+ACTIVE_STATUS = 'active'
+EXPIRED_STATUS = 'expired'
+
+# Lotes cortos: cada UPDATE bloquea pocas filas y no frena las escrituras de la app
+SWEEP_SQL = """UPDATE visitors SET status = %s
+    WHERE status = %s AND expires_at <= NOW()
+    LIMIT %s"""
+
+# Pases de solo una vez sin expires_at (escritos por un worker que aún no veía la columna):
+# se completa con created_at + 24 h y el barrido normal los vence
+BACKFILL_SQL = """UPDATE visitors SET expires_at = created_at + INTERVAL %s SECOND
+    WHERE status = %s AND type = 'one-time' AND expires_at IS NULL
+    LIMIT %s"""
+
+
+def one_time_expiry(created_at=None):
+    """expires_at of a one-time pass created at `created_at` (now if None)"""
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00')).replace(tzinfo=None)
+    return (created_at or datetime.now()) + ONE_TIME_PASS_TTL
+
+
+def pass_expires_at(visitor):
+    """Stored expires_at; computed for one-time rows written before migration 0010"""
+    expires_at = visitor.get('expires_at')
+    if expires_at is None and visitor.get('type') == 'one-time':
+        expires_at = one_time_expiry(visitor.get('created_at'))
+    return expires_at
+
+
+def is_expired(visitor, now=None):
+    expires_at = pass_expires_at(visitor)
+    return expires_at is not None and expires_at <= (now or datetime.now())
+
+
+def is_enabled(cursor):
+    """True if visitors.expires_at exists (migration 0010); a missing column is re-checked periodically"""
+    return column_exists(cursor, 'visitors', 'expires_at')
+
+
+def _run_batches(conn, cursor, sql, params, batch_size):
+    total = 0
+    while True:
+        cursor.execute(sql, params + (batch_size,))
+        changed = cursor.rowcount
+        conn.commit()
+        total += changed
+        if changed < batch_size:
+            return total
+
+
+def sweep(conn, batch_size=500):
+    """Mark active passes past expires_at as expired, one committed batch at a time. Returns rows.
+
+    Antes completa expires_at de los pases de solo una vez que quedaron en NULL.
+    """
+    cursor = conn.cursor()
+    try:
+        if not is_enabled(cursor):
+            return 0
+        ttl = int(ONE_TIME_PASS_TTL.total_seconds())
+        _run_batches(conn, cursor, BACKFILL_SQL, (ttl, ACTIVE_STATUS), batch_size)
+        return _run_batches(conn, cursor, SWEEP_SQL, (EXPIRED_STATUS, ACTIVE_STATUS), batch_size)
+    finally:
+        cursor.close()
+
+
+class Sweeper:
+    """Background thread that runs sweep() every `interval` seconds"""
+
+    def __init__(self, interval=60, batch_size=500):
+        self.interval = float(interval)
+        self.batch_size = int(batch_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.swept = 0
+        self.errors = 0
+        self.last_run_at = None
+
+    def run_once(self):
+        with connection() as conn:
+            swept = sweep(conn, self.batch_size)
+        self.runs += 1
+        self.swept += swept
+        self.last_run_at = datetime.now()
+        return swept
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Error en el barrido de pases vencidos: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='pass-expiry-sweeper', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'interval_seconds': self.interval,
+            'batch_size': self.batch_size,
+            'runs': self.runs,
+            'swept': self.swept,
+            'errors': self.errors,
+            'last_run_at': self.last_run_at
+        }
+
+
+_sweeper = None
+
+
+def init_app(app):
+    """Start the sweeper thread (PASS_SWEEP_ENABLED) for this worker"""
+    global _sweeper
+    if not app.config.get('PASS_SWEEP_ENABLED', True):
+        return None
+    _sweeper = Sweeper(
+        interval=app.config.get('PASS_SWEEP_INTERVAL', 60),
+        batch_size=app.config.get('PASS_SWEEP_BATCH', 500)
+    ).start()
+    app.extensions['pass_sweeper'] = _sweeper
+    return _sweeper
+
+
+def get_sweeper():
+    return _sweeper
@@ -0,0 +1,313 @@
+"""
+Per-worker index of active passes para responder los escaneos de la caseta desde memoria
+
+Visitantes activos (visitor / one-time / event) y perfiles de residentes, con nombre y
+dirección del residente ya resueltos. Se actualiza de forma incremental por updated_at
+antes de responder si tiene más de `max_staleness` segundos; un fallo al actualizar o una
+clave ausente hacen que el llamador consulte MySQL como antes.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from utils import fraccionamientos
+from utils.addresses import format_address, resolve_addresses
+from utils.database import connection
+
+# Solapamiento de la marca de agua: TIMESTAMP tiene resolución de 1 s y una transacción
+# puede confirmar filas con updated_at un poco anterior a la última lectura
+WATERMARK_OVERLAP = timedelta(seconds=2)
+
+ACTIVE_STATUS = 'active'
+
+
+def _timestamp(value):
+    """created_at as the decode-qr responses expose it (ISO string or '')"""
+    if value and hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value or ''
+
+
+def _event_location(row):
+    # MySQL puede devolver la columna con distintos nombres según cómo se creó
+    return row.get('eventLocation') or row.get('eventlocation') or row.get('event_location') or None
+
+
+VISITOR_PASSES_SQL = """SELECT v.*, p.name AS resident_name, p.email AS resident_email
+    FROM visitors v
+    LEFT JOIN profiles p ON v.created_by = p.id
+    WHERE {where}"""
+RESIDENT_PASSES_SQL = "SELECT p.* FROM profiles p WHERE {where}"
+PROFILE_CHANGES_SQL = "SELECT id FROM profiles WHERE updated_at >= %s"
+REGISTRATION_CHANGES_SQL = """SELECT p.id FROM pending_registrations r
+    JOIN profiles p ON p.email = r.email
+    WHERE r.updated_at >= %s"""
+
+
+def load_visitor_passes(cursor, where, params=()):
+    """Visitor pass entries matching `where` (on visitors v), with the resident's address resolved"""
+    cursor.execute(VISITOR_PASSES_SQL.format(where=where), tuple(params))
+    rows = cursor.fetchall()
+    addresses = resolve_addresses(cursor, [row.get('resident_email') for row in rows])
+    entries = []
+    for row in rows:
+        resolved = addresses.get(row.get('resident_email')) or {}
+        entries.append({
+            'id': row['id'],
+            'name': row.get('name') or '',
+            'type': row.get('type'),
+            'status': row.get('status'),
+            'created_by': row.get('created_by'),
+            'created_at': row.get('created_at'),
+            'expires_at': row.get('expires_at'),
+            'event_date': row.get('eventDate') or '',
+            'event_time': row.get('eventTime') or '',
+            'number_of_guests': row.get('numberOfGuests') or '',
+            'event_location': _event_location(row),
+            'resident_name': row.get('resident_name') or '',
+            'resident_email': row.get('resident_email'),
+            'resident_street': resolved.get('street'),
+            'resident_house_number': resolved.get('house_number'),
+            'resident_address': resolved.get('address')
+        })
+    return entries
+
+
+def load_resident_passes(cursor, where, params=()):
+    """Resident pass entries matching `where` (on profiles p); never includes the password"""
+    cursor.execute(RESIDENT_PASSES_SQL.format(where=where), tuple(params))
+    return resident_entries(cursor, cursor.fetchall())
+
+
+def resident_entries(cursor, rows):
+    """Resident pass entries from profile rows, with address and fraccionamiento name resolved"""
+    addresses = resolve_addresses(cursor, [row.get('email') for row in rows])
+    entries = []
+    for row in rows:
+        resolved = addresses.get(row.get('email'))
+        # Dirección desde pending_registrations; si no hay registro, los campos del perfil
+        if resolved and (resolved['street'] or resolved['house_number']):
+            street, house_number = resolved['street'], resolved['house_number']
+        else:
+            street, house_number = row.get('street'), row.get('house_number')
+        entries.append({
+            'id': row['id'],
+            'name': row.get('name') or row.get('user_name') or '',
+            'user_name': row.get('user_name') or '',
+            'email': row.get('email') or '',
+            'phone': row.get('phone') or '',
+            'street': street or '',
+            'house_number': house_number or '',
+            'address': format_address(street, house_number) or '',
+            'fraccionamiento_id': row.get('fraccionamiento_id') or '',
+            'fraccionamiento_name': fraccionamientos.get_name(row.get('fraccionamiento_id')) or '',
+            'role': row.get('role') or 'resident',
+            'created_at': row.get('created_at')
+        })
+    return entries
+
+
+def visitor_pass_info(qr_type, entry):
+    """visitor_info of the decode-qr response for a visitor / one-time / event pass"""
+    if qr_type == 'event':
+        return {
+            'visitor_id': entry['id'],
+            'visitor_name': entry['name'],
+            'visitor_type': 'event',
+            'event_name': entry['name'],
+            'event_date': entry['event_date'],
+            'event_time': entry['event_time'],
+            'number_of_guests': entry['number_of_guests'],
+            'event_location': entry['event_location'] or '',
+            'resident_name': entry['resident_name'],
+            # Solo los eventos en el domicilio del residente muestran su dirección
+            'resident_address': (entry['resident_address'] or '') if entry['event_location'] == 'domicilio' else '',
+            'timestamp': _timestamp(entry['created_at'])
+        }
+    return {
+        'visitor_id': entry['id'],
+        'visitor_name': entry['name'],
+        'resident_name': entry['resident_name'],
+        'resident_address': entry['resident_address'] or '',
+        'resident_street': entry['resident_street'] or '',
+        'resident_house_number': entry['resident_house_number'] or '',
+        'timestamp': _timestamp(entry['created_at'])
+    }
+
+
+def resident_pass_info(entry):
+    """visitor_info of the decode-qr response for a resident pass"""
+    return {
+        'visitor_id': entry['id'],
+        'visitor_name': entry['name'],
+        'visitor_type': 'resident',
+        'resident_name': entry['name'],
+        'resident_user_name': entry['user_name'],
+        'resident_email': entry['email'],
+        'resident_phone': entry['phone'],
+        'resident_address': entry['address'],
+        'resident_street': entry['street'],
+        'resident_house_number': entry['house_number'],
+        'fraccionamiento_id': entry['fraccionamiento_id'],
+        'fraccionamiento_name': entry['fraccionamiento_name'],
+        'role': entry['role'],
+        'timestamp': _timestamp(entry['created_at'])
+    }
+
+
+def changed_resident_ids(cursor, since):
+    """Ids of residents whose profile or registration (address) changed since `since`.
+
+    Sus pases también cambian: llevan el nombre y la dirección del residente.
+    """
+    cursor.execute(PROFILE_CHANGES_SQL, (since,))
+    resident_ids = {row['id'] for row in cursor.fetchall()}
+    cursor.execute(REGISTRATION_CHANGES_SQL, (since,))
+    resident_ids.update(row['id'] for row in cursor.fetchall())
+    return resident_ids
+
+
+class PassIndex:
+    """Active visitors and resident profiles by id, refreshed from updated_at"""
+
+    def __init__(self, max_staleness=5, full_reload=600):
+        self.max_staleness = float(max_staleness)
+        self.full_reload = float(full_reload)
+        self._visitors = {}
+        self._residents = {}
+        self._watermark = None  # NOW() de MySQL al inicio de la última actualización
+        self._refreshed_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.full_loads = 0
+        self.errors = 0
+
+    def _load_all(self, cursor):
+        visitors = load_visitor_passes(cursor, "v.status = %s", (ACTIVE_STATUS,))
+        residents = load_resident_passes(cursor, "1 = 1")
+        self._visitors = {entry['id']: entry for entry in visitors}
+        self._residents = {entry['id']: entry for entry in residents}
+        self._loaded_at = time.monotonic()
+        self.full_loads += 1
+
+    def _apply_changes(self, cursor, since):
+        owner_ids = changed_resident_ids(cursor, since)
+        visitors = load_visitor_passes(cursor, "v.updated_at >= %s", (since,))
+        if owner_ids:
+            placeholders = ', '.join(['%s'] * len(owner_ids))
+            visitors += load_visitor_passes(cursor, f"v.created_by IN ({placeholders})", owner_ids)
+            for entry in load_resident_passes(cursor, f"p.id IN ({placeholders})", owner_ids):
+                self._residents[entry['id']] = entry
+        for entry in visitors:
+            if entry['status'] == ACTIVE_STATUS:
+                self._visitors[entry['id']] = entry
+            else:
+                self._visitors.pop(entry['id'], None)
+
+        # Los borrados no cambian updated_at: si los conteos no cuadran, recargar todo
+        cursor.execute(
+            """SELECT (SELECT COUNT(*) FROM visitors WHERE status = %s) AS visitors,
+                      (SELECT COUNT(*) FROM profiles) AS profiles""",
+            (ACTIVE_STATUS,)
+        )
+        counts = cursor.fetchone()
+        if counts['visitors'] != len(self._visitors) or counts['profiles'] != len(self._residents):
+            self._load_all(cursor)
+
+    def refresh(self):
+        """Bring the index up to date (incremental, or a full load when due)"""
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SELECT NOW() AS now")
+                now = cursor.fetchone()['now']
+                if self._watermark is None or time.monotonic() - self._loaded_at > self.full_reload:
+                    self._load_all(cursor)
+                else:
+                    self._apply_changes(cursor, self._watermark - WATERMARK_OVERLAP)
+                self._watermark = now
+                self._refreshed_at = time.monotonic()
+                self.refreshes += 1
+            finally:
+                cursor.close()
+
+    def _ensure_fresh(self):
+        """False if the index could not be brought within max_staleness"""
+        if time.monotonic() - self._refreshed_at <= self.max_staleness:
+            return True
+        with self._lock:
+            # Otro hilo pudo actualizar mientras esperábamos el lock
+            if time.monotonic() - self._refreshed_at <= self.max_staleness:
+                return True
+            try:
+                self.refresh()
+                return True
+            except Exception as e:
+                self.errors += 1
+                print(f"Error actualizando el índice de pases: {e}")
+                return False
+
+    def get(self, kind, pass_id):
+        """Entry for ('visitor' | 'resident', id), or None (miss, or index too stale)"""
+        try:
+            pass_id = int(pass_id)
+        except (TypeError, ValueError):
+            return None
+        if not self._ensure_fresh():
+            self.misses += 1
+            return None
+        entry = (self._residents if kind == 'resident' else self._visitors).get(pass_id)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def mark_stale(self):
+        """Force a refresh before the next lookup (after a write in this worker)"""
+        self._refreshed_at = 0.0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'visitors': len(self._visitors),
+            'residents': len(self._residents),
+            'max_staleness_seconds': self.max_staleness,
+            'age_seconds': round(time.monotonic() - self._refreshed_at, 3) if self._refreshed_at else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'refreshes': self.refreshes,
+            'full_loads': self.full_loads,
+            'errors': self.errors
+        }
+
+
+_index = None
+
+
+def init_app(app):
+    """Create the worker's pass index (loaded lazily on the first scan)"""
+    global _index
+    if not app.config.get('PASS_INDEX_ENABLED', True):
+        _index = None
+        return None
+    _index = PassIndex(
+        max_staleness=app.config.get('PASS_INDEX_MAX_STALENESS', 5),
+        full_reload=app.config.get('PASS_INDEX_FULL_RELOAD', 600)
+    )
+    app.extensions['pass_index'] = _index
+    return _index
+
+
+def get_pass_index():
+    return _index
+
+
+def mark_stale():
+    """Refresh this worker's index before its next lookup (call after writing visitors/profiles)"""
+    if _index is not None:
+        _index.mark_stale()
@@ -0,0 +1,104 @@
+"""
+Signed QR pass payloads (HMAC) verificables en la caseta sin consultar la base de datos
+
+El contenido sigue siendo JSON con 't' e 'id' (los escáneres del frontend lo parsean),
+más 'x' (expiración, epoch en segundos; se omite si no expira) y 's' (firma):
+
+    {"t":"one-time","id":123,"x":1717000000,"s":"Qk3v9x0b2mYt1sZc"}
+
+Los QR antiguos sin firma se siguen aceptando mientras QR_REQUIRE_SIGNATURE sea false.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import date, datetime, timedelta
+
+PASS_TYPES = ('visitor', 'one-time', 'event', 'resident')
+
+# 12 bytes de HMAC-SHA256 -> 16 caracteres base64url
+SIGNATURE_BYTES = 12
+
+_settings = {'key': None, 'require_signature': False}
+
+
+class InvalidPassError(Exception):
+    """QR rejected before touching the database (forged, expired or malformed)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def init_app(app):
+    """Signing key (QR_SIGNING_KEY, or SECRET_KEY) and legacy-format policy"""
+    key = app.config.get('QR_SIGNING_KEY') or app.config.get('SECRET_KEY')
+    if not key:
+        raise RuntimeError('Los QR firmados requieren QR_SIGNING_KEY o SECRET_KEY (variable de entorno)')
+    _settings['key'] = key.encode('utf-8')
+    _settings['require_signature'] = app.config.get('QR_REQUIRE_SIGNATURE', False)
+    app.extensions['pass_tokens'] = _settings
+    return _settings
+
+
+def _signature(pass_type, pass_id, expires):
+    message = f'{pass_type}.{pass_id}.{expires}'.encode('utf-8')
+    digest = hmac.new(_settings['key'], message, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def to_epoch(value):
+    """Epoch seconds for a datetime/date/ISO string (None -> 0, no expiry)"""
+    if not value:
+        return 0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return int(value.timestamp())
+
+
+def end_of_day(value):
+    """Midnight after a date (an event pass is valid for its whole day)"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        value = value.date()
+    return datetime(value.year, value.month, value.day) + timedelta(days=1)
+
+
+def encode_pass(pass_type, pass_id, expires_at=None):
+    """Compact signed JSON payload for a QR"""
+    expires = to_epoch(expires_at)
+    payload = {'t': pass_type, 'id': int(pass_id)}
+    if expires:
+        payload['x'] = expires
+    payload['s'] = _signature(pass_type, payload['id'], expires)
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def verify_pass(qr_data, now=None):
+    """Check a decoded QR payload; raises InvalidPassError, returns True if it was signed"""
+    if 's' not in qr_data:
+        if _settings['require_signature']:
+            raise InvalidPassError('Código QR sin firma: genera un nuevo código', 403)
+        return False
+
+    pass_type = qr_data.get('t')
+    try:
+        pass_id = int(qr_data.get('id'))
+        expires = int(qr_data.get('x', 0))
+    except (TypeError, ValueError):
+        raise InvalidPassError('Formato de QR inválido')
+    if pass_type not in PASS_TYPES:
+        raise InvalidPassError(f'Código QR inválido: tipo "{pass_type}" no reconocido')
+
+    if not hmac.compare_digest(str(qr_data['s']), _signature(pass_type, pass_id, expires)):
+        raise InvalidPassError('Código QR inválido: firma incorrecta', 403)
+    if expires and expires <= (time.time() if now is None else now):
+        raise InvalidPassError('Código QR expirado', 410)
+    return True
@@ -0,0 +1,168 @@
+"""
+Profile cache - filas de profiles compartidas por id y por email
+
+Los handlers piden los perfiles aquí en lugar de consultar (o hacer JOIN con) profiles.
+Solo se toma una conexión si hay fallos, así que un acierto no cuesta ningún round trip.
+Los ids y emails inexistentes también se guardan (caché negativa, TTL más corto).
+Aciertos y fallos de cada petición van en la cabecera Server-Timing.
+
+En MySQL solo approve_registration escribe profiles (e invalida aquí); los cambios hechos
+por fuera (ProfileService escribe en Supabase, ediciones manuales) se ven al vencer el TTL.
+"""
+from flask import g, has_request_context
+
+from utils.cache import create_cache
+from utils.database import connection
+
+_MISSING = object()
+
+_by_id = create_cache('profiles', maxsize=2048, ttl=120)
+_by_email = create_cache('profile_emails', maxsize=2048, ttl=120)  # email -> id (None si no existe)
+_settings = {'negative_ttl': 30.0}
+
+
+def init_app(app):
+    """Cache limits from the app config and the per-request Server-Timing hook"""
+    for cache in (_by_id, _by_email):
+        cache.ttl = float(app.config.get('PROFILE_CACHE_TTL', 120))
+        cache.maxsize = max(1, int(app.config.get('PROFILE_CACHE_SIZE', 2048)))
+    _settings['negative_ttl'] = float(app.config.get('PROFILE_CACHE_NEGATIVE_TTL', 30))
+
+    @app.after_request
+    def report_profile_cache(response):
+        counts = g.get('_profile_cache')
+        if counts:
+            response.headers.add('Server-Timing', f'profile-cache;desc="hit={counts[0]} miss={counts[1]}"')
+        return response
+
+    app.extensions['profile_cache'] = _by_id
+    return _by_id
+
+
+def _count(hits, misses):
+    if has_request_context():
+        counts = g.setdefault('_profile_cache', [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+
+def normalize_id(profile_id):
+    try:
+        return int(profile_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize_email(email):
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+# Listado de residentes (GET /api/residents); no pasa por la caché
+RESIDENTS_SQL = """SELECT id, name, user_name, email, role
+    FROM profiles
+    WHERE role = 'resident'
+    ORDER BY name ASC"""
+
+
+def profiles_query(column, values):
+    """(sql, params) selecting whole profile rows by id or email"""
+    placeholders = ', '.join(['%s'] * len(values))
+    return f"SELECT * FROM profiles WHERE {column} IN ({placeholders})", tuple(values)
+
+
+def _select(cursor, column, values):
+    cursor.execute(*profiles_query(column, values))
+    return cursor.fetchall()
+
+
+def _query(cursor, column, values):
+    if cursor is not None:
+        return _select(cursor, column, values)
+    with connection() as conn:
+        own_cursor = conn.cursor(dictionary=True)
+        try:
+            return _select(own_cursor, column, values)
+        finally:
+            own_cursor.close()
+
+
+def _store(rows, missing_ids=(), missing_emails=(), generation=None):
+    # Si hubo una invalidación durante la consulta, las filas pueden ser anteriores a la escritura
+    if generation is not None and generation != (_by_id.generation, _by_email.generation):
+        return
+    for row in rows:
+        _by_id.set(row['id'], row)
+        email = _normalize_email(row.get('email'))
+        if email:
+            _by_email.set(email, row['id'])
+    for profile_id in missing_ids:
+        _by_id.set(profile_id, None, ttl=_settings['negative_ttl'])
+    for email in missing_emails:
+        _by_email.set(email, None, ttl=_settings['negative_ttl'])
+
+
+def get_many(profile_ids, cursor=None):
+    """{id: profile row} for the given ids in at most one query; unknown ids are omitted.
+
+    Las filas devueltas son copias (incluyen password, como SELECT *).
+    """
+    wanted = {normalize_id(profile_id) for profile_id in profile_ids} - {None}
+    found = {}
+    misses = []
+    for profile_id in wanted:
+        row = _by_id.get(profile_id, _MISSING)
+        if row is _MISSING:
+            misses.append(profile_id)
+        elif row is not None:
+            found[profile_id] = row
+    _count(len(wanted) - len(misses), len(misses))
+
+    if misses:
+        generation = (_by_id.generation, _by_email.generation)
+        rows = _query(cursor, 'id', misses)
+        loaded = {row['id'] for row in rows}
+        _store(rows, [profile_id for profile_id in misses if profile_id not in loaded], generation=generation)
+        found.update((row['id'], row) for row in rows)
+    return {profile_id: dict(row) for profile_id, row in found.items()}
+
+
+def get(profile_id, cursor=None):
+    """Profile row by id (a copy), or None"""
+    profile_id = normalize_id(profile_id)
+    return get_many([profile_id], cursor).get(profile_id) if profile_id is not None else None
+
+
+def get_by_email(email, cursor=None):
+    """Profile row by email (a copy), or None"""
+    key = _normalize_email(email)
+    if key is None:
+        return None
+    profile_id = _by_email.get(key, _MISSING)
+    if profile_id is None:
+        _count(1, 0)
+        return None
+    if profile_id is not _MISSING:
+        return get(profile_id, cursor)
+
+    _count(0, 1)
+    generation = (_by_id.generation, _by_email.generation)
+    rows = _query(cursor, 'email', [email.strip()])
+    _store(rows, missing_emails=[] if rows else [key], generation=generation)
+    return dict(rows[0]) if rows else None
+
+
+def invalidate(profile_id=None, email=None):
+    """Call after a profile is created, updated or deleted (no arguments: drop everything)"""
+    if profile_id is None and email is None:
+        _by_id.invalidate()
+        _by_email.invalidate()
+        return
+    profile_id = normalize_id(profile_id)
+    if profile_id is not None:
+        # El email anterior también apunta a este id
+        cached = _by_id.get(profile_id)
+        if cached and _normalize_email(cached.get('email')):
+            _by_email.invalidate(_normalize_email(cached['email']))
+        _by_id.invalidate(profile_id)
+    if _normalize_email(email):
+        _by_email.invalidate(_normalize_email(email))
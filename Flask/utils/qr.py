@@ -0,0 +1,176 @@
+"""
+QR images generated in-process (PNG / SVG) con caché direccionada por contenido
+
+La clave es el hash del contenido y del tamaño del QR: la misma URL siempre devuelve
+los mismos bytes, así que se sirve como immutable y los clientes no vuelven a pedirla.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cache import create_cache
+
+try:
+    import segno
+except ImportError:  # pragma: no cover - depende del entorno
+    segno = None
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+# Zona en blanco alrededor del código (módulos); 4 es el mínimo del estándar
+BORDER = 4
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_HEX = frozenset('0123456789abcdef')
+
+
+def available():
+    """True if QR images can be rendered locally (segno installed)"""
+    return segno is not None
+
+
+def qr_key(data, size):
+    """Content address of a QR image: same payload and size -> same key in every worker"""
+    raw = f'{int(size)}:{data}'.encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def is_valid_key(key):
+    return len(key) == 32 and set(key) <= _HEX
+
+
+def render(data, fmt='png', size=400):
+    """PNG or SVG bytes for `data`, scaled to roughly `size` pixels"""
+    code = segno.make(data, error='m', micro=False)
+    modules = code.symbol_size(scale=1, border=BORDER)[0]
+    buffer = io.BytesIO()
+    code.save(buffer, kind=fmt, scale=max(1, int(size) // modules), border=BORDER)
+    return buffer.getvalue()
+
+
+def _make_executor(workers):
+    """Native threads even under gevent (patched threads are greenlets and would block the hub)"""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+            return NativeThreadPoolExecutor(max_workers=workers)
+    except ImportError:
+        pass
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qr-render')
+
+
+class QRStore:
+    """Payloads on disk (<key>.json) plus rendered images on disk and in an LRU"""
+
+    def __init__(self, directory=None, workers=2, cache_size=256, timeout=10):
+        self.directory = directory
+        self.timeout = timeout
+        # Las imágenes no cambian nunca para una clave: el TTL solo libera memoria
+        self._images = create_cache('qr_images', maxsize=cache_size, ttl=86400)
+        self._payloads = create_cache('qr_payloads', maxsize=cache_size * 4, ttl=86400)
+        self._pending = {}  # (key, fmt) -> Future
+        self._lock = threading.Lock()
+        self._executor = _make_executor(workers)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, f'{key}.{ext}') if self.directory else None
+
+    def _write(self, path, data):
+        # Escritura atómica: otro worker nunca lee un archivo a medias
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _load_payload(self, key):
+        payload = self._payloads.get(key)
+        if payload is None:
+            path = self._path(key, 'json')
+            if path and os.path.exists(path):
+                with open(path, 'rb') as f:
+                    payload = json.loads(f.read())
+                self._payloads.set(key, payload)
+        return payload
+
+    def _render(self, key, fmt, payload):
+        data = render(payload['data'], fmt, payload['size'])
+        path = self._path(key, fmt)
+        if path:
+            self._write(path, data)
+        self._images.set((key, fmt), data)
+        return data
+
+    def _submit(self, key, fmt, payload):
+        """Render in the pool; concurrent requests for the same image share one job"""
+        with self._lock:
+            future = self._pending.get((key, fmt))
+            if future is None:
+                future = self._executor.submit(self._render, key, fmt, payload)
+                self._pending[(key, fmt)] = future
+                future.add_done_callback(lambda _: self._forget(key, fmt))
+        return future
+
+    def _forget(self, key, fmt):
+        with self._lock:
+            self._pending.pop((key, fmt), None)
+
+    def register(self, data, size=400, prerender='png'):
+        """Store the payload and start rendering in the background. Returns the key."""
+        key = qr_key(data, size)
+        if self._load_payload(key) is None:
+            payload = {'data': data, 'size': int(size)}
+            path = self._path(key, 'json')
+            if path:
+                self._write(path, json.dumps(payload).encode('utf-8'))
+            self._payloads.set(key, payload)
+        if prerender and self._images.get((key, prerender)) is None:
+            path = self._path(key, prerender)
+            if not (path and os.path.exists(path)):
+                self._submit(key, prerender, self._load_payload(key))
+        return key
+
+    def get(self, key, fmt):
+        """Image bytes for a key, or None if the key was never registered"""
+        data = self._images.get((key, fmt))
+        if data is not None:
+            return data
+        path = self._path(key, fmt)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._images.set((key, fmt), data)
+            return data
+        payload = self._load_payload(key)
+        if payload is None:
+            return None
+        return self._submit(key, fmt, payload).result(timeout=self.timeout)
+
+
+_store = None
+
+
+def init_app(app):
+    """Create the process-wide QR store from the app config"""
+    global _store
+    _store = QRStore(
+        directory=app.config.get('QR_CACHE_DIR'),
+        workers=app.config.get('QR_RENDER_WORKERS', 2),
+        cache_size=app.config.get('QR_CACHE_SIZE', 256),
+        timeout=app.config.get('QR_RENDER_TIMEOUT', 10)
+    )
+    app.extensions['qr'] = _store
+    return _store
+
+
+def get_store():
+    return _store
@@ -0,0 +1,53 @@
+"""
+Schema checks - existencia de tablas/columnas opcionales (creadas por migraciones)
+
+Un resultado positivo se guarda para siempre; uno negativo se vuelve a consultar cada
+SCHEMA_RECHECK_SECONDS, así que un worker que arrancó antes de la migración empieza a
+usar la tabla/columna sin reiniciarse.
+"""
+from utils.cache import create_cache
+
+SCHEMA_RECHECK_SECONDS = 30
+
+_exists = create_cache('schema', maxsize=64, ttl=SCHEMA_RECHECK_SECONDS)
+_PRESENT_TTL = float('inf')
+
+
+def init_app(app):
+    """Recheck interval of missing tables/columns from the app config"""
+    _exists.ttl = float(app.config.get('SCHEMA_RECHECK_SECONDS', SCHEMA_RECHECK_SECONDS))
+    return _exists
+
+
+def _count(cursor, sql, params):
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    return row['n'] if isinstance(row, dict) else row[0]
+
+
+def _check(cursor, key, sql, params):
+    exists = _exists.get(key)
+    if exists is None:
+        exists = _count(cursor, sql, params) > 0
+        _exists.set(key, exists, ttl=_PRESENT_TTL if exists else None)
+    return exists
+
+
+def table_exists(cursor, table):
+    """True if the table exists in the current database"""
+    return _check(
+        cursor, (table, None),
+        """SELECT COUNT(*) AS n FROM information_schema.tables
+           WHERE table_schema = DATABASE() AND table_name = %s""",
+        (table,)
+    )
+
+
+def column_exists(cursor, table, column):
+    """True if table.column exists in the current database"""
+    return _check(
+        cursor, (table, column),
+        """SELECT COUNT(*) AS n FROM information_schema.columns
+           WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+        (table, column)
+    )
@@ -0,0 +1,183 @@
+"""
+Token sessions - emitidas por /api/auth/login y resueltas desde una caché de principals
+
+El token es "<sid>.<firma>": la firma HMAC permite rechazar tokens falsos sin consultar
+MySQL, y la tabla auth_sessions guarda la expiración y la revocación. El principal
+(id, role, fraccionamiento_id, name) se lee una vez por sesión y queda en una caché
+acotada; logout la invalida en este worker y avisa a los demás por el broker.
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from utils.broker import get_broker, publish
+from utils.cache import create_cache
+from utils.database import connection
+from utils.schema import table_exists
+
+SESSIONS_TABLE = 'auth_sessions'
+
+CREATE_SESSIONS_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {SESSIONS_TABLE} (
+        id CHAR(22) PRIMARY KEY,
+        profile_id INT NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        expires_at DATETIME NOT NULL,
+        revoked_at DATETIME NULL DEFAULT NULL,
+        INDEX idx_auth_sessions_profile (profile_id)
+    )
+"""
+
+# Canal del broker por el que se avisan las revocaciones a los otros workers
+REVOCATIONS_CHANNEL = 'auth:revoked'
+
+SIGNATURE_BYTES = 16
+
+_settings = {'key': None, 'ttl': timedelta(hours=12)}
+_principals = create_cache('principals', maxsize=4096, ttl=60)
+
+
+class InvalidSessionError(Exception):
+    """Bearer token that is forged, expired or revoked"""
+
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def init_app(app):
+    """Signing key, session lifetime and principal cache limits from the app config"""
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError('Las sesiones con token requieren SECRET_KEY (variable de entorno)')
+    _settings['key'] = app.config['SECRET_KEY'].encode('utf-8')
+    _settings['ttl'] = timedelta(seconds=app.config.get('SESSION_TTL', 12 * 3600))
+    _principals.ttl = float(app.config.get('PRINCIPAL_CACHE_TTL', 60))
+    _principals.maxsize = max(1, int(app.config.get('PRINCIPAL_CACHE_SIZE', 4096)))
+    _start_revocation_listener()
+    app.extensions['sessions'] = _settings
+    return _settings
+
+
+def is_enabled(cursor):
+    """True if the sessions table exists (migration 0011); a missing table is re-checked periodically"""
+    # Sin la tabla, login responde sin token
+    return table_exists(cursor, SESSIONS_TABLE)
+
+
+def _signature(session_id):
+    digest = hmac.new(_settings['key'], session_id.encode('ascii'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).rstrip(b'=').decode('ascii')
+
+
+def session_id(token):
+    """Session id of a well-signed token, or None"""
+    sid, _, signature = (token or '').partition('.')
+    if len(sid) != 22 or not signature:
+        return None
+    try:
+        expected = _signature(sid)
+    except UnicodeEncodeError:
+        return None
+    return sid if hmac.compare_digest(signature, expected) else None
+
+
+def principal_of(profile, expires_at):
+    return {
+        'id': profile['id'],
+        'role': profile.get('role'),
+        'fraccionamiento_id': profile.get('fraccionamiento_id'),
+        'name': profile.get('name'),
+        'expires_at': expires_at
+    }
+
+
+def create_session(cursor, profile):
+    """Insert a session for a logged-in profile; returns (token, expires_at) or (None, None)"""
+    if not is_enabled(cursor):
+        return None, None
+    sid = secrets.token_urlsafe(16)
+    expires_at = (datetime.now() + _settings['ttl']).replace(microsecond=0)
+    cursor.execute(
+        f"INSERT INTO {SESSIONS_TABLE} (id, profile_id, expires_at) VALUES (%s, %s, %s)",
+        (sid, profile['id'], expires_at)
+    )
+    # La primera petición autenticada ya no consulta MySQL
+    _principals.set(sid, principal_of(profile, expires_at))
+    return f'{sid}.{_signature(sid)}', expires_at
+
+
+def _load_principal(sid):
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                f"""SELECT p.id, p.role, p.fraccionamiento_id, p.name, s.expires_at
+                    FROM {SESSIONS_TABLE} s
+                    JOIN profiles p ON p.id = s.profile_id
+                    WHERE s.id = %s AND s.revoked_at IS NULL AND s.expires_at > NOW()""",
+                (sid,)
+            )
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+    # None también se guarda: un token revocado no vuelve a consultar MySQL hasta el TTL
+    return principal_of(row, row['expires_at']) if row else None
+
+
+def resolve(token):
+    """Principal of a bearer token; raises InvalidSessionError"""
+    sid = session_id(token)
+    if sid is None:
+        raise InvalidSessionError('Token de sesión inválido')
+    principal = _principals.get_or_load(sid, lambda: _load_principal(sid))
+    if principal is None or principal['expires_at'] <= datetime.now():
+        raise InvalidSessionError('La sesión expiró o fue cerrada')
+    return principal
+
+
+def revoke(cursor, token):
+    """Revoke a session (logout); the caller commits and then calls forget(). False for an unknown token."""
+    sid = session_id(token)
+    if sid is None or not is_enabled(cursor):
+        return False
+    cursor.execute(
+        f"UPDATE {SESSIONS_TABLE} SET revoked_at = NOW() WHERE id = %s AND revoked_at IS NULL",
+        (sid,)
+    )
+    return cursor.rowcount > 0
+
+
+def forget(token):
+    """Drop a revoked session from the principal caches of every worker (after the commit)"""
+    sid = session_id(token)
+    if sid is None:
+        return
+    # Antes del commit, otro worker podría volver a cargar la sesión aún sin revoked_at
+    _principals.invalidate(sid)
+    publish(REVOCATIONS_CHANNEL, {'sid': sid})
+
+
+_listener = None
+
+
+def _start_revocation_listener():
+    """Drop sessions revoked by other workers from this worker's cache"""
+    global _listener
+    broker = get_broker()
+    if _listener is not None or broker is None:
+        return
+
+    subscription = broker.subscribe([REVOCATIONS_CHANNEL])
+
+    def listen():
+        while True:
+            item = subscription.get()
+            if item is not None:
+                _principals.invalidate(item[1].get('sid'))
+
+    _listener = threading.Thread(target=listen, name='session-revocations', daemon=True)
+    _listener.start()
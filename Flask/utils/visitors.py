@@ -0,0 +1,53 @@
+"""
+Visitor queries - SQL de los listados y lecturas de visitantes (compartido con migrations/explain.py)
+"""
+from utils.pagination import keyset_condition
+
+# Visitante con el nombre y email del residente que lo registró (generate-qr / generate-event-qr)
+VISITOR_WITH_RESIDENT_SQL = """SELECT v.*, p.name AS resident_name, p.email AS resident_email
+    FROM visitors v
+    LEFT JOIN profiles p ON v.created_by = p.id
+    WHERE v.id = %s"""
+
+
+def list_query(user_id=None, status=None, visitor_type=None, search=None, after_position=None,
+               limit=None, exclude_expired=False):
+    """(sql, params) of GET /api/visitors ordered by (created_at, id) DESC.
+
+    `limit` se aplica tal cual (el handler pide una fila extra para saber si hay más).
+    """
+    query = "SELECT v.* FROM visitors v WHERE 1=1"
+    params = []
+
+    if user_id:
+        query += " AND v.created_by = %s"
+        # Convertir user_id a entero para comparar con created_by (INT)
+        try:
+            params.append(int(user_id))
+        except (ValueError, TypeError):
+            params.append(user_id)
+    if status:
+        query += " AND v.status = %s"
+        params.append(status)
+        # Activos: excluir también los vencidos que el sweeper aún no marcó
+        if status == 'active' and exclude_expired:
+            query += " AND (v.expires_at IS NULL OR v.expires_at > NOW())"
+    if visitor_type:
+        query += " AND v.type = %s"
+        params.append(visitor_type)
+    if search:
+        query += " AND v.name LIKE %s"
+        params.append(f'%{search}%')
+
+    # Continuar después de la última fila de la página anterior
+    if after_position:
+        condition, condition_params = keyset_condition('v', *after_position)
+        query += " AND " + condition
+        params.extend(condition_params)
+
+    # Ordenar por fecha de creación descendente (más nuevos primero); id desempata
+    query += " ORDER BY v.created_at DESC, v.id DESC"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params